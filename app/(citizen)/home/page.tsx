@@ -29,7 +29,9 @@ import {
   getLatestWaterLevels,
   getWaterLevelMode,
   setWaterLevelMode,
+  subscribeWaterLevels,
   type WaterLevelMode,
+  type WaterLevelReading,
 } from "@/lib/water-level-service";
 
 export default function HomePage() {
@@ -54,15 +56,15 @@ export default function HomePage() {
     return "Sensor_Tram_C";
   }, [currentDistrict]);
 
-  // Load current mode and start polling latest water level
+  // Load current mode, then follow the live stream (polling only while it is down)
   useEffect(() => {
     let isMounted = true;
     getWaterLevelMode().then((m) => {
       if (isMounted) setMode(m);
     });
 
-    const fetchLevels = async () => {
-      const readings = await getLatestWaterLevels();
+    const applyReadings = (readings: WaterLevelReading[]) => {
+      if (!isMounted) return;
       const forDistrict = readings.find(
         (r) => r.location === districtSensorLocation,
       );
@@ -70,11 +72,25 @@ export default function HomePage() {
       else if (readings.length > 0)
         setLiveWaterLevel(readings[0].water_level_cm);
     };
+    const fetchLevels = async () => {
+      applyReadings(await getLatestWaterLevels());
+    };
     fetchLevels();
-    const iv = setInterval(fetchLevels, 4000);
+
+    let iv: ReturnType<typeof setInterval> | null = null;
+    const unsubscribe = subscribeWaterLevels(applyReadings, {
+      onOpen: () => {
+        if (iv) clearInterval(iv);
+        iv = null;
+      },
+      onError: () => {
+        if (!iv) iv = setInterval(fetchLevels, 4000);
+      },
+    });
     return () => {
       isMounted = false;
-      clearInterval(iv);
+      unsubscribe();
+      if (iv) clearInterval(iv);
     };
   }, [districtSensorLocation]);
 
@@ -14,6 +14,8 @@ const MapComponent = dynamic(() => import('@/components/map-component'), {
   loading: () => <div className="flex-1 bg-gray-100 flex items-center justify-center">Loading map...</div>
 })
 
+const BACKEND_URL = process.env.NEXT_PUBLIC_BACKEND_URL || 'http://localhost:5000'
+
 const getMapPosition = (sensor: Sensor) => {
   // Placeholder implementation for getMapPosition
   // Replace with actual logic to determine sensor position on the map
@@ -28,8 +30,27 @@ export default function SensorMapPage() {
   const [filterDistrict, setFilterDistrict] = useState<string>('all')
   const [searchTerm, setSearchTerm] = useState('')
   const [currentPage, setCurrentPage] = useState(1)
+  const [riskOverlayUrl, setRiskOverlayUrl] = useState<string | null>(null)
   const itemsPerPage = 10
 
+  // Flood risk raster: poll the grid version, tiles are cached per version
+  useEffect(() => {
+    const loadRiskGrid = async () => {
+      try {
+        const response = await fetch(`${BACKEND_URL}/api/flood/risk-grid`)
+        if (!response.ok) return
+        const grid = await response.json()
+        setRiskOverlayUrl(`${BACKEND_URL}${grid.tile_url}`)
+      } catch (error) {
+        console.error('Failed to load flood risk grid:', error)
+      }
+    }
+
+    loadRiskGrid()
+    const interval = setInterval(loadRiskGrid, 60000)
+    return () => clearInterval(interval)
+  }, [])
+
   // Filter sensors
   const filteredSensors = allSensors.filter((s) =>
     (filterStatus === 'all' || s.status === filterStatus) &&
@@ -246,6 +267,7 @@ export default function SensorMapPage() {
         selectedSensor={selectedSensor}
         onSelectSensor={setSelectedSensor}
         getStatusColor={getStatusColor}
+        riskOverlayUrl={riskOverlayUrl}
       />
 
       {/* Modals */}
@@ -1,12 +1,35 @@
 import os
-import requests
+import math
+import threading
+import time
 import joblib
+import numpy as np
 import pandas as pd
+from datetime import datetime
 from dotenv import load_dotenv
 from pathlib import Path
-from config import supabase_client, HCM_LOCATIONS
+from typing import NamedTuple
+from config import (
+    supabase_client,
+    HCM_LOCATIONS,
+    WATER_LEVEL_SENSORS,
+    OPENWEATHER_CURRENT_API_URL,
+    PREDICTION_CACHE_MAX_ENTRIES,
+    MODEL_PATH,
+    MODEL_RELOAD_INTERVAL_SECONDS,
+    FLOOD_MODEL_ENGINE,
+    FLOOD_TIMELINE_HOURS
+)
+from compiled_forest import CompiledForest, file_version, verify
+from http_client import upstream_get
+from weather_cache import TTLCache
+from broadcast import live_updates
+from risk_grid import flood_risk_grid
+from timeseries import water_level_history
 from services import (
-    get_latest_weather_from_db,
+    find_stored_weather,
+    stored_weather_points,
+    get_hourly_forecasts,
     get_weather_for_location_from_db,
     get_latest_water_levels,
     fetch_from_openweather
@@ -14,58 +37,263 @@ from services import (
 
 load_dotenv()
 
-# Load model TP.HCM
-model_path = Path(__file__).parent / 'hcmc_flood_model.pkl'
-model = joblib.load(model_path)
 API_KEY = os.getenv("OPENWEATHER_API_KEY")
 
+# Column order MUST MATCH training
+FEATURE_COLUMNS = ['rainfall_1h', 'tide_level', 'humidity']
+DEFAULT_WATER_LEVEL = 120
+DEFAULT_HUMIDITY = 80
+# Model inputs are rounded to these steps (0.1 mm rain, 1 cm tide, 1 %
+# humidity) so that near-identical requests share a prediction cache entry
+FEATURE_QUANTUM = (0.1, 1.0, 1.0)
 
-def get_weather_from_db(lat, lon):
+# Bounded LRU of (model_version, quantized features) -> (is_flood, risk_score);
+# entries never expire, a model reload clears it
+prediction_cache = TTLCache(math.inf, PREDICTION_CACHE_MAX_ENTRIES)
+
+
+def check_model_features(model):
     """
-    Get latest weather data from database for given coordinates
-    Returns rain_1h and humidity, or None if not found
+    Verify once, at load time, that the model was trained on FEATURE_COLUMNS
+    in that order, so predictions can feed bare arrays without names.
+    Returns the fitted sklearn trees when their leaves hold class fractions
+    (summing them equals predict_proba), else None and single predictions
+    of the sklearn engine use predict_proba
     """
-    if not supabase_client:
+    trained = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+    if trained != FEATURE_COLUMNS:
+        raise ValueError(f"Model features {trained} do not match {FEATURE_COLUMNS}")
+    trees = [estimator.tree_ for estimator in getattr(model, 'estimators_', [])]
+    if not trees or any(tree.n_outputs != 1 or not np.allclose(tree.value.sum(axis=-1), 1.0) for tree in trees):
         return None
-    
+    return trees
+
+
+class LoadedModel(NamedTuple):
+    model: object
+    # sklearn engine: fitted trees for predict_flood_one (see check_model_features)
+    trees: list | None
+    version: str
+    # (st_mtime_ns, st_size) of the file it was loaded from
+    stamp: tuple
+    loaded_at: str
+    # 'compiled' (CompiledForest) or 'sklearn'
+    engine: str
+
+
+# Swapped as a whole, so a prediction never mixes two models
+_loaded = None
+_load_lock = threading.Lock()
+_first_load_lock = threading.Lock()
+_model_stats = {'loads': 0, 'reload_errors': 0, 'last_error': None, 'last_load_s': None, 'last_warmup_s': None}
+
+
+def _file_stamp(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _load_compiled(path, version):
+    """
+    The CompiledForest saved next to the model file when it was built from
+    this exact file; otherwise compile it now, check it against the model
+    and save it for the next start
+    Saved forests are memory-mapped read-only, so worker processes serving
+    the same model share its node arrays and lookup tables
+    """
+    compiled_path = Path(path).with_suffix('.npz')
     try:
-        # Get all latest weather readings
-        weather_readings = get_latest_weather_from_db()
-        
-        # Find matching location by coordinates
-        for reading in weather_readings:
-            location = reading.get('location', {})
-            if location:
-                # Check if coordinates match (with small tolerance for float comparison)
-                db_lat = location.get('latitude')
-                db_lon = location.get('longitude')
-                
-                if db_lat and db_lon:
-                    if abs(db_lat - lat) < 0.01 and abs(db_lon - lon) < 0.01:
-                        current_weather = reading.get('current_weather', [])
-                        if current_weather and len(current_weather) > 0:
-                            weather = current_weather[0]
-                            return {
-                                'rain_1h': weather.get('rain_1h') or 0.0,
-                                'humidity': weather.get('humidity') or 0
-                            }
+        forest = CompiledForest.load(compiled_path)
+        if forest.source_version == version:
+            return forest
+        print(f"[AI] {compiled_path.name} was built from model {forest.source_version}, recompiling...")
+    except FileNotFoundError:
+        print(f"[AI] No {compiled_path.name}, compiling the model...")
     except Exception as e:
-        print(f"[AI] Error getting weather from DB: {e}")
+        print(f"[AI] Could not read {compiled_path.name} ({e}), recompiling...")
     
+    model = joblib.load(path)
+    forest = CompiledForest.from_sklearn(model, version)
+    verify(model, forest)
+    try:
+        forest.save(compiled_path)
+        # Serve the file-backed copy, like every later start
+        return CompiledForest.load(compiled_path)
+    except OSError as e:
+        print(f"[AI] ✗ Could not save {compiled_path.name}: {e}")
+    return forest
+
+
+def _read_model(path):
+    """
+    Load and check a model file without installing it
+    The sklearn engine loads with mmap_mode='r', which keeps plain numpy
+    attributes in shared, file-backed pages; sklearn copies tree nodes into
+    its own buffers when unpickling, so those stay per process
+    """
+    stamp = _file_stamp(path)
+    version = file_version(path)
+    loaded_at = datetime.now().isoformat()
+    if FLOOD_MODEL_ENGINE == 'compiled':
+        forest = _load_compiled(path, version)
+        check_model_features(forest)
+        return LoadedModel(forest, None, version, stamp, loaded_at, 'compiled')
+    loaded = joblib.load(path, mmap_mode='r')
+    return LoadedModel(loaded, check_model_features(loaded), version, stamp, loaded_at, 'sklearn')
+
+
+def warm_up_model(state=None):
+    """
+    Run a dummy batch and a single row through the model (bypassing the
+    prediction cache) so the first real request does not pay for lazy
+    initialization inside numpy / sklearn
+    """
+    state = state or get_model()
+    started = time.perf_counter()
+    dummy = [(0.0, DEFAULT_WATER_LEVEL, DEFAULT_HUMIDITY), (50.0, 200.0, 100.0)]
+    predict_flood_batch(dummy, state)
+    predict_flood_one(*dummy[0], state=state)
+    _model_stats['last_warmup_s'] = round(time.perf_counter() - started, 4)
+
+
+def load_model(path=None):
+    """
+    Load (or reload) the TP.HCM model: read, check and warm up the new
+    model first, then install it with a single reference swap, so requests
+    keep using the previous model until the new one is ready. Clears the
+    prediction cache; returns the new model_version
+    """
+    global _loaded
+    path = path or MODEL_PATH
+    started = time.perf_counter()
+    state = _read_model(path)
+    warm_up_model(state)
+    with _load_lock:
+        _loaded = state
+        prediction_cache.clear()
+        _model_stats['loads'] += 1
+        _model_stats['last_load_s'] = round(time.perf_counter() - started, 4)
+    print(f"[AI] ✓ Loaded flood model {state.version} from {Path(path).name} in {_model_stats['last_load_s']}s")
+    return state.version
+
+
+def get_model():
+    """The current LoadedModel; loads it on first use"""
+    state = _loaded
+    if state is None:
+        with _first_load_lock:
+            if _loaded is None:
+                load_model()
+            state = _loaded
+    return state
+
+
+def reload_model_if_changed():
+    """Reload when the model file's mtime or size changed; True if reloaded"""
+    global _failed_stamp
+    state = _loaded
+    try:
+        stamp = _file_stamp(MODEL_PATH)
+    except OSError:
+        # Missing for a moment (being replaced); check again next time
+        return False
+    if (state is not None and stamp == state.stamp) or stamp == _failed_stamp:
+        return False
+    try:
+        load_model()
+        return True
+    except Exception as e:
+        # Keep serving the previous model (e.g. a half-written file) and
+        # retry once the file changes again
+        _failed_stamp = stamp
+        _model_stats['reload_errors'] += 1
+        _model_stats['last_error'] = f"{type(e).__name__}: {e}"
+        print(f"[AI] ✗ Model reload failed, keeping {state.version if state else 'no model'}: {e}")
+        return False
+
+
+_model_watcher = None
+_failed_stamp = None
+
+
+def start_model_watcher(interval=None):
+    """Poll the model file every MODEL_RELOAD_INTERVAL_SECONDS (0 disables)"""
+    global _model_watcher
+    interval = MODEL_RELOAD_INTERVAL_SECONDS if interval is None else interval
+    if interval <= 0 or _model_watcher is not None:
+        return
+
+    def watch():
+        while True:
+            time.sleep(interval)
+            reload_model_if_changed()
+
+    _model_watcher = threading.Thread(target=watch, name='model-watcher', daemon=True)
+    _model_watcher.start()
+    print(f"[AI] ✓ Watching {Path(MODEL_PATH).name} for changes every {interval}s")
+
+
+def get_model_stats():
+    state = _loaded
+    stats = dict(_model_stats)
+    stats['path'] = str(MODEL_PATH)
+    stats['loaded'] = state is not None
+    stats['version'] = state.version if state else None
+    stats['loaded_at'] = state.loaded_at if state else None
+    stats['engine'] = state.engine if state else FLOOD_MODEL_ENGINE
+    stats['fast_path'] = bool(state and (state.engine == 'compiled' or state.trees))
+    stats['memory_mapped'] = bool(state and state.engine == 'compiled' and state.model.mapped)
+    stats['watching'] = _model_watcher is not None
+    return stats
+
+
+def _weather_features_from_reading(reading):
+    """rain_1h and humidity from a stored weather_request row, or None"""
+    current_weather = (reading or {}).get('current_weather', [])
+    if current_weather and len(current_weather) > 0:
+        weather = current_weather[0]
+        return {
+            'rain_1h': weather.get('rain_1h') or 0.0,
+            'humidity': weather.get('humidity') or 0
+        }
     return None
 
 
+def get_weather_from_db_many(coords):
+    """
+    Latest stored weather for many (lat, lon) pairs, matched to the nearest
+    stored location within WEATHER_INDEX_MAX_DISTANCE_KM (spatial index)
+    Returns a list of {'rain_1h', 'humidity'} or None per pair
+    """
+    if not supabase_client:
+        return [None] * len(coords)
+    
+    try:
+        return [_weather_features_from_reading(reading) for reading in find_stored_weather(coords)]
+    except Exception as e:
+        print(f"[AI] Error getting weather from DB: {e}")
+        return [None] * len(coords)
+
+
+def get_weather_from_db(lat, lon):
+    """
+    Get latest weather data from database for given coordinates
+    Returns rain_1h and humidity, or None if not found
+    """
+    return get_weather_from_db_many([(lat, lon)])[0]
+
+
 def get_water_level_from_db(location_name=None):
     """
     Get latest water level from system_logs table
     If location_name is provided, returns that sensor's level
-    Otherwise returns the first available sensor reading
+    Otherwise returns the most recent reading of any sensor
     """
     if not supabase_client:
         return None
     
     try:
-        water_levels = get_latest_water_levels()
+        water_levels = get_latest_water_levels(location_name)
         
         if not water_levels:
             return None
@@ -85,68 +313,156 @@ def get_water_level_from_db(location_name=None):
     return None
 
 
-def check_flood_status(lat, lon, water_level=None, use_database=True):
+def get_weather_features(lat, lon, use_database=True, weather_data=None):
     """
-    Check flood status using AI model
+    Get (rain_1h, humidity, from_database) for the model
+    weather_data: this location's get_weather_from_db result; when it is
+    None, falls back to the OpenWeather API, then to defaults
+    """
+    if use_database:
+        if weather_data:
+            return weather_data['rain_1h'], weather_data['humidity'], True
+        # Fallback to API if not in database
+        print(f"[AI] Weather not in DB, fetching from API...")
+        try:
+            weather_api_data = fetch_from_openweather(lat, lon)
+            if weather_api_data:
+                current = weather_api_data.get('current', {})
+                rain_1h = current.get('rain', {}).get('1h', 0.0) or 0.0
+                return rain_1h, current.get('humidity', DEFAULT_HUMIDITY), False
+        except Exception as e:
+            print(f"[AI] Error fetching from API: {e}, using defaults")
+        return 0.0, DEFAULT_HUMIDITY, False
+
+    # Direct API call (original behavior)
+    params = {'lat': lat, 'lon': lon, 'appid': API_KEY, 'units': 'metric'}
+    try:
+        res = upstream_get(OPENWEATHER_CURRENT_API_URL, params=params).json()
+        rain_1h = res.get('rain', {}).get('1h', 0.0) or 0.0
+        return rain_1h, res['main']['humidity'], False
+    except Exception as e:
+        print(f"[AI] Error calling API: {e}, using defaults")
+        return 0.0, DEFAULT_HUMIDITY, False
+
+
+def predict_flood_batch(features, state=None):
+    """
+    Run the model once over many feature rows
     
     Args:
-        lat, lon: Coordinates (TP.HCM)
-        water_level: Water level from sensor (cm). If None, will fetch from database
-        use_database: If True, fetch weather from database. If False, fetch from OpenWeather API
+        features: sequence of (rain_1h, water_level, humidity) rows
+        state: LoadedModel to use (default: the current one)
     
     Returns:
-        Dictionary with weather data, sensor data, and prediction
+        (is_flood, risk_score) numpy arrays; risk_score is the flood
+        probability in percent and is_flood is the class with the highest
+        probability (what model.predict would return, without a second pass)
+    """
+    state = state or get_model()
+    model = state.model
+    input_data = np.asarray(features, dtype=np.float64).reshape(-1, len(FEATURE_COLUMNS))
+    if state.engine == 'sklearn':
+        input_data = pd.DataFrame(input_data, columns=FEATURE_COLUMNS)
+    probabilities = model.predict_proba(input_data)
+    is_flood = model.classes_[probabilities.argmax(axis=1)].astype(bool)
+    return is_flood, probabilities[:, 1] * 100
+
+
+# Per-thread (1, n_features) float32 input row and class probability buffer
+# reused by predict_flood_one
+_fast_row = threading.local()
+
+
+def predict_flood_one(rain_1h, water_level, humidity, state=None):
     """
+    Low-latency single prediction: writes the features into a preallocated
+    float32 row and reads the class fractions without a DataFrame, sklearn's
+    per-call input validation or joblib dispatch. The compiled engine looks
+    the row up in its per-tree tables; the sklearn engine sums its trees'
+    leaf fractions (predict_flood_batch when the trees hold none)
     
-    # 1. Get weather data (from DB or API)
-    if use_database:
-        weather_data = get_weather_from_db(lat, lon)
-        if weather_data:
-            rain_1h = weather_data['rain_1h']
-            humidity = weather_data['humidity']
-        else:
-            # Fallback to API if not in database
-            print(f"[AI] Weather not in DB, fetching from API...")
-            try:
-                weather_api_data = fetch_from_openweather(lat, lon)
-                if weather_api_data:
-                    current = weather_api_data.get('current', {})
-                    rain_1h = current.get('rain', {}).get('1h', 0.0) or 0.0
-                    humidity = current.get('humidity', 80)
-                else:
-                    rain_1h = 0.0
-                    humidity = 80
-            except Exception as e:
-                print(f"[AI] Error fetching from API: {e}, using defaults")
-                rain_1h = 0.0
-                humidity = 80
-    else:
-        # Direct API call (original behavior)
-        url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={API_KEY}&units=metric"
-        try:
-            res = requests.get(url).json()
-            rain_1h = res.get('rain', {}).get('1h', 0.0) or 0.0
-            humidity = res['main']['humidity']
-        except Exception as e:
-            print(f"[AI] Error calling API: {e}, using defaults")
-            rain_1h = 0.0
-            humidity = 80
+    Returns:
+        (is_flood, risk_score) like one row of predict_flood_batch
+    """
+    state = state or get_model()
+    if state.engine != 'compiled' and state.trees is None:
+        is_flood, probability = predict_flood_batch([(rain_1h, water_level, humidity)], state)
+        return bool(is_flood[0]), float(probability[0])
     
-    # 2. Get water level (from parameter or database)
-    if water_level is None:
-        water_level = get_water_level_from_db()
-        if water_level is None:
-            water_level = 120  # Default fallback
+    buffers = _fast_row.__dict__
+    row = buffers.get('row')
+    if row is None:
+        row = buffers['row'] = np.empty((1, len(FEATURE_COLUMNS)), dtype=np.float32)
+    if len(buffers.get('probabilities', ())) != len(state.model.classes_):
+        buffers['probabilities'] = np.empty(len(state.model.classes_))
+    row[0, 0] = rain_1h
+    row[0, 1] = water_level
+    row[0, 2] = humidity
+    probabilities = buffers['probabilities']
     
-    # 3. Prepare input for ML model
-    # Column order MUST MATCH training: ['rainfall_1h', 'tide_level', 'humidity']
-    input_data = pd.DataFrame([[rain_1h, water_level, humidity]], 
-                              columns=['rainfall_1h', 'tide_level', 'humidity'])
+    if state.engine == 'compiled':
+        state.model.predict_proba_one(row[0], out=probabilities)
+    else:
+        trees = state.trees
+        np.copyto(probabilities, trees[0].predict(row)[0])
+        for tree in trees[1:]:
+            probabilities += tree.predict(row)[0]
+        probabilities /= len(trees)
+    is_flood = bool(state.model.classes_[probabilities.argmax()])
+    return is_flood, float(probabilities[1] * 100)
+
+
+def quantize_features(row):
+    """(rain_1h, water_level, humidity) rounded to FEATURE_QUANTUM"""
+    return tuple(round(round(value / step) * step, 6) for value, step in zip(row, FEATURE_QUANTUM))
+
+
+def predict_flood(features):
+    """
+    Memoized predictions for (rain_1h, water_level, humidity) rows
+    Rows are quantized, looked up in prediction_cache, and the misses run
+    through the model together (fast path for a single miss)
     
-    # 4. AI Prediction
-    is_flood = model.predict(input_data)[0]
-    probability = model.predict_proba(input_data)[0][1] * 100
+    Returns:
+        (is_flood, risk_score) lists, in input order
+    """
+    state = get_model()
+    keys = [quantize_features(row) for row in features]
+    is_flood = [False] * len(keys)
+    probability = [0.0] * len(keys)
+    missing = {}
+    for i, key in enumerate(keys):
+        cached = prediction_cache.get((state.version, key))
+        if cached is not None:
+            is_flood[i], probability[i] = cached[0]
+        else:
+            missing.setdefault(key, []).append(i)
     
+    if missing:
+        rows = list(missing)
+        if len(rows) == 1:
+            flood, risk = predict_flood_one(*rows[0], state=state)
+            predicted = [(flood, risk)]
+        else:
+            flood, risk = predict_flood_batch(rows, state)
+            predicted = list(zip(flood.tolist(), risk.tolist()))
+        for key, result in zip(rows, predicted):
+            prediction_cache.set((state.version, key), result)
+            for i in missing[key]:
+                is_flood[i], probability[i] = result
+    return is_flood, probability
+
+
+def get_prediction_cache_stats():
+    stats = prediction_cache.stats()
+    # No expiry; inf is not valid JSON
+    stats.pop('ttl_seconds')
+    stats['model_version'] = _loaded.version if _loaded else None
+    stats['quantum'] = dict(zip(FEATURE_COLUMNS, FEATURE_QUANTUM))
+    return stats
+
+
+def _prediction_result(lat, lon, rain_1h, humidity, weather_from_db, water_level, is_flood, probability):
     return {
         "location": {
             "latitude": lat,
@@ -155,7 +471,7 @@ def check_flood_status(lat, lon, water_level=None, use_database=True):
         "weather": {
             "rain_1h": round(rain_1h, 2),
             "humidity": humidity,
-            "source": "database" if use_database and weather_data else "api"
+            "source": "database" if weather_from_db else "api"
         },
         "sensor": {
             "water_level_cm": water_level,
@@ -163,12 +479,75 @@ def check_flood_status(lat, lon, water_level=None, use_database=True):
         },
         "prediction": {
             "is_flood": bool(is_flood),
-            "risk_score": round(probability, 1),
+            "risk_score": round(float(probability), 1),
             "message": "CẢNH BÁO NGẬP LỤT!" if is_flood else "An toàn"
         }
     }
 
 
+def check_flood_status(lat, lon, water_level=None, use_database=True):
+    """
+    Check flood status using AI model
+    
+    Args:
+        lat, lon: Coordinates (TP.HCM)
+        water_level: Water level from sensor (cm). If None, will fetch from database
+        use_database: If True, fetch weather from database. If False, fetch from OpenWeather API
+    
+    Returns:
+        Dictionary with weather data, sensor data, and prediction
+    """
+    return check_flood_for_locations(
+        [{'lat': lat, 'lng': lon}],
+        water_level=water_level,
+        use_database=use_database
+    )[0]
+
+
+def check_flood_for_locations(locations, water_level=None, use_database=True):
+    """
+    Check flood status for many locations with a single model call
+    
+    Args:
+        locations: list of {'lat', 'lng'} dicts ('name' is copied to location_name)
+        water_level: Water level from sensor (cm). If None, will fetch from database
+        use_database: If True, fetch weather from database. If False, fetch from OpenWeather API
+    
+    Returns:
+        List of check_flood_status results, in input order
+    """
+    if not locations:
+        return []
+    
+    # 1. Get weather data (one spatial index query for all locations)
+    stored = [None] * len(locations)
+    if use_database:
+        stored = get_weather_from_db_many([(loc['lat'], loc['lng']) for loc in locations])
+    weather = [
+        get_weather_features(loc['lat'], loc['lng'], use_database, weather_data)
+        for loc, weather_data in zip(locations, stored)
+    ]
+    
+    # 2. Get water level (from parameter or database)
+    if water_level is None:
+        water_level = get_water_level_from_db()
+        if water_level is None:
+            water_level = DEFAULT_WATER_LEVEL  # Default fallback
+    
+    # 3. One AI prediction for all rows (memoized per quantized features)
+    features = [(rain_1h, water_level, humidity) for rain_1h, humidity, _ in weather]
+    is_flood, probability = predict_flood(features)
+    
+    results = []
+    for i, (loc, (rain_1h, humidity, from_db)) in enumerate(zip(locations, weather)):
+        result = _prediction_result(loc['lat'], loc['lng'], rain_1h, humidity, from_db,
+                                    water_level, is_flood[i], probability[i])
+        if 'name' in loc:
+            result['location_name'] = loc['name']
+        results.append(result)
+    return results
+
+
 def check_flood_for_location(location_name, use_database=True):
     """
     Check flood status for a named location (e.g., "District 7")
@@ -201,22 +580,114 @@ def check_flood_for_location(location_name, use_database=True):
 def check_flood_for_all_locations(use_database=True):
     """
     Check flood status for all monitored HCM locations
-    Returns list of predictions
+    Returns list of predictions (also pushed to /api/stream clients)
     """
-    results = []
+    results = check_flood_for_locations(HCM_LOCATIONS, use_database=use_database)
+    
+    live_updates.publish('prediction', {'timestamp': datetime.now().isoformat(), 'predictions': results})
+    return results
+
+def compute_flood_risk_grid():
+    """
+    Score the whole RISK_GRID raster in one batch and publish it to
+    flood_risk_grid: rain and humidity are interpolated from the latest
+    stored weather per location, water level from the sensors' latest
+    readings (configured level when a sensor has not reported yet)
+    """
+    coords, readings = stored_weather_points()
+    weather = [_weather_features_from_reading(reading) for reading in readings]
+    has_weather = [i for i, w in enumerate(weather) if w]
+    weather_points = (
+        coords[has_weather],
+        np.array([weather[i]['rain_1h'] for i in has_weather], dtype=np.float64),
+        np.array([weather[i]['humidity'] for i in has_weather], dtype=np.float64)
+    )
+    
+    latest = water_level_history.latest()
+    placed = [sensor for sensor in WATER_LEVEL_SENSORS if 'lat' in sensor and 'lng' in sensor]
+    sensor_points = (
+        np.array([(sensor['lat'], sensor['lng']) for sensor in placed], dtype=np.float64).reshape(-1, 2),
+        np.array([latest[s['location']][1] if s['location'] in latest else s['current_level'] for s in placed])
+    )
+    
+    grid = flood_risk_grid.compute(
+        weather_points,
+        sensor_points,
+        (0.0, DEFAULT_WATER_LEVEL, DEFAULT_HUMIDITY),
+        lambda features: predict_flood_batch(features)[1]
+    )
+    summary = grid.summary()
+    print(f"[AI] ✓ Risk grid {grid.rows}x{grid.cols} v{grid.version[:8]}: "
+          f"{summary['risk']['cells_at_risk']} cells at risk (max {summary['risk']['max']}%)")
+    return grid
+
+
+def compute_flood_timeline(hours=None):
+    """
+    Flood risk for every stored forecast hour of every location, scored in
+    one batch: rain and humidity from hourly_weather, water level held at
+    the latest sensor reading (there is no tide forecast)
+    Returns the /api/flood/timeline payload, locations in HCM_LOCATIONS order
+    """
+    hours = hours or FLOOD_TIMELINE_HOURS
+    # The hour in progress is the first step of the timeline
+    start_dt = int(time.time()) // 3600 * 3600
+    forecasts = get_hourly_forecasts(start_dt, start_dt + hours * 3600)
+    
     water_level = get_water_level_from_db()
+    if water_level is None:
+        water_level = DEFAULT_WATER_LEVEL
     
-    for location in HCM_LOCATIONS:
-        result = check_flood_status(
-            location['lat'],
-            location['lng'],
-            water_level=water_level,
-            use_database=use_database
-        )
-        result['location_name'] = location['name']
-        results.append(result)
+    features = [
+        (hour['rain_1h'], water_level, hour['humidity'] if hour['humidity'] is not None else DEFAULT_HUMIDITY)
+        for forecast in forecasts for hour in forecast['hours']
+    ]
+    state = get_model()
+    is_flood, probability = predict_flood_batch(features, state) if features else ([], [])
     
-    return results
+    names = {(round(loc['lat'], 4), round(loc['lng'], 4)): loc['name'] for loc in HCM_LOCATIONS}
+    order = {loc['name']: i for i, loc in enumerate(HCM_LOCATIONS)}
+    data = []
+    row = 0
+    for forecast in forecasts:
+        timeline = []
+        for hour in forecast['hours']:
+            timeline.append({
+                'dt': hour['dt'],
+                'time': datetime.fromtimestamp(hour['dt']).isoformat(),
+                'rain_1h': round(hour['rain_1h'], 2),
+                'humidity': features[row][2],
+                'pop': hour['pop'],
+                'risk_score': round(float(probability[row]), 1),
+                'is_flood': bool(is_flood[row])
+            })
+            row += 1
+        if not timeline:
+            continue
+        peak = max(timeline, key=lambda step: step['risk_score'])
+        first_flood = next((step['time'] for step in timeline if step['is_flood']), None)
+        data.append({
+            'location_id': forecast['location_id'],
+            'location_name': names.get((round(forecast['latitude'], 4), round(forecast['longitude'], 4))),
+            'latitude': forecast['latitude'],
+            'longitude': forecast['longitude'],
+            'peak': {'time': peak['time'], 'risk_score': peak['risk_score']},
+            'first_flood_at': first_flood,
+            'timeline': timeline
+        })
+    data.sort(key=lambda entry: order.get(entry['location_name'], len(order)))
+    
+    print(f"[AI] ✓ Flood timeline: {len(features)} forecast hours for {len(data)} locations in one batch")
+    return {
+        'success': True,
+        'timestamp': datetime.now().isoformat(),
+        'model_version': state.version,
+        'horizon_hours': hours,
+        'water_level_cm': water_level,
+        'count': len(data),
+        'at_risk_count': sum(1 for entry in data if entry['first_flood_at']),
+        'data': data
+    }
 
 # --- TEST CASES FOR DEMO ---
 if __name__ == "__main__":
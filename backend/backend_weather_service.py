@@ -11,11 +11,18 @@ Run:
 Server runs at: http://localhost:5000
 """
 
-from flask import Flask, jsonify
+import atexit
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import Flask, Response, jsonify, redirect, request
 from flask_cors import CORS
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
 from typing import Literal
+from urllib.parse import urlsplit
 
 from config import (
     HCM_LOCATIONS,
@@ -24,11 +31,27 @@ from config import (
     MOCK_ALERTS,
     MOCK_SENSORS,
     supabase_client,
-    API_KEY
+    API_KEY,
+    WEATHER_CYCLE_WORKERS,
+    WEATHER_CYCLE_DEADLINE_SECONDS,
+    WEATHER_SNAPSHOT_MAX_AGE_SECONDS,
+    SSE_HEARTBEAT_SECONDS,
+    SSE_STREAM_HOST,
+    SSE_STREAM_PORT,
+    INGEST_BUFFER_MAX_ROWS,
+    INGEST_FLUSH_ROWS,
+    INGEST_FLUSH_INTERVAL_SECONDS,
+    INGEST_MAX_BODY_BYTES,
+    MODE_CHANNEL_HOST,
+    MODE_CHANNEL_PORT
 )
 from services import (
     fetch_from_openweather,
+    fetch_weather_with_source,
+    get_weather_cache_stats,
+    get_weather_inflight_stats,
     upload_water_level_to_supabase,
+    prune_water_level_readings,
     get_latest_water_levels,
     get_weather_for_all_districts,
     get_weather_for_district,
@@ -36,15 +59,45 @@ from services import (
     get_all_weather_alerts,
     store_weather_to_existing_schema,
     get_latest_weather_from_db,
-    get_weather_for_location_from_db
+    get_weather_for_location_from_db,
+    get_ingest_stats,
+    preload_condition_cache,
+    get_condition_cache_stats,
+    simulation_mode,
+    get_simulation_mode,
+    set_simulation_mode,
+    publish_ingested_readings,
+    store_ingested_readings,
+    get_spool_stats,
+    spool_drainer,
+    weather_location_index,
+    refresh_weather_location_index,
+    WEATHER_SPOOLED
 )
+from http_client import get_upstream_pool_stats
+from snapshots import SnapshotStore
+from timeseries import water_level_history, parse_duration
+from mode_channel import ModePublisher
+from broadcast import live_updates, TooManySubscribers
+from stream_server import EventStreamServer
+from ingest import WriteBehindBuffer, IngestError, parse_ndjson, parse_binary, BINARY_MAGIC
 from ai_training import (
     check_flood_status,
     check_flood_for_location,
-    check_flood_for_all_locations
+    check_flood_for_all_locations,
+    get_prediction_cache_stats,
+    get_model,
+    get_model_stats,
+    start_model_watcher,
+    compute_flood_risk_grid,
+    compute_flood_timeline
 )
+from risk_grid import flood_risk_grid
 
 app = Flask(__name__)
+# Werkzeug stops reading any body past this (chunked uploads included) with a 413;
+# the ingest endpoint has the largest bodies
+app.config['MAX_CONTENT_LENGTH'] = INGEST_MAX_BODY_BYTES
 # Configure CORS to allow requests from Next.js frontend
 CORS(app, 
      resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000", "*"]}},
@@ -55,6 +108,48 @@ print(f"[Backend] API Key: {API_KEY[:10]}...")
 print(f"[Backend] Monitoring {len(HCM_LOCATIONS)} HCM locations")
 print(f"[Backend] Monitoring {len(WATER_LEVEL_SENSORS)} water level sensors")
 
+# All-locations weather, published by the scheduler after each cycle
+weather_snapshot = SnapshotStore('weather_all')
+# Latest /api/weather/all entry per location name (kept across cycles)
+_weather_snapshot_entries = {}
+_weather_snapshot_lock = threading.Lock()
+
+# 48-hour flood timeline, rebuilt by the scheduler once per ingest cycle
+flood_timeline_snapshot = SnapshotStore('flood_timeline')
+_flood_timeline_lock = threading.Lock()
+
+
+def snapshot_response(snapshot):
+    """
+    Serve a pre-serialized snapshot with a strong ETag
+    Answers If-None-Match with 304 Not Modified
+    """
+    response = Response(snapshot.body, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
+def publish_weather_snapshot(entries: list):
+    """Publish the /api/weather/all payload for the given location entries"""
+    with _weather_snapshot_lock:
+        for entry in entries:
+            _weather_snapshot_entries[entry['location_name']] = entry
+        data = [_weather_snapshot_entries[loc['name']] for loc in HCM_LOCATIONS if loc['name'] in _weather_snapshot_entries]
+        return weather_snapshot.publish({
+            'success': True,
+            'count': len(data),
+            'timestamp': datetime.now().isoformat(),
+            'source': 'snapshot',
+            'data': data
+        })
+
+
+def publish_flood_timeline():
+    """Score the stored hourly forecasts and publish /api/flood/timeline"""
+    with _flood_timeline_lock:
+        return flood_timeline_snapshot.publish(compute_flood_timeline())
+
 
 # ============================================
 # API ENDPOINTS
@@ -70,35 +165,69 @@ def health():
     })
 
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Runtime counters for monitoring (caches, pools, scheduler cycles)
+    """
+    return jsonify({
+        'success': True,
+        'timestamp': datetime.now().isoformat(),
+        'weather_condition_cache': get_condition_cache_stats(),
+        'upstream_http': get_upstream_pool_stats(),
+        'weather_cache': get_weather_cache_stats(),
+        'weather_single_flight': get_weather_inflight_stats(),
+        'weather_snapshot': weather_snapshot.stats(),
+        'forecast_ingest': get_ingest_stats(),
+        'water_level_history': water_level_history.stats(),
+        'simulation_mode': simulation_mode.stats(),
+        'mode_channel': mode_publisher.stats() if mode_publisher else None,
+        'live_stream': live_updates.stats(),
+        'stream_server': stream_server.stats() if stream_server else None,
+        'ingest_buffer': ingest_buffer.stats(),
+        'write_spool': get_spool_stats(),
+        'weather_location_index': weather_location_index.stats(),
+        'prediction_cache': get_prediction_cache_stats(),
+        'flood_model': get_model_stats(),
+        'risk_grid': flood_risk_grid.stats(),
+        'flood_timeline': flood_timeline_snapshot.stats(),
+        'weather_cycle': last_weather_cycle
+    })
+
+
 @app.route('/api/weather/all', methods=['GET'])
 def get_all_weather():
     """
     Get weather for all HCM districts
     Frontend calls this to get all sensor data
+    
+    Served from the snapshot the scheduler publishes after every cycle
+    (strong ETag, 304 on If-None-Match). Only rebuilt here when there is no
+    snapshot yet or it is older than WEATHER_SNAPSHOT_MAX_AGE_SECONDS.
     """
     print(f"\n[Backend] REQUEST: GET /api/weather/all")
-    results = []
+    snapshot = weather_snapshot.get()
     
-    for location in HCM_LOCATIONS:
-        print(f"[Backend] Fetching {location['name']}...")
+    if snapshot is None or snapshot.age_seconds() > WEATHER_SNAPSHOT_MAX_AGE_SECONDS:
+        print(f"[Backend] No fresh weather snapshot, building one...")
+        results = []
         
-        weather_data = fetch_from_openweather(location['lat'], location['lng'])
+        for location in HCM_LOCATIONS:
+            weather_data, source = fetch_weather_with_source(location['lat'], location['lng'])
+            
+            if weather_data:
+                results.append({
+                    'location_name': location['name'],
+                    'latitude': location['lat'],
+                    'longitude': location['lng'],
+                    'source': source,
+                    'weather_data': weather_data
+                })
         
-        if weather_data:
-            results.append({
-                'location_name': location['name'],
-                'latitude': location['lat'],
-                'longitude': location['lng'],
-                'weather_data': weather_data
-            })
-    
-    print(f"[Backend] ✓ Returning {len(results)} weather datasets")
-    return jsonify({
-        'success': True,
-        'count': len(results),
-        'timestamp': datetime.now().isoformat(),
-        'data': results
-    })
+        snapshot = publish_weather_snapshot(results)
+    
+    print(f"[Backend] ✓ Returning weather snapshot v{snapshot.version} (etag {snapshot.etag[:8]})")
+    return snapshot_response(snapshot)
 
 
 @app.route('/api/weather/district/<district_name>', methods=['GET'])
@@ -127,7 +256,7 @@ def get_weather_by_district(district_name):
         }), 404
     
     print(f"[Backend] Fetching for {location['name']}...")
-    weather_data = fetch_from_openweather(location['lat'], location['lng'])
+    weather_data, source = fetch_weather_with_source(location['lat'], location['lng'])
     
     if not weather_data:
         print(f"[Backend] ERROR: Failed to fetch weather")
@@ -143,6 +272,7 @@ def get_weather_by_district(district_name):
         'latitude': location['lat'],
         'longitude': location['lng'],
         'timestamp': datetime.now().isoformat(),
+        'source': source,
         'data': weather_data
     })
 
@@ -155,7 +285,7 @@ def get_weather_by_coords(lat, lng):
     """
     print(f"\n[Backend] REQUEST: GET /api/weather/coords/{lat}/{lng}")
     
-    weather_data = fetch_from_openweather(lat, lng)
+    weather_data, source = fetch_weather_with_source(lat, lng)
     
     if not weather_data:
         return jsonify({
@@ -168,6 +298,7 @@ def get_weather_by_coords(lat, lng):
         'latitude': lat,
         'longitude': lng,
         'timestamp': datetime.now().isoformat(),
+        'source': source,
         'data': weather_data
     })
 
@@ -182,12 +313,13 @@ def get_all_alerts():
     alerts = []
     
     for location in HCM_LOCATIONS:
-        weather_data = fetch_from_openweather(location['lat'], location['lng'])
+        weather_data, source = fetch_weather_with_source(location['lat'], location['lng'])
         
         if weather_data and 'alerts' in weather_data:
             for alert in weather_data['alerts']:
                 alerts.append({
                     'location': location['name'],
+                    'source': source,
                     'alert': alert
                 })
     
@@ -229,20 +361,20 @@ def get_latest_water_levels():
     
     try:
         # Order by created_at desc if available to get freshest readings first
-    print('[Backend] Querying Supabase system_logs for latest water levels...')
-    response = supabase_client.table('system_logs').select('*').order('created_at', desc=True).limit(100).execute()
-    print('[Backend] Supabase system_logs rows:', len(response.data) if hasattr(response, 'data') and response.data else 0)
+        print('[Backend] Querying Supabase system_logs for latest water levels...')
+        response = supabase_client.table('system_logs').select('*').order('created_at', desc=True).limit(100).execute()
+        print('[Backend] Supabase system_logs rows:', len(response.data) if hasattr(response, 'data') and response.data else 0)
         
         data = response.data if hasattr(response, 'data') else []
         
-    result = {
+        result = {
             'success': True,
             'count': len(data),
             'timestamp': datetime.now().isoformat(),
             'readings': data
-    }
-    print('[Backend] Returning latest water levels payload:', { 'count': result['count'] })
-    return jsonify(result)
+        }
+        print('[Backend] Returning latest water levels payload:', { 'count': result['count'] })
+        return jsonify(result)
     except Exception as e:
         print(f"[Backend] ERROR: {e}")
         return jsonify({
@@ -254,47 +386,30 @@ def get_latest_water_levels():
 @app.route('/api/water-level/mode', methods=['GET', 'POST'])
 def water_level_mode():
     """
-    GET: Return current simulation mode from Supabase sensor_config (id=1)
+    GET: Return current simulation mode (in-memory, loaded once from sensor_config id=1)
     POST: Update mode. Body: {"mode": "SAFE"|"WARNING"|"CRITICAL"}
+    The new mode is written to sensor_config and pushed to subscribed simulators
     """
-    from flask import request
     print(f"\n[Backend] REQUEST: {request.method} /api/water-level/mode")
 
     if not supabase_client:
         return jsonify({'success': False, 'error': 'Supabase not configured'}), 503
 
     try:
-    if request.method == 'GET':
-            try:
-                print('[Backend] Fetching sensor_config mode (id=1)')
-                resp = supabase_client.table('sensor_config').select('mode').eq('id', 1).execute()
-                mode = (resp.data[0]['mode'] if resp.data else 'SAFE')
-            except Exception:
-                mode = 'SAFE'
+        if request.method == 'GET':
+            mode = get_simulation_mode()
             print('[Backend] Mode GET result:', mode)
             return jsonify({'success': True, 'mode': mode})
 
         # POST
-    data = request.get_json(silent=True) or {}
-    print('[Backend] Mode POST body:', data)
+        data = request.get_json(silent=True) or {}
+        print('[Backend] Mode POST body:', data)
         mode = str(data.get('mode', '')).upper()
         valid: tuple[Literal['SAFE','WARNING','CRITICAL'], ...] = ('SAFE', 'WARNING', 'CRITICAL')
         if mode not in valid:
             return jsonify({'success': False, 'error': 'Invalid mode. Use SAFE, WARNING, or CRITICAL.'}), 400
 
-        # Try update first
-        try:
-            print('[Backend] Updating sensor_config mode to', mode)
-            update_resp = supabase_client.table('sensor_config').update({'mode': mode}).eq('id', 1).execute()
-            # If no row updated, insert
-            if not getattr(update_resp, 'data', None):
-                print('[Backend] No existing row updated, inserting new mode row')
-                supabase_client.table('sensor_config').insert({'id': 1, 'mode': mode}).execute()
-        except Exception:
-            # Fallback to insert
-            print('[Backend] Update failed, inserting mode row')
-            supabase_client.table('sensor_config').insert({'id': 1, 'mode': mode}).execute()
-
+        set_simulation_mode(mode)
         print('[Backend] Mode updated to', mode)
         return jsonify({'success': True, 'mode': mode})
     except Exception as e:
@@ -330,6 +445,128 @@ def get_water_level_sensors():
     })
 
 
+# Guard against e.g. window=30d&resolution=1s
+HISTORY_MAX_POINTS = 10000
+
+
+def parse_history_params() -> tuple:
+    """
+    Read ?window= (default 1h) and ?resolution= (default 1m, 'raw' for
+    unaggregated samples); raises ValueError on bad input
+    """
+    window = parse_duration(request.args.get('window', '1h'))
+    resolution_arg = request.args.get('resolution', '1m')
+    resolution = None if resolution_arg == 'raw' else parse_duration(resolution_arg)
+    if resolution is not None and window // resolution > HISTORY_MAX_POINTS:
+        raise ValueError(f"window/resolution exceeds {HISTORY_MAX_POINTS} points")
+    return window, resolution, resolution_arg
+
+
+@app.route('/api/water-level/history/<sensor>', methods=['GET'])
+def get_water_level_history(sensor):
+    """
+    Water level history for one sensor, served from memory (no DB query)
+    Params: window (e.g. 1h, 24h), resolution (e.g. 10s, 1m, 15m, 1h, raw)
+    Each point carries min/max/avg/count over its bucket; 400 when the
+    history kept in memory does not reach back the whole window
+    """
+    try:
+        window, resolution, resolution_arg = parse_history_params()
+        points = water_level_history.history(sensor, window, resolution)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if points is None:
+        return jsonify({
+            'success': False,
+            'error': f'No history for sensor {sensor}',
+            'sensors': water_level_history.sensors()
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'sensor': sensor,
+        'window': request.args.get('window', '1h'),
+        'resolution': resolution_arg,
+        'count': len(points),
+        'points': points
+    })
+
+
+@app.route('/api/water-level/history', methods=['GET'])
+def get_all_water_level_history():
+    """
+    Water level history for every sensor, same params as the per-sensor endpoint
+    """
+    try:
+        window, resolution, resolution_arg = parse_history_params()
+        sensors = {
+            sensor: water_level_history.history(sensor, window, resolution)
+            for sensor in water_level_history.sensors()
+        }
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'window': request.args.get('window', '1h'),
+        'resolution': resolution_arg,
+        'sensors': sensors
+    })
+
+
+# Gateway readings wait here and reach system_logs in bulk (see ingest.py)
+ingest_buffer = WriteBehindBuffer(
+    store_ingested_readings,
+    max_rows=INGEST_BUFFER_MAX_ROWS,
+    flush_rows=INGEST_FLUSH_ROWS,
+    flush_interval=INGEST_FLUSH_INTERVAL_SECONDS,
+    on_batch=publish_ingested_readings
+)
+atexit.register(ingest_buffer.close)
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+
+@app.route('/api/water-level/ingest', methods=['POST'])
+def ingest_water_levels():
+    """
+    Batched readings from field gateways
+    Body: NDJSON (application/x-ndjson), one {"location", "water_level_cm",
+    "timestamp"?} per line, or the binary FGR1 format (application/octet-stream)
+    Returns 202 once queued; 503 with Retry-After when the buffer is full
+    """
+    if (request.content_length or 0) > INGEST_MAX_BODY_BYTES:
+        return jsonify({'success': False, 'error': f'Body exceeds {INGEST_MAX_BODY_BYTES} bytes'}), 413
+    
+    body = request.get_data(cache=False)
+    if request.content_length is None and len(body) >= INGEST_MAX_BODY_BYTES:
+        # Chunked body cut off at MAX_CONTENT_LENGTH; don't ingest a truncated batch
+        return jsonify({'success': False, 'error': f'Body exceeds {INGEST_MAX_BODY_BYTES} bytes'}), 413
+    try:
+        if request.mimetype in NDJSON_MIMETYPES:
+            readings = parse_ndjson(body)
+        elif request.mimetype == 'application/octet-stream' or body[:4] == BINARY_MAGIC:
+            readings = parse_binary(body)
+        else:
+            return jsonify({
+                'success': False,
+                'error': 'Unsupported Content-Type; use application/x-ndjson or application/octet-stream'
+            }), 415
+    except IngestError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    if not ingest_buffer.offer(readings):
+        retry_after = max(1, math.ceil(INGEST_FLUSH_INTERVAL_SECONDS))
+        return jsonify({
+            'success': False,
+            'error': 'Ingest buffer full, retry later',
+            'pending': ingest_buffer.pending()
+        }), 503, {'Retry-After': str(retry_after)}
+    
+    return jsonify({'success': True, 'accepted': len(readings), 'pending': ingest_buffer.pending()}), 202
+
+
 # ============================================
 # WEATHER DATA STORAGE ENDPOINTS
 # ============================================
@@ -580,6 +817,166 @@ def predict_flood_all():
         }), 500
 
 
+def current_risk_grid():
+    """The published risk grid; computed on demand before the first scheduler cycle"""
+    grid = flood_risk_grid.get()
+    if grid is None:
+        print(f"[Backend] No risk grid yet, computing one...")
+        grid = compute_flood_risk_grid()
+    return grid
+
+
+@app.route('/api/flood/risk-grid', methods=['GET'])
+def get_flood_risk_grid():
+    """
+    City-wide flood risk raster: bounds, shape, risk summary and the tile URL
+    template for map overlays (recomputed after every scheduler cycle)
+    Query params: values=true adds the risk % per cell (rows south to north)
+    
+    Example: /api/flood/risk-grid
+    """
+    print(f"\n[Backend] REQUEST: GET /api/flood/risk-grid")
+    
+    try:
+        grid = current_risk_grid()
+        payload = {
+            'success': True,
+            'timestamp': datetime.now().isoformat(),
+            **grid.summary(),
+            'tile_url': f"/api/flood/risk-grid/tiles/{{z}}/{{x}}/{{y}}.png?v={grid.version}",
+            'min_zoom': flood_risk_grid.min_zoom,
+            'max_zoom': flood_risk_grid.max_zoom
+        }
+        if request.args.get('values', 'false').lower() == 'true':
+            payload['values'] = grid.risk.round(1).tolist()
+        return jsonify(payload)
+    except Exception as e:
+        print(f"[Backend] ERROR: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route('/api/flood/risk-grid/tiles/<int:z>/<int:x>/<int:y>.png', methods=['GET'])
+def get_flood_risk_tile(z, x, y):
+    """
+    One 256px XYZ PNG tile of the risk grid (transparent outside it)
+    Tiles are cached per grid version and answered with a strong ETag
+    
+    Example: /api/flood/risk-grid/tiles/12/3262/1924.png
+    """
+    if not (flood_risk_grid.min_zoom <= z <= flood_risk_grid.max_zoom) or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return jsonify({
+            'success': False,
+            'error': f'Tile out of range (zoom {flood_risk_grid.min_zoom}-{flood_risk_grid.max_zoom})'
+        }), 404
+    
+    try:
+        current_risk_grid()
+        png, version = flood_risk_grid.tile(z, x, y)
+    except Exception as e:
+        print(f"[Backend] ERROR rendering risk tile {z}/{x}/{y}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    response = Response(png, mimetype='image/png')
+    response.set_etag(f"{version}-{z}-{x}-{y}")
+    # Versioned URLs (?v=) change with every grid, so browsers may reuse a tile briefly
+    response.headers['Cache-Control'] = 'public, max-age=300'
+    return response.make_conditional(request)
+
+
+@app.route('/api/flood/timeline', methods=['GET'])
+def get_flood_timeline():
+    """
+    Hourly flood risk for the next 48 forecast hours of every location
+    Served from the snapshot published after each ingest cycle (strong ETag,
+    304 on If-None-Match); only built here before the first cycle
+    
+    Example: /api/flood/timeline
+    """
+    print(f"\n[Backend] REQUEST: GET /api/flood/timeline")
+    snapshot = flood_timeline_snapshot.get()
+    
+    if snapshot is None:
+        try:
+            with _flood_timeline_lock:
+                # Concurrent first requests wait for one build
+                snapshot = flood_timeline_snapshot.get()
+                if snapshot is None:
+                    print(f"[Backend] No flood timeline yet, computing one...")
+                    snapshot = flood_timeline_snapshot.publish(compute_flood_timeline())
+        except Exception as e:
+            print(f"[Backend] ERROR: {e}")
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 500
+    
+    print(f"[Backend] ✓ Returning flood timeline v{snapshot.version} (etag {snapshot.etag[:8]})")
+    return snapshot_response(snapshot)
+
+
+# ============================================
+# LIVE UPDATES (SERVER-SENT EVENTS)
+# ============================================
+
+STREAM_TOPICS = ('water_level', 'prediction')
+
+
+@app.route('/api/stream', methods=['GET'])
+def stream_live_updates():
+    """
+    Server-Sent Events stream of new water level readings (every upload tick)
+    and recomputed flood predictions (every weather cycle)
+    Params: topics (comma-separated, default all of water_level,prediction)
+    On connect the latest event of each topic is replayed
+    
+    While the event stream server runs (SSE_STREAM_PORT) clients are
+    redirected to it, where one thread serves every connection; otherwise
+    each client holds a Werkzeug worker thread for as long as it listens
+    """
+    if stream_server:
+        host = urlsplit(request.host_url).hostname
+        host = f'[{host}]' if ':' in host else host
+        return redirect(f"{request.scheme}://{host}:{stream_server.port}{request.full_path}", code=307)
+    
+    topics_arg = request.args.get('topics')
+    topics = None
+    if topics_arg:
+        topics = frozenset(t.strip() for t in topics_arg.split(',') if t.strip())
+        unknown = topics - set(STREAM_TOPICS)
+        if unknown:
+            return jsonify({
+                'success': False,
+                'error': f"Unknown topics: {', '.join(sorted(unknown))}",
+                'available_topics': list(STREAM_TOPICS)
+            }), 400
+    
+    try:
+        subscription = live_updates.subscribe(topics)
+    except TooManySubscribers as e:
+        return jsonify({'success': False, 'error': str(e)}), 503, {'Retry-After': '30'}
+    
+    def generate():
+        try:
+            yield b"retry: 5000\n\n"
+            while True:
+                frames = subscription.wait(SSE_HEARTBEAT_SECONDS)
+                # Comment line keeps proxies open and detects gone clients
+                yield b"".join(frames) if frames else b": keep-alive\n\n"
+        finally:
+            live_updates.unsubscribe(subscription)
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 # ============================================
 # ERROR HANDLERS
 # ============================================
@@ -591,6 +988,7 @@ def not_found(error):
         'error': 'Endpoint not found',
         'available_endpoints': {
             'GET /health': 'Health check',
+            'GET /api/metrics': 'Runtime cache and scheduler counters',
             'GET /api/weather/all': 'Get weather for all districts',
             'GET /api/weather/district/<name>': 'Get weather for specific district',
             'GET /api/weather/coords/<lat>/<lng>': 'Get weather for coordinates',
@@ -600,6 +998,9 @@ def not_found(error):
             'GET /api/locations': 'Get monitored locations',
             'GET /api/water-level/latest': 'Get latest water level readings',
             'GET /api/water-level/sensors': 'Get water level sensors',
+            'GET /api/water-level/history': 'In-memory water level history for all sensors (params: window, resolution)',
+            'GET /api/water-level/history/<sensor>': 'In-memory water level history for one sensor (params: window, resolution)',
+            'POST /api/water-level/ingest': 'Batched gateway readings (NDJSON or binary FGR1)',
             'GET /api/districts/summary': 'Get districts with alert counts & risk levels',
             'GET /api/alerts/active': 'Get all active alerts',
             'GET /api/alerts/by-district/<name>': 'Get alerts for specific district',
@@ -607,11 +1008,23 @@ def not_found(error):
             'GET /api/sensors/<id>': 'Get specific sensor details',
             'GET /api/flood/predict': 'Predict flood for coordinates (params: lat, lng, water_level)',
             'GET /api/flood/predict/location/<name>': 'Predict flood for named location',
-            'GET /api/flood/predict/all': 'Predict flood for all monitored locations'
+            'GET /api/flood/predict/all': 'Predict flood for all monitored locations',
+            'GET /api/flood/risk-grid': 'City-wide flood risk raster summary and tile URL (params: values)',
+            'GET /api/flood/risk-grid/tiles/<z>/<x>/<y>.png': 'Flood risk map tile (PNG, cached per grid version)',
+            'GET /api/flood/timeline': '48-hour flood risk timeline per location (from stored hourly forecasts)',
+            'GET /api/stream': 'Server-Sent Events: live water levels and predictions (params: topics)'
         }
     }), 404
 
 
+@app.errorhandler(413)
+def payload_too_large(error):
+    return jsonify({
+        'success': False,
+        'error': f'Body exceeds {INGEST_MAX_BODY_BYTES} bytes'
+    }), 413
+
+
 @app.errorhandler(500)
 def server_error(error):
     return jsonify({
@@ -624,13 +1037,71 @@ def server_error(error):
 # SCHEDULED BACKGROUND TASKS
 # ============================================
 
-def fetch_and_store_all_weather():
+def fetch_and_store_location(location: dict, deadline: float | None = None) -> dict:
+    """
+    Fetch one location from OpenWeather and store it to Supabase
+    Returns a report: {'name', 'status', 'duration_s', 'weather_data'}
+    """
+    started = time.monotonic()
+    report = {'name': location['name'], 'status': 'failed', 'duration_s': 0.0, 'weather_data': None}
+    
+    if deadline is not None and started >= deadline:
+        report['status'] = 'skipped'
+        print(f"[Scheduler] ✗ {location['name']}: SKIPPED (cycle deadline passed)")
+        return report
+    
+    try:
+        # Always fetch live; the response also warms the shared weather cache
+        weather_data = fetch_from_openweather(location['lat'], location['lng'], refresh=True)
+        report['weather_data'] = weather_data
+        
+        if weather_data:
+            # Store to database with UPSERT pattern (delete old + insert new)
+            store_result = store_weather_to_existing_schema(
+                location['name'],
+                location['lat'],
+                location['lng'],
+                weather_data
+            )
+            if store_result == WEATHER_SPOOLED:
+                report['status'] = 'spooled'
+            elif store_result:
+                report['status'] = 'success'
+            else:
+                print(f"[Scheduler] ✗ {location['name']}: FAILED (store returned False)")
+        else:
+            print(f"[Scheduler] ✗ {location['name']}: FAILED (no API data)")
+            
+    except Exception as e:
+        report['status'] = 'error'
+        print(f"[Scheduler] ✗ {location['name']}: EXCEPTION: {type(e).__name__}: {str(e)}")
+        import traceback
+        traceback.print_exc()
+    
+    report['duration_s'] = round(time.monotonic() - started, 3)
+    if report['status'] == 'success':
+        print(f"[Scheduler] ✓ {location['name']}: SUCCESS ({report['duration_s']}s)")
+    return report
+
+
+# Report of the most recent weather cycle (served by /api/metrics)
+last_weather_cycle = None
+
+
+def fetch_and_store_all_weather(locations: list | None = None):
     """
     Fetch weather data from OpenWeather API for all locations
     and store to Supabase database (UPSERT pattern)
     
+    Locations are processed by a bounded pool of WEATHER_CYCLE_WORKERS threads
+    (1 = sequential). Locations not finished within WEATHER_CYCLE_DEADLINE_SECONDS
+    are reported as timed out so the cycle always ends inside the interval.
+    
     Called every 5 minutes by the scheduler
     """
+    global last_weather_cycle
+    locations = HCM_LOCATIONS if locations is None else locations
+    
     print(f"\n{'='*70}")
     print(f"[Scheduler] WEATHER FETCH CYCLE at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"{'='*70}")
@@ -638,55 +1109,126 @@ def fetch_and_store_all_weather():
     if not supabase_client:
         print("[Scheduler] ✗ Supabase not configured, skipping weather fetch")
         print("="*70)
-        return
+        return None
     
-    success_count = 0
-    error_count = 0
+    workers = max(1, min(WEATHER_CYCLE_WORKERS, len(locations) or 1))
+    print(f"[Scheduler] Processing {len(locations)} locations with {workers} workers...\n")
     
-    print(f"[Scheduler] Processing {len(HCM_LOCATIONS)} locations...\n")
+    started_at = datetime.now()
+    started = time.monotonic()
+    ingest_before = get_ingest_stats()
+    deadline = started + WEATHER_CYCLE_DEADLINE_SECONDS
     
-    for i, location in enumerate(HCM_LOCATIONS, 1):
-        print(f"[Scheduler] [{i}/{len(HCM_LOCATIONS)}] {location['name']} ({location['lat']}, {location['lng']})")
-        try:
-            # Fetch data from OpenWeather API
-            print(f"[DEBUG]    Fetching from OpenWeather API...")
-            weather_data = fetch_from_openweather(location['lat'], location['lng'])
-            
-            if weather_data:
-                print(f"[DEBUG]    ✓ API Response received, keys: {list(weather_data.keys())}")
-                print(f"[DEBUG]    Calling store_weather_to_existing_schema...")
-                # Store to database with UPSERT pattern (delete old + insert new)
-                store_result = store_weather_to_existing_schema(
-                    location['name'],
-                    location['lat'],
-                    location['lng'],
-                    weather_data
-                )
-                if store_result:
-                    success_count += 1
-                    print(f"[Scheduler] ✓ {location['name']}: SUCCESS\n")
-                else:
-                    error_count += 1
-                    print(f"[Scheduler] ✗ {location['name']}: FAILED (store returned False)\n")
-            else:
-                error_count += 1
-                print(f"[Scheduler] ✗ {location['name']}: FAILED (no API data)\n")
-                
-        except Exception as e:
-            error_count += 1
-            print(f"[Scheduler] ✗ {location['name']}: EXCEPTION: {type(e).__name__}: {str(e)}\n")
-            import traceback
-            traceback.print_exc()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='weather-cycle')
+    futures = {
+        executor.submit(fetch_and_store_location, location, deadline): location
+        for location in locations
+    }
+    done, not_done = wait(futures, timeout=WEATHER_CYCLE_DEADLINE_SECONDS)
+    # Don't block the scheduler on stragglers; queued locations are dropped
+    executor.shutdown(wait=False, cancel_futures=True)
+    
+    reports = [future.result() for future in done]
+    for future in not_done:
+        reports.append({'name': futures[future]['name'], 'status': 'timeout', 'duration_s': None, 'weather_data': None})
+    
+    # Materialize /api/weather/all for this cycle (failed locations keep their previous entry)
+    by_name = {location['name']: location for location in locations}
+    snapshot = publish_weather_snapshot([{
+        'location_name': r['name'],
+        'latitude': by_name[r['name']]['lat'],
+        'longitude': by_name[r['name']]['lng'],
+        'source': 'live',
+        'weather_data': r['weather_data']
+    } for r in reports if r['weather_data']])
+    print(f"[Scheduler] ✓ Published weather snapshot v{snapshot.version} ({len(snapshot.body)} bytes)")
+    
+    success_count = sum(1 for r in reports if r['status'] == 'success')
+    spooled_count = sum(1 for r in reports if r['status'] == 'spooled')
+    error_count = len(reports) - success_count - spooled_count
+    durations = [r['duration_s'] for r in reports if r['duration_s'] is not None]
+    ingest_after = get_ingest_stats()
+    rows_written = sum(ingest_after[k] - ingest_before[k] for k in ('rows_inserted', 'rows_updated'))
+    rows_skipped = ingest_after['rows_skipped'] - ingest_before['rows_skipped']
+    
+    last_weather_cycle = {
+        'started_at': started_at.isoformat(),
+        'duration_s': round(time.monotonic() - started, 3),
+        'workers': workers,
+        'deadline_s': WEATHER_CYCLE_DEADLINE_SECONDS,
+        'locations': len(locations),
+        'success': success_count,
+        'spooled': spooled_count,
+        'failed': error_count,
+        'timed_out': len(not_done),
+        'max_location_duration_s': max(durations) if durations else None,
+        'forecast_rows_written': rows_written,
+        'forecast_rows_skipped': rows_skipped,
+        'location_durations': {r['name']: r['duration_s'] for r in reports}
+    }
     
     print(f"{'='*70}")
-    print(f"[Scheduler] CYCLE COMPLETE: {success_count} successful, {error_count} failed")
+    print(f"[Scheduler] CYCLE COMPLETE in {last_weather_cycle['duration_s']}s: "
+          f"{success_count} successful, {spooled_count} spooled, {error_count} failed ({len(not_done)} timed out), "
+          f"forecast rows {rows_written} written / {rows_skipped} unchanged")
     print(f"{'='*70}\n")
+    
+    # New weather means new predictions; check_flood_for_all_locations streams them
+    try:
+        refresh_weather_location_index()
+    except Exception as e:
+        print(f"[Scheduler] Error refreshing weather location index: {e}")
+    try:
+        check_flood_for_all_locations()
+    except Exception as e:
+        print(f"[Scheduler] Error refreshing flood predictions: {e}")
+    try:
+        compute_flood_risk_grid()
+    except Exception as e:
+        print(f"[Scheduler] Error refreshing flood risk grid: {e}")
+    try:
+        snapshot = publish_flood_timeline()
+        print(f"[Scheduler] ✓ Published flood timeline v{snapshot.version} ({len(snapshot.body)} bytes)")
+    except Exception as e:
+        print(f"[Scheduler] Error refreshing flood timeline: {e}")
+    return last_weather_cycle
 
 
 # ============================================
 # BACKGROUND SCHEDULER
 # ============================================
 
+mode_publisher = None
+stream_server = None
+
+
+def start_mode_publisher():
+    """
+    Push simulation mode changes to water_level.py simulators over the
+    local mode channel
+    """
+    global mode_publisher
+    try:
+        mode_publisher = ModePublisher(simulation_mode, MODE_CHANNEL_HOST, MODE_CHANNEL_PORT).start()
+    except OSError as e:
+        print(f"[Mode] ✗ Could not open mode channel on {MODE_CHANNEL_HOST}:{MODE_CHANNEL_PORT}: {e}")
+
+
+def start_stream_server():
+    """
+    Serve /api/stream from the single-threaded event stream server; when it
+    cannot start (or SSE_STREAM_PORT is 0) Flask keeps serving the stream
+    """
+    global stream_server
+    if not SSE_STREAM_PORT:
+        return
+    try:
+        stream_server = EventStreamServer(live_updates, STREAM_TOPICS, SSE_STREAM_HOST, SSE_STREAM_PORT,
+                                          SSE_HEARTBEAT_SECONDS).start()
+    except OSError as e:
+        print(f"[Stream] ✗ Could not open {SSE_STREAM_HOST}:{SSE_STREAM_PORT}, serving /api/stream from Flask: {e}")
+
+
 def start_water_level_collector():
     """
     Start the background scheduler to collect water level data every 10 seconds
@@ -698,6 +1240,10 @@ def start_water_level_collector():
     scheduler.add_job(upload_water_level_to_supabase, 'interval', seconds=10)
     print(f"[Scheduler] ✓ Water level job scheduled (10s intervals)")
     
+    # Bound the water level history table
+    scheduler.add_job(prune_water_level_readings, 'interval', hours=24, next_run_time=datetime.now())
+    print(f"[Scheduler] ✓ Water level history retention job scheduled (daily)")
+    
     # Schedule weather data fetch every 5 minutes (300 seconds)
     scheduler.add_job(fetch_and_store_all_weather, 'interval', seconds=300)
     print(f"[Scheduler] ✓ Weather data job scheduled (5min intervals)")
@@ -720,6 +1266,7 @@ if __name__ == '__main__':
     print(f"Supabase: {'✓ Connected' if supabase_client else '✗ Not configured'}")
     print("\nAvailable endpoints:")
     print("  GET http://localhost:5000/health")
+    print("  GET http://localhost:5000/api/metrics")
     print("  GET http://localhost:5000/api/weather/all")
     print("  GET http://localhost:5000/api/weather/district/District%207")
     print("  GET http://localhost:5000/api/weather/coords/10.757/106.682")
@@ -727,6 +1274,9 @@ if __name__ == '__main__':
     print("  GET http://localhost:5000/api/locations")
     print("  GET http://localhost:5000/api/water-level/latest")
     print("  GET http://localhost:5000/api/water-level/sensors")
+    print("  GET http://localhost:5000/api/water-level/history?window=1h&resolution=1m")
+    print("  GET http://localhost:5000/api/water-level/history/Sensor_Tram_A?window=24h&resolution=1h")
+    print("  POST http://localhost:5000/api/water-level/ingest")
     print("\n  MVP Mock Data Endpoints:")
     print("  GET http://localhost:5000/api/districts/summary")
     print("  GET http://localhost:5000/api/alerts/active")
@@ -737,12 +1287,37 @@ if __name__ == '__main__':
     print("  GET http://localhost:5000/api/flood/predict?lat=10.762&lng=106.660")
     print("  GET http://localhost:5000/api/flood/predict/location/District%207")
     print("  GET http://localhost:5000/api/flood/predict/all")
+    print("  GET http://localhost:5000/api/flood/risk-grid")
+    print("  GET http://localhost:5000/api/flood/risk-grid/tiles/12/3262/1924.png")
+    print("  GET http://localhost:5000/api/flood/timeline")
+    print("\n  Live Updates (Server-Sent Events):")
+    print("  GET http://localhost:5000/api/stream?topics=water_level,prediction")
     print("\nPress Ctrl+C to stop")
     print("="*60 + "\n")
     
-    # Start water level collector if Supabase is configured
-    if supabase_client:
+    debug = True
+    
+    # With the debug reloader this module also runs in the watching parent
+    # process; background work only belongs in the child that serves requests
+    serving_process = not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    
+    # Warm caches and start water level collector if Supabase is configured
+    if supabase_client and serving_process:
+        preload_condition_cache()
         start_water_level_collector()
+        start_mode_publisher()
+        # Replays anything left in the spool by a previous run
+        spool_drainer.start()
+    
+    # Load and warm up the flood model before the first request, then pick
+    # up retrained models written over MODEL_PATH
+    if serving_process:
+        try:
+            get_model()
+        except Exception as e:
+            print(f"[AI] ✗ Could not load flood model: {e}")
+        start_model_watcher()
+        start_stream_server()
     
     # Allow connections from other hosts (0.0.0.0) for better compatibility
-    app.run(debug=True, port=5000, host='0.0.0.0')
+    app.run(debug=debug, port=5000, host='0.0.0.0')
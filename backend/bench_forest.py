@@ -0,0 +1,80 @@
+"""
+Benchmark: batch throughput of the compiled flood model
+Runs the same random batches through sklearn's predict_proba and through
+CompiledForest (lookup tables, and the node-array walk it falls back to),
+reporting rows per second and the largest probability difference.
+
+Run (from backend/):
+    python compiled_forest.py          # build hcmc_flood_model.npz first
+    python bench_forest.py --sizes 1,100,10000,100000
+"""
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from compiled_forest import CompiledForest, file_version
+
+FEATURE_COLUMNS = ['rainfall_1h', 'tide_level', 'humidity']
+
+
+def rows_per_second(fn, X, min_seconds: float) -> float:
+    fn(X)
+    calls = 0
+    started = time.perf_counter()
+    while True:
+        fn(X)
+        calls += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return calls * len(X) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compiled forest throughput benchmark')
+    parser.add_argument('--model', default=str(Path(__file__).parent / 'hcmc_flood_model.pkl'))
+    parser.add_argument('--sizes', default='1,100,10000,100000', help='comma-separated batch sizes')
+    parser.add_argument('--min-seconds', type=float, default=1.0, help='time spent per measurement')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', module='sklearn')
+    model = joblib.load(args.model)
+    compiled_path = Path(args.model).with_suffix('.npz')
+    if compiled_path.exists() and CompiledForest.load(compiled_path).source_version == file_version(args.model):
+        compiled = CompiledForest.load(compiled_path)
+    else:
+        print(f"[Bench] {compiled_path.name} missing or stale, compiling in memory")
+        compiled = CompiledForest.from_sklearn(model, file_version(args.model))
+    walker = CompiledForest.from_sklearn(model)
+    walker._tables = None
+
+    print(f"[Bench] {len(compiled.roots)} trees, {compiled.node_count} nodes, depth {compiled.max_depth}, "
+          f"{compiled.table_cells} lookup cells")
+    print(f"[Bench] {'rows':>8} {'sklearn rows/s':>16} {'compiled rows/s':>16} {'node walk rows/s':>17} "
+          f"{'speedup':>8} {'max |Δp|':>9}")
+
+    rng = np.random.default_rng(args.seed)
+    for size in [int(s) for s in args.sizes.split(',')]:
+        X = np.column_stack([
+            rng.uniform(0, 80, size),     # rainfall_1h (mm)
+            rng.uniform(50, 200, size),   # tide_level (cm)
+            rng.uniform(40, 100, size),   # humidity (%)
+        ])
+        frame = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+        error = float(np.abs(model.predict_proba(frame) - compiled.predict_proba(X)).max())
+        sklearn_rate = rows_per_second(lambda _: model.predict_proba(frame), X, args.min_seconds)
+        compiled_rate = rows_per_second(compiled.predict_proba, X, args.min_seconds)
+        walk_rate = rows_per_second(walker.predict_proba, X, args.min_seconds)
+        print(f"[Bench] {size:>8} {sklearn_rate:>16,.0f} {compiled_rate:>16,.0f} {walk_rate:>17,.0f} "
+              f"{compiled_rate / sklearn_rate:>7.1f}x {error:>9.2g}")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Benchmark: per-call latency of a single flood prediction
+Compares the original DataFrame path (predict + predict_proba), the batch
+path with one row (DataFrame + predict_proba), predict_flood_one's NumPy
+fast path over the sklearn trees, and the compiled forest engine through
+the batch path and through predict_flood_one. Checks that all of them
+agree on every input.
+
+Run (from backend/):
+    python bench_inference.py --calls 2000
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+import warnings
+from contextlib import redirect_stdout
+
+import joblib
+import numpy as np
+import pandas as pd
+
+
+def timed(fn, rows) -> np.ndarray:
+    fn(*rows[0])
+    latencies = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        started = time.perf_counter()
+        fn(*row)
+        latencies[i] = time.perf_counter() - started
+    return latencies * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Single prediction latency benchmark')
+    parser.add_argument('--calls', type=int, default=2000, help='predictions per path')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.setdefault('OPENWEATHER_API_KEY', 'benchmark')
+    warnings.filterwarnings('ignore', module='sklearn')
+    with redirect_stdout(io.StringIO()):
+        import ai_training as ai
+    from compiled_forest import CompiledForest
+
+    rng = np.random.default_rng(args.seed)
+    rows = np.column_stack([
+        rng.uniform(0, 80, args.calls),     # rainfall_1h (mm)
+        rng.uniform(50, 200, args.calls),   # tide_level (cm)
+        rng.uniform(40, 100, args.calls),   # humidity (%)
+    ]).tolist()
+
+    model = joblib.load(ai.MODEL_PATH)
+    sklearn_state = ai.LoadedModel(model, ai.check_model_features(model), 'bench', None, '', 'sklearn')
+    compiled_state = ai.LoadedModel(CompiledForest.from_sklearn(model), None, 'bench', None, '', 'compiled')
+
+    def dataframe_path(rain_1h, water_level, humidity):
+        input_data = pd.DataFrame([[rain_1h, water_level, humidity]], columns=ai.FEATURE_COLUMNS)
+        is_flood = model.predict(input_data)[0]
+        return bool(is_flood), model.predict_proba(input_data)[0][1] * 100
+
+    def batch_path(state):
+        def predict(rain_1h, water_level, humidity):
+            is_flood, probability = ai.predict_flood_batch([(rain_1h, water_level, humidity)], state)
+            return bool(is_flood[0]), float(probability[0])
+        return predict
+
+    paths = [
+        ('DataFrame predict + predict_proba', dataframe_path),
+        ('DataFrame predict_proba (batch of 1)', batch_path(sklearn_state)),
+        ('NumPy fast path (sklearn trees)', lambda *row: ai.predict_flood_one(*row, state=sklearn_state)),
+        ('Compiled forest (batch of 1)', batch_path(compiled_state)),
+        ('Compiled forest (predict_flood_one)', lambda *row: ai.predict_flood_one(*row, state=compiled_state)),
+    ]
+
+    check = rows[:200]
+    expected = [dataframe_path(*row) for row in check]
+    for name, fn in paths[1:]:
+        for row, (is_flood, probability) in zip(check, expected):
+            got_flood, got_probability = fn(*row)
+            if got_flood != is_flood or abs(got_probability - probability) > 1e-9:
+                raise RuntimeError(f'{name} disagrees on {row}: {(got_flood, got_probability)} != {(is_flood, probability)}')
+
+    print(f"[Bench] {args.calls} single predictions per path, "
+          f"{len(model.estimators_)} trees, {compiled_state.model.table_cells} table cells, "
+          f"sklearn fast path {'on' if sklearn_state.trees else 'off (predict_proba fallback)'}")
+    baseline = None
+    for name, fn in paths:
+        latencies = timed(fn, rows)
+        mean = latencies.mean()
+        baseline = baseline or mean
+        print(f"[Bench] {name:<38} mean {mean:7.3f} ms  p50 {np.percentile(latencies, 50):7.3f} ms  "
+              f"p99 {np.percentile(latencies, 99):7.3f} ms  ({baseline / mean:5.1f}x)")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
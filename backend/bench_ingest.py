@@ -0,0 +1,119 @@
+"""
+Benchmark: POST /api/water-level/ingest against the local PostgREST stand-in
+Gateways post batches of readings (NDJSON or binary FGR1) to a threaded
+server; the write-behind buffer flushes them in bulk (water_level_readings
+history plus the latest row per sensor in system_logs).
+Reports accepted readings per second, 503 backpressure and flush stats.
+
+Run (from backend/):
+    python bench_ingest.py --format binary --batch 5000 --gateways 4 --seconds 10
+    python bench_ingest.py --format ndjson --batch 1000
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import redirect_stdout
+
+import requests
+from werkzeug.serving import make_server
+
+from postgrest_standin import PostgrestStandin, STANDIN_KEY
+
+
+def make_batch(fmt: str, gateway: int, size: int, sensors: int, encode_binary) -> tuple:
+    now = time.time()
+    readings = [(f'Sensor_GW{gateway:02d}_{i % sensors:04d}', round(50 + (i % 97) * 0.5, 2), now + i * 1e-3)
+                for i in range(size)]
+    if fmt == 'binary':
+        return encode_binary(readings), 'application/octet-stream'
+    body = '\n'.join(json.dumps({'location': loc, 'water_level_cm': level, 'timestamp': ts})
+                     for loc, level, ts in readings)
+    return body.encode('utf-8'), 'application/x-ndjson'
+
+
+def gateway(url: str, body: bytes, content_type: str, size: int, stop: threading.Event, totals: dict, lock):
+    session = requests.Session()
+    accepted = rejected = 0
+    while not stop.is_set():
+        response = session.post(url, data=body, headers={'Content-Type': content_type})
+        if response.status_code == 202:
+            accepted += size
+        elif response.status_code == 503:
+            rejected += size
+            time.sleep(float(response.headers.get('Retry-After', '1')))
+        else:
+            raise RuntimeError(f'{response.status_code}: {response.text[:200]}')
+    with lock:
+        totals['accepted'] += accepted
+        totals['rejected'] += rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gateway ingest benchmark')
+    parser.add_argument('--format', choices=('ndjson', 'binary'), default='binary')
+    parser.add_argument('--batch', type=int, default=5000, help='readings per request')
+    parser.add_argument('--gateways', type=int, default=4, help='concurrent posting clients')
+    parser.add_argument('--sensors', type=int, default=500, help='distinct sensors per gateway')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='simulated DB round trip latency')
+    args = parser.parse_args()
+
+    standin = PostgrestStandin(latency_ms=args.latency_ms).start()
+    os.environ['SUPABASE_URL'] = standin.url
+    os.environ['SERVICE_ROLE_PRIVATE'] = STANDIN_KEY
+    os.environ.setdefault('OPENWEATHER_API_KEY', 'benchmark')
+
+    with redirect_stdout(io.StringIO()):
+        import backend_weather_service as backend
+        from ingest import encode_binary
+    backend.app.logger.disabled = True
+    import logging
+    logging.getLogger('werkzeug').disabled = True
+
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/api/water-level/ingest'
+
+    print(f"[Bench] {args.gateways} gateways x {args.batch} {args.format} readings/request, "
+          f"{args.seconds:.0f}s, {args.latency_ms:.0f} ms simulated DB latency")
+
+    stop = threading.Event()
+    totals = {'accepted': 0, 'rejected': 0}
+    lock = threading.Lock()
+    threads = []
+    for g in range(args.gateways):
+        body, content_type = make_batch(args.format, g, args.batch, args.sensors, encode_binary)
+        thread = threading.Thread(target=gateway, args=(url, body, content_type, args.batch, stop, totals, lock))
+        thread.start()
+        threads.append(thread)
+
+    started = time.perf_counter()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with redirect_stdout(io.StringIO()):
+        backend.ingest_buffer.close(timeout=60)
+    drained = time.perf_counter() - started
+    stats = backend.ingest_buffer.stats()
+
+    print(f"[Bench] accepted {totals['accepted']} readings in {elapsed:.1f}s "
+          f"= {totals['accepted'] / elapsed:,.0f} readings/s ({totals['rejected']} refused with 503)")
+    print(f"[Bench] flushed {stats['flushed']} in {stats['flushes']} flushes "
+          f"({stats['flush_errors']} errors), buffer drained after {drained:.1f}s")
+    print(f"[Bench] water_level_readings rows: {len(standin.db.rows('water_level_readings'))}, "
+          f"system_logs rows: {len(standin.db.rows('system_logs'))}, "
+          f"DB round trips: {standin.db.total_requests()}")
+    server.shutdown()
+    standin.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
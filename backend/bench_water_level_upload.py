@@ -0,0 +1,83 @@
+"""
+Benchmark: water level upload tick against the local PostgREST stand-in
+Compares the old per-sensor DELETE + INSERT loop with the bulk writes done
+by upload_water_level_to_supabase (one history append, one latest-row
+upsert), for a configurable sensor count.
+
+Run (from backend/):
+    python bench_water_level_upload.py --sensors 1000 --latency-ms 20
+    python bench_water_level_upload.py --sensors 10000 --skip-legacy
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+import uuid
+from contextlib import redirect_stdout
+
+from postgrest_standin import PostgrestStandin, STANDIN_KEY
+
+TICK_SECONDS = 10
+
+
+def make_sensors(count: int) -> list:
+    return [{'location': f'Sensor_Bench_{i:05d}', 'current_level': 100.0} for i in range(count)]
+
+
+def legacy_upload(client, services, sensors: list):
+    """The previous upload loop: one DELETE and one INSERT per sensor"""
+    for sensor in sensors:
+        data = {
+            'id': str(uuid.uuid4()),
+            'water_level_cm': services.update_water_level(sensor),
+            'location': sensor['location'],
+        }
+        client.table('system_logs').delete().eq('location', sensor['location']).execute()
+        client.table('system_logs').insert(data).execute()
+
+
+def run(label: str, standin, fn, ticks: int, sensors: int):
+    for tick in range(1, ticks + 1):
+        standin.db.reset_counters()
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            fn()
+        elapsed = time.perf_counter() - started
+        verdict = 'OK' if elapsed < TICK_SECONDS else 'OVER BUDGET'
+        print(f"[Bench] {label:8} tick {tick}: {sensors} sensors, {standin.db.total_requests()} round trips, "
+              f"{elapsed:.3f}s ({elapsed / TICK_SECONDS:.1%} of the {TICK_SECONDS}s tick) {verdict}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Water level upload benchmark')
+    parser.add_argument('--sensors', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='simulated DB round trip latency')
+    parser.add_argument('--ticks', type=int, default=3)
+    parser.add_argument('--skip-legacy', action='store_true', help='only run the bulk upsert path')
+    args = parser.parse_args()
+
+    standin = PostgrestStandin(latency_ms=args.latency_ms).start()
+    os.environ['SUPABASE_URL'] = standin.url
+    os.environ['SERVICE_ROLE_PRIVATE'] = STANDIN_KEY
+    os.environ.setdefault('OPENWEATHER_API_KEY', 'benchmark')
+
+    with redirect_stdout(io.StringIO()):
+        import services
+
+    sensors = make_sensors(args.sensors)
+    print(f"[Bench] {args.sensors} sensors, {args.latency_ms:.0f} ms simulated latency, {args.ticks} ticks")
+
+    if not args.skip_legacy:
+        run('legacy', standin, lambda: legacy_upload(services.supabase_client, services, sensors), args.ticks, args.sensors)
+        standin.db.tables.clear()
+
+    run('bulk', standin, lambda: services.upload_water_level_to_supabase(sensors), args.ticks, args.sensors)
+    print(f"[Bench] system_logs rows after bulk ticks: {len(standin.db.rows('system_logs'))}, "
+          f"water_level_readings rows: {len(standin.db.rows('water_level_readings'))}")
+    standin.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
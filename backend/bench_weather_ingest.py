@@ -0,0 +1,123 @@
+"""
+Benchmark: Supabase round trips and wall time per weather ingest cycle
+Runs fetch_and_store_all_weather against the local PostgREST stand-in with
+synthetic One Call payloads, so no OpenWeather quota or hosted database is used.
+
+Run (from backend/):
+    python bench_weather_ingest.py --latency-ms 20 --cycles 3
+    python bench_weather_ingest.py --chunk-size 1     # one row per request
+    python bench_weather_ingest.py --locations 300 --workers 32
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+from postgrest_standin import PostgrestStandin, STANDIN_KEY
+
+
+def _condition(i: int) -> list:
+    return [{'id': (500, 501, 802, 803)[i % 4], 'main': 'Rain', 'description': 'rain', 'icon': '10d'}]
+
+
+def synthetic_onecall(lat: float, lng: float, now: int | None = None) -> dict:
+    """Build a One Call 3.0 shaped payload (60 minutely, 48 hourly, 8 daily, 2 alerts)"""
+    now = now or int(time.time())
+    # OpenWeather aligns forecast timestamps to the minute / hour / day
+    minute, hour, day = now - now % 60, now - now % 3600, now - now % 86400
+    return {
+        'lat': lat,
+        'lon': lng,
+        'timezone': 'Asia/Ho_Chi_Minh',
+        'current': {
+            'dt': now, 'temp': 30.1, 'feels_like': 35.2, 'pressure': 1008, 'humidity': 78,
+            'dew_point': 25.4, 'uvi': 7.1, 'clouds': 75, 'visibility': 10000,
+            'wind_speed': 3.6, 'wind_deg': 220, 'rain': {'1h': 1.2}, 'weather': _condition(0),
+        },
+        'minutely': [{'dt': minute + 60 * i, 'precipitation': round(0.1 * (i % 7), 2)} for i in range(60)],
+        'hourly': [{
+            'dt': hour + 3600 * i, 'temp': 28 + (i % 5), 'feels_like': 31 + (i % 5), 'pressure': 1008,
+            'humidity': 70 + (i % 20), 'dew_point': 24.0, 'uvi': 0.0, 'clouds': 40, 'visibility': 10000,
+            'wind_speed': 2.5, 'wind_deg': 200, 'wind_gust': 4.1, 'pop': 0.4,
+            'rain': {'1h': 0.5 * (i % 3)}, 'weather': _condition(i),
+        } for i in range(48)],
+        'daily': [{
+            'dt': day + 86400 * i, 'sunrise': day + 82800, 'sunset': day + 39600, 'moonrise': day, 'moonset': day + 43200,
+            'moon_phase': 0.5, 'summary': 'Expect rain', 'pressure': 1008, 'humidity': 80,
+            'temp': {'morn': 27, 'day': 31, 'eve': 29, 'night': 26, 'min': 25, 'max': 32},
+            'feels_like': {'morn': 30, 'day': 36, 'eve': 33, 'night': 28},
+            'dew_point': 24.0, 'wind_speed': 3.0, 'wind_deg': 210, 'wind_gust': 6.0,
+            'clouds': 60, 'pop': 0.8, 'rain': 6.5, 'uvi': 9.0, 'weather': _condition(i),
+        } for i in range(8)],
+        'alerts': [{
+            'sender_name': 'NCHMF', 'event': event, 'start': now, 'end': now + 21600,
+            'description': f'{event} expected in Ho Chi Minh City',
+        } for event in ('Heavy rain', 'High tide')],
+    }
+
+
+def synthetic_locations(count: int) -> list:
+    """Spread `count` locations over a grid around central Ho Chi Minh City"""
+    side = max(1, int(count ** 0.5 + 0.999))
+    return [{
+        'name': f'Bench {i + 1}',
+        'lat': round(10.70 + 0.15 * (i // side) / side, 4),
+        'lng': round(106.60 + 0.15 * (i % side) / side, 4),
+    } for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Weather ingest cycle benchmark')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='simulated DB round trip latency')
+    parser.add_argument('--cycles', type=int, default=3)
+    parser.add_argument('--chunk-size', type=int, default=None, help='override SUPABASE_INSERT_CHUNK_SIZE')
+    parser.add_argument('--locations', type=int, default=None, help='synthetic locations (default: HCM_LOCATIONS)')
+    parser.add_argument('--workers', type=int, default=None, help='override WEATHER_CYCLE_WORKERS')
+    args = parser.parse_args()
+
+    standin = PostgrestStandin(latency_ms=args.latency_ms).start()
+    os.environ['SUPABASE_URL'] = standin.url
+    os.environ['SERVICE_ROLE_PRIVATE'] = STANDIN_KEY
+    os.environ.setdefault('OPENWEATHER_API_KEY', 'benchmark')
+
+    with redirect_stdout(io.StringIO()):
+        import services
+        import backend_weather_service as app_module
+    if args.chunk_size is not None:
+        services.SUPABASE_INSERT_CHUNK_SIZE = args.chunk_size
+    if args.workers is not None:
+        app_module.WEATHER_CYCLE_WORKERS = args.workers
+
+    # Serve synthetic payloads instead of calling OpenWeather
+    services._request_openweather = synthetic_onecall
+
+    locations = synthetic_locations(args.locations) if args.locations else app_module.HCM_LOCATIONS
+    print(f"[Bench] {len(locations)} locations, {app_module.WEATHER_CYCLE_WORKERS} workers, "
+          f"{args.latency_ms:.0f} ms simulated latency, {args.cycles} cycles")
+    for cycle in range(1, args.cycles + 1):
+        standin.db.reset_counters()
+        started = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            report = app_module.fetch_and_store_all_weather(locations)
+        elapsed = time.perf_counter() - started
+        total = standin.db.total_requests()
+        print(f"[Bench] cycle {cycle}: {total} round trips ({total / len(locations):.1f}/location), "
+              f"{elapsed:.2f}s wall time, {report['success']} stored, "
+              f"slowest location {report['max_location_duration_s']}s, "
+              f"forecast rows {report['forecast_rows_written']} written / {report['forecast_rows_skipped']} unchanged")
+
+    by_table = {}
+    for (method, table), count in standin.db.requests.items():
+        by_table[f"{method} {table}"] = count
+    print("[Bench] last cycle by table:")
+    for key, count in sorted(by_table.items()):
+        print(f"    {key:32} {count}")
+    print(f"[Bench] weather_condition cache: {services.get_condition_cache_stats()}")
+    standin.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
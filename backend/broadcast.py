@@ -0,0 +1,122 @@
+"""
+Live Update Fan-Out for FlowGuard Backend
+One Broadcaster shared by all Server-Sent Events clients: each event is
+encoded once as an SSE frame and appended to every subscriber's bounded
+queue. A slow client loses its oldest frames instead of stalling the
+publisher or growing without limit
+"""
+
+import json
+import threading
+from collections import deque
+from config import SSE_CLIENT_QUEUE_SIZE, SSE_MAX_CLIENTS
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class Subscription:
+    """One client's bounded frame queue"""
+
+    __slots__ = ('topics', 'frames', 'dropped', '_ready')
+
+    def __init__(self, topics: frozenset | None, queue_size: int):
+        self.topics = topics
+        self.frames = deque(maxlen=queue_size)
+        self.dropped = 0
+        self._ready = threading.Event()
+
+    def push(self, frame: bytes):
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped += 1
+        self.frames.append(frame)
+        self._ready.set()
+
+    def wait(self, timeout: float) -> list:
+        """Block until frames are queued (or timeout); return and clear them"""
+        if not self._ready.wait(timeout):
+            return []
+        return self.take()
+
+    def take(self) -> list:
+        """Return and clear the queued frames without blocking"""
+        self._ready.clear()
+        frames = []
+        while self.frames:
+            frames.append(self.frames.popleft())
+        return frames
+
+
+class Broadcaster:
+    """
+    Topic-based fan-out to Subscriptions
+    Keeps the last frame per topic so new clients start from current state
+    """
+
+    def __init__(self, queue_size: int = SSE_CLIENT_QUEUE_SIZE, max_clients: int = SSE_MAX_CLIENTS):
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self._subscribers = set()
+        self._last = {}
+        self._event_id = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+        # Frames dropped for, and clients that dropped any, among those
+        # already unsubscribed; stats() adds the connected ones
+        self._stats = {'published': 0, 'delivered': 0, 'frames_dropped': 0, 'lagging_clients': 0}
+
+    def subscribe(self, topics: frozenset | None = None) -> Subscription:
+        """Raises TooManySubscribers once max_clients are connected"""
+        subscription = Subscription(topics, self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                raise TooManySubscribers(f'{self.max_clients} clients already connected')
+            self._subscribers.add(subscription)
+            for topic, frame in self._last.items():
+                if topics is None or topic in topics:
+                    subscription.push(frame)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+            self._stats['frames_dropped'] += subscription.dropped
+            self._stats['lagging_clients'] += subscription.dropped > 0
+
+    def on_publish(self, listener):
+        """listener() runs after every publish, once the frame is queued"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def publish(self, topic: str, data) -> int:
+        """Send data to every subscriber of topic; returns the receiver count"""
+        with self._lock:
+            self._event_id += 1
+            body = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str)
+            frame = f"id: {self._event_id}\nevent: {topic}\ndata: {body}\n\n".encode('utf-8')
+            self._last[topic] = frame
+            receivers = [s for s in self._subscribers if s.topics is None or topic in s.topics]
+            self._stats['published'] += 1
+            self._stats['delivered'] += len(receivers)
+            listeners = list(self._listeners)
+        for subscription in receivers:
+            subscription.push(frame)
+        for listener in listeners:
+            listener()
+        return len(receivers)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['clients'] = len(self._subscribers)
+            stats['frames_dropped'] += sum(s.dropped for s in self._subscribers)
+            stats['lagging_clients'] += sum(s.dropped > 0 for s in self._subscribers)
+            stats['topics'] = sorted(self._last)
+        stats['queue_size'] = self.queue_size
+        stats['max_clients'] = self.max_clients
+        return stats
+
+
+# Shared by the producers (upload job, prediction refresh) and /api/stream
+live_updates = Broadcaster()
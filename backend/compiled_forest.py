@@ -0,0 +1,412 @@
+"""
+Compiled Tree Ensemble for FlowGuard Backend
+Flattens a fitted sklearn forest (hcmc_flood_model.pkl) into a few NumPy
+node arrays saved as .npz, and evaluates them for whole batches at once
+with plain NumPy, so serving needs neither sklearn nor the pickle
+
+Layout: the nodes of all trees are concatenated; roots[t] is the first node
+of tree t. Leaves point to themselves (left = right = self, threshold =
++inf), so every row can take exactly max_depth steps with no branching and
+then read the class fractions of the leaf it landed on.
+
+Each tree's output is constant on the grid cut by its own split thresholds,
+so when those grids are small (a few features, shallow trees) loading also
+builds one lookup table per tree: a row is ranked once against all
+thresholds of each feature (searchsorted) and each tree then costs three
+small index gathers and one table read instead of a max_depth walk.
+
+The .npz is written uncompressed with aligned members, and load() memory-maps
+every array member read-only (np.memmap at the member's offset in the
+archive; np.load ignores mmap_mode for .npz), lookup tables included, so
+worker processes serving the same file share one copy of its pages through
+the OS page cache.
+
+Build (from backend/):
+    python compiled_forest.py                      # hcmc_flood_model.pkl -> .npz
+    python compiled_forest.py --model other.pkl --out other.npz
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import struct
+import sys
+import threading
+import zipfile
+from pathlib import Path
+
+import numpy as np
+
+# 2 adds the lookup tables (cuts_<f>, maps_<f>, table); 1 is still read and
+# its tables are built on load
+FORMAT_VERSION = 2
+# Rows evaluated together; bounds the (rows x trees) working arrays
+CHUNK_ROWS = 1024
+# Per-tree lookup tables are built only while all of them together stay
+# below this many cells; larger forests walk the node arrays instead
+TABLE_MAX_CELLS = 4_000_000
+# Largest difference in class probability accepted by verify()
+TOLERANCE = 1e-9
+# Array data in a saved .npz starts on this boundary (see _write_aligned_npz)
+NPZ_ALIGN = 64
+# ZIP extra field id used for the alignment padding (ignored by readers)
+_PADDING_EXTRA_ID = 0xD935
+
+
+def _write_aligned_npz(f, arrays: dict):
+    """
+    np.savez equivalent (uncompressed, same member names) that pads each
+    member's local header with an extra field so its array data starts on
+    an NPZ_ALIGN boundary; np.savez leaves it wherever the header ends, and
+    unaligned memory-mapped arrays fall back to slow numpy loops
+    """
+    with zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED) as archive:
+        for name, array in arrays.items():
+            buffer = io.BytesIO()
+            np.lib.format.write_array(buffer, np.asanyarray(array), allow_pickle=False)
+            info = zipfile.ZipInfo(f'{name}.npy', date_time=(1980, 1, 1, 0, 0, 0))
+            # The .npy header is itself a multiple of 64 bytes long
+            pad = -(f.tell() + 30 + len(info.filename)) % NPZ_ALIGN
+            if pad:
+                pad += NPZ_ALIGN if pad < 4 else 0
+                info.extra = struct.pack('<HH', _PADDING_EXTRA_ID, pad - 4) + bytes(pad - 4)
+            archive.writestr(info, buffer.getvalue())
+
+
+def _mmap_npz(path) -> dict:
+    """
+    {name: read-only file-backed array} for the members of an uncompressed
+    .npz; 0-d, empty and unaligned members (files not written by save) are
+    read into memory. Raises ValueError for compressed members or object arrays
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: member {info.filename} is compressed")
+            # Data follows the 30-byte local file header, the name and the extra field
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack('<HH', f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if dtype.hasobject:
+                raise ValueError(f"{path}: member {info.filename} holds objects")
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            order = 'F' if fortran_order else 'C'
+            if not shape or 0 in shape or f.tell() % dtype.alignment:
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape, order=order)
+            else:
+                mapped = np.memmap(path, dtype=dtype, mode='r', shape=shape, order=order, offset=f.tell())
+                # Plain ndarray view of the same pages: the np.memmap subclass
+                # adds per-operation overhead to every small gather
+                arrays[name] = mapped.view(np.ndarray)
+    return arrays
+
+
+def file_version(path) -> str:
+    """Short content hash of a model file (matches ai_training's model_version)"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+class CompiledForest:
+    """
+    Array-backed replacement for a fitted RandomForestClassifier's
+    predict / predict_proba (single output, numeric features)
+    """
+
+    def __init__(self, arrays: dict):
+        # Kept in their stored dtypes (no astype copies), so memory-mapped
+        # arrays stay file-backed; numpy indexes with any integer dtype
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'])
+        self.classes_ = np.array(arrays['classes'])
+        self.feature_names_in_ = np.array(arrays['feature_names'])
+        self.n_features_in_ = len(self.feature_names_in_)
+        self.source_version = str(arrays['source_version'])
+        # True when the arrays are file-backed (set by load)
+        self.mapped = False
+        # Per-thread buffers of predict_proba_one
+        self._scratch = threading.local()
+        if 'table' in arrays:
+            self.cuts = [arrays[f'cuts_{f}'] for f in range(self.n_features_in_)]
+            self._tables = ([arrays[f'maps_{f}'] for f in range(self.n_features_in_)], arrays['table'])
+        else:
+            self._build_tables()
+
+    def _tree_nodes(self, t: int) -> slice:
+        end = int(self.roots[t + 1]) if t + 1 < len(self.roots) else len(self.feature)
+        return slice(int(self.roots[t]), end)
+
+    def _walk(self, X: np.ndarray, roots: np.ndarray) -> np.ndarray:
+        """Leaf reached by every (row, tree) pair: (len(X), len(roots)) node ids"""
+        node = np.repeat(roots[np.newaxis, :], len(X), axis=0)
+        for _ in range(self.max_depth):
+            values = np.take_along_axis(X, self.feature[node], axis=1)
+            node = np.where(values <= self.threshold[node], self.left[node], self.right[node])
+        return node
+
+    def _build_tables(self):
+        """
+        Per feature, all split thresholds of the forest (cuts); per tree, maps
+        from a row's rank among those cuts to the tree's own bin, and a table of
+        class fractions per cell of the tree's bin grid. Sets self._tables to
+        None when the grids would exceed TABLE_MAX_CELLS
+        """
+        self._tables = None
+        split = np.isfinite(self.threshold)
+        self.cuts = [np.unique(self.threshold[split & (self.feature == f)]) for f in range(self.n_features_in_)]
+
+        trees = []
+        total = 0
+        for t in range(len(self.roots)):
+            nodes = self._tree_nodes(t)
+            feature, threshold = self.feature[nodes], self.threshold[nodes]
+            local = [np.unique(threshold[np.isfinite(threshold) & (feature == f)]) for f in range(self.n_features_in_)]
+            shape = [len(cuts) + 1 for cuts in local]
+            total += int(np.prod(shape))
+            if total > TABLE_MAX_CELLS:
+                return
+            trees.append((local, shape))
+
+        strides_by_feature = [[] for _ in range(self.n_features_in_)]
+        values = []
+        offset = 0
+        for t, (local, shape) in enumerate(trees):
+            strides = np.cumprod([1] + shape[:0:-1])[::-1]
+            for f, cuts in enumerate(local):
+                # Bin b of this tree = rows with exactly b of its cuts below
+                # them; global rank g (cuts of the forest below the row) maps
+                # to the number of this tree's cuts among those g
+                rank_of_local = np.searchsorted(self.cuts[f], cuts)
+                bins = np.searchsorted(rank_of_local, np.arange(len(self.cuts[f]) + 1), side='left')
+                strides_by_feature[f].append(bins * strides[f] + (offset if f == 0 else 0))
+            # One representative point per cell: the bin's upper cut (+inf for the last)
+            axes = [np.append(cuts, np.inf) for cuts in local]
+            grid = np.stack([a.ravel() for a in np.meshgrid(*axes, indexing='ij')], axis=1)
+            leaves = self._walk(grid, self.roots[t:t + 1])[:, 0]
+            values.append(self.value[leaves])
+            offset += len(grid)
+
+        index = np.int32 if offset < 2 ** 31 else np.int64
+        # Rank-major maps (one contiguous row of tree offsets per rank) and one
+        # table per class keep every gather one-dimensional
+        self._tables = (
+            [np.ascontiguousarray(np.array(maps, dtype=index).T) for maps in strides_by_feature],
+            np.ascontiguousarray(np.concatenate(values).T)
+        )
+
+    @classmethod
+    def from_sklearn(cls, model, source_version: str = '') -> 'CompiledForest':
+        """Flatten model.estimators_; raises ValueError for unsupported models"""
+        trees = [estimator.tree_ for estimator in getattr(model, 'estimators_', [])]
+        if not trees:
+            raise ValueError("Model has no fitted estimators_")
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError("Only single-output forests can be compiled")
+
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        for tree in trees:
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(np.where(leaf, np.inf, tree.threshold))
+            lefts.append(np.where(leaf, nodes, tree.children_left) + offset)
+            rights.append(np.where(leaf, nodes, tree.children_right) + offset)
+            # Same normalization as DecisionTreeClassifier.predict_proba
+            value = tree.value[:, 0, :].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1.0
+            values.append(value / totals)
+            roots.append(offset)
+            offset += tree.node_count
+
+        index = np.int32 if offset < 2 ** 31 else np.int64
+        names = getattr(model, 'feature_names_in_', [f'x{i}' for i in range(model.n_features_in_)])
+        return cls({
+            'feature': np.concatenate(features).astype(np.int16),
+            'threshold': np.concatenate(thresholds),
+            'left': np.concatenate(lefts).astype(index),
+            'right': np.concatenate(rights).astype(index),
+            'value': np.concatenate(values),
+            'roots': np.array(roots, dtype=index),
+            'max_depth': np.array(max(tree.max_depth for tree in trees)),
+            'classes': np.asarray(model.classes_),
+            'feature_names': np.asarray(names, dtype=str),
+            'source_version': np.array(source_version),
+        })
+
+    @classmethod
+    def load(cls, path) -> 'CompiledForest':
+        """Memory-map a saved forest (see _mmap_npz); format 1 files get their tables built"""
+        arrays = _mmap_npz(path)
+        if 'format_version' not in arrays:
+            raise ValueError(f"{path}: not a compiled forest")
+        if int(arrays['format_version']) not in (1, FORMAT_VERSION):
+            raise ValueError(f"{path}: format {int(arrays['format_version'])}, expected {FORMAT_VERSION}")
+        forest = cls(arrays)
+        forest.mapped = True
+        return forest
+
+    def save(self, path):
+        """
+        Write uncompressed and aligned (so load() can memory-map it) and
+        atomically (temp file + os.replace) so readers never see a partial file
+        """
+        path = Path(path)
+        index = np.int32 if len(self.feature) < 2 ** 31 else np.int64
+        tables = {}
+        if self._tables is not None:
+            maps, table = self._tables
+            for f in range(self.n_features_in_):
+                tables[f'cuts_{f}'] = self.cuts[f]
+                tables[f'maps_{f}'] = maps[f]
+            tables['table'] = table
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as f:
+            _write_aligned_npz(f, {
+                'format_version': np.array(FORMAT_VERSION),
+                'feature': self.feature.astype(np.int16),
+                'threshold': self.threshold,
+                'left': self.left.astype(index),
+                'right': self.right.astype(index),
+                'value': self.value,
+                'roots': self.roots.astype(index),
+                'max_depth': np.array(self.max_depth),
+                'classes': self.classes_,
+                'feature_names': self.feature_names_in_,
+                'source_version': np.array(self.source_version),
+                **tables
+            })
+        os.replace(tmp, path)
+
+    def predict_proba(self, X) -> np.ndarray:
+        """(n_samples, n_classes) mean of the trees' leaf class fractions"""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64).reshape(-1, self.n_features_in_)
+        out = np.empty((len(X), len(self.classes_)))
+        if self._tables is not None:
+            maps, table = self._tables
+            # NaN ranks last, i.e. above every cut (the node walk also sends it right)
+            ranks = [np.searchsorted(cuts, X[:, f], side='left') for f, cuts in enumerate(self.cuts)]
+        for start in range(0, len(X), CHUNK_ROWS):
+            stop = min(start + CHUNK_ROWS, len(X))
+            if self._tables is not None:
+                cells = maps[0].take(ranks[0][start:stop], axis=0)
+                for f in range(1, self.n_features_in_):
+                    cells += maps[f].take(ranks[f][start:stop], axis=0)
+                for c, class_table in enumerate(table):
+                    out[start:stop, c] = class_table.take(cells).sum(axis=1) / len(self.roots)
+            else:
+                out[start:stop] = self.value[self._walk(X[start:stop], self.roots)].sum(axis=1) / len(self.roots)
+        return out
+
+    def predict_proba_one(self, row, out=None) -> np.ndarray:
+        """
+        (n_classes,) predict_proba of one row, without the batch reshape and
+        chunk loop; the table lookup runs in per-thread scratch buffers and
+        writes into out when given, so a call allocates nothing
+        """
+        if self._tables is None:
+            probabilities = self.predict_proba(row)[0]
+            if out is None:
+                return probabilities
+            out[:] = probabilities
+            return out
+        maps, table = self._tables
+        scratch = self._scratch.__dict__
+        if not scratch:
+            scratch['cells'] = np.empty(len(self.roots), dtype=maps[0].dtype)
+            scratch['picked'] = np.empty((len(table), len(self.roots)), dtype=table.dtype)
+        cells, picked = scratch['cells'], scratch['picked']
+        # float32 keys like predict_proba; searchsorted compares them as float64
+        row = np.asarray(row, dtype=np.float32)
+        np.copyto(cells, maps[0][np.searchsorted(self.cuts[0], row[0], side='left')])
+        for f in range(1, self.n_features_in_):
+            np.add(cells, maps[f][np.searchsorted(self.cuts[f], row[f], side='left')], out=cells)
+        np.take(table, cells, axis=1, out=picked, mode='clip')
+        out = np.sum(picked, axis=1, out=out)
+        out /= len(self.roots)
+        return out
+
+    def predict(self, X) -> np.ndarray:
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    @property
+    def node_count(self) -> int:
+        return len(self.feature)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (self.feature, self.threshold, self.left, self.right, self.value, self.roots))
+
+
+    @property
+    def table_cells(self) -> int:
+        """Cells in the per-tree lookup tables (0 when walking node arrays)"""
+        return self._tables[1].shape[1] if self._tables is not None else 0
+
+
+def verify(model, compiled: CompiledForest, samples: int = 20000, seed: int = 0) -> float:
+    """
+    Largest |compiled - sklearn| class probability over random inputs spread
+    across the thresholds the model actually uses; raises ValueError above
+    TOLERANCE or when a predicted label differs
+    """
+    rng = np.random.default_rng(seed)
+    columns = []
+    for i in range(compiled.n_features_in_):
+        used = compiled.threshold[(compiled.feature == i) & np.isfinite(compiled.threshold)]
+        low, high = (used.min(), used.max()) if len(used) else (0.0, 1.0)
+        span = max(high - low, 1.0)
+        # Mix of uniform draws and exact split points (ties go left)
+        column = rng.uniform(low - 0.1 * span, high + 0.1 * span, samples)
+        if len(used):
+            exact = rng.random(samples) < 0.1
+            column[exact] = rng.choice(used, exact.sum())
+        columns.append(column)
+    X = np.column_stack(columns)
+
+    import pandas as pd
+    frame = pd.DataFrame(X, columns=list(compiled.feature_names_in_))
+    expected = model.predict_proba(frame)
+    got = compiled.predict_proba(X)
+    error = float(np.abs(expected - got).max())
+    if error > TOLERANCE:
+        raise ValueError(f"Compiled forest differs from the model by {error:.3g} (tolerance {TOLERANCE:g})")
+    if not (model.predict(frame) == compiled.predict(X)).all():
+        raise ValueError("Compiled forest predicts different labels")
+    return error
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compile the flood model into NumPy node arrays')
+    parser.add_argument('--model', default=str(Path(__file__).parent / 'hcmc_flood_model.pkl'))
+    parser.add_argument('--out', help='default: the model path with a .npz suffix')
+    parser.add_argument('--samples', type=int, default=20000, help='random inputs checked against sklearn')
+    args = parser.parse_args()
+
+    import joblib
+    out = Path(args.out or Path(args.model).with_suffix('.npz'))
+    model = joblib.load(args.model)
+    compiled = CompiledForest.from_sklearn(model, file_version(args.model))
+    error = verify(model, compiled, args.samples)
+    compiled.save(out)
+    print(f"[Compile] ✓ {len(compiled.roots)} trees, {compiled.node_count} nodes, depth {compiled.max_depth}, "
+          f"{compiled.nbytes / 1024:.0f} KiB -> {out.name} (max |Δp| {error:.2g} over {args.samples} inputs, "
+          f"{compiled.table_cells} lookup cells)")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -47,7 +47,113 @@ else:
         traceback.print_exc()
         supabase_client = None
 
+# Max rows per bulk insert request (keeps PostgREST payloads bounded)
+SUPABASE_INSERT_CHUNK_SIZE = int(os.getenv('SUPABASE_INSERT_CHUNK_SIZE', '500'))
+
 OPENWEATHER_API_URL = 'https://api.openweathermap.org/data/3.0/onecall'
+OPENWEATHER_CURRENT_API_URL = 'https://api.openweathermap.org/data/2.5/weather'
+
+# OpenWeather response cache (see weather_cache.py): entries live one
+# scheduler interval, keys are coordinates rounded to N decimals (2 ~ 1.1 km)
+WEATHER_CACHE_TTL_SECONDS = float(os.getenv('WEATHER_CACHE_TTL_SECONDS', '300'))
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv('WEATHER_CACHE_MAX_ENTRIES', '1024'))
+WEATHER_CACHE_COORD_DECIMALS = int(os.getenv('WEATHER_CACHE_COORD_DECIMALS', '2'))
+
+# /api/weather/all serves the scheduler's snapshot; older than this it is rebuilt
+WEATHER_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv('WEATHER_SNAPSHOT_MAX_AGE_SECONDS', '600'))
+
+# Shared upstream HTTP client (see http_client.py)
+UPSTREAM_POOL_SIZE = int(os.getenv('UPSTREAM_POOL_SIZE', '16'))
+UPSTREAM_MAX_RETRIES = int(os.getenv('UPSTREAM_MAX_RETRIES', '3'))
+UPSTREAM_BACKOFF_FACTOR = float(os.getenv('UPSTREAM_BACKOFF_FACTOR', '0.5'))
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv('UPSTREAM_TIMEOUT_SECONDS', '10'))
+
+# Scheduler weather cycle: concurrent locations and hard per-cycle deadline
+# (the deadline must stay below the 300s scheduler interval)
+WEATHER_CYCLE_WORKERS = int(os.getenv('WEATHER_CYCLE_WORKERS', '16'))
+WEATHER_CYCLE_DEADLINE_SECONDS = float(os.getenv('WEATHER_CYCLE_DEADLINE_SECONDS', '240'))
+
+# In-memory water level history (see timeseries.py), per sensor:
+# raw samples (8640 ~ 24h at the 10s upload tick), minute and hour rollups
+WATER_LEVEL_RAW_CAPACITY = int(os.getenv('WATER_LEVEL_RAW_CAPACITY', '8640'))
+WATER_LEVEL_MINUTE_BUCKETS = int(os.getenv('WATER_LEVEL_MINUTE_BUCKETS', '1440'))
+WATER_LEVEL_HOUR_BUCKETS = int(os.getenv('WATER_LEVEL_HOUR_BUCKETS', '720'))
+# Sensors tracked in memory (~225 KB each at the defaults above); gateway
+# readings for sensors beyond the cap are still stored, just not in memory
+WATER_LEVEL_MAX_SENSORS = int(os.getenv('WATER_LEVEL_MAX_SENSORS', '1000'))
+# Rows read by services.get_latest_water_levels (one system_logs row per sensor)
+WATER_LEVEL_LATEST_LIMIT = int(os.getenv('WATER_LEVEL_LATEST_LIMIT', '1000'))
+# Days of water_level_readings history kept by the daily retention job
+# (services.prune_water_level_readings); 0 keeps everything
+WATER_LEVEL_READINGS_RETENTION_DAYS = int(os.getenv('WATER_LEVEL_READINGS_RETENTION_DAYS', '365'))
+
+# Localhost channel the API pushes simulation mode changes on (see mode_channel.py)
+MODE_CHANNEL_HOST = os.getenv('MODE_CHANNEL_HOST', '127.0.0.1')
+MODE_CHANNEL_PORT = int(os.getenv('MODE_CHANNEL_PORT', '5051'))
+# sensor_config is still re-read this often, for writes made outside the API
+MODE_LIVE_TTL_SECONDS = float(os.getenv('MODE_LIVE_TTL_SECONDS', '60'))
+
+# /api/stream Server-Sent Events (see broadcast.py): frames buffered per slow
+# client before the oldest are dropped, connection cap, keep-alive interval
+SSE_CLIENT_QUEUE_SIZE = int(os.getenv('SSE_CLIENT_QUEUE_SIZE', '64'))
+SSE_MAX_CLIENTS = int(os.getenv('SSE_MAX_CLIENTS', '5000'))
+SSE_HEARTBEAT_SECONDS = float(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+# Single-threaded event stream server (see stream_server.py) that /api/stream
+# redirects to; 0 serves the stream from Flask, one worker thread per client
+SSE_STREAM_HOST = os.getenv('SSE_STREAM_HOST', '0.0.0.0')
+SSE_STREAM_PORT = int(os.getenv('SSE_STREAM_PORT', '5052'))
+
+# POST /api/water-level/ingest write-behind buffer (see ingest.py): readings
+# held before 503 backpressure, flush size / interval, max request body
+INGEST_BUFFER_MAX_ROWS = int(os.getenv('INGEST_BUFFER_MAX_ROWS', '200000'))
+INGEST_FLUSH_ROWS = int(os.getenv('INGEST_FLUSH_ROWS', '5000'))
+INGEST_FLUSH_INTERVAL_SECONDS = float(os.getenv('INGEST_FLUSH_INTERVAL_SECONDS', '1.0'))
+INGEST_MAX_BODY_BYTES = int(os.getenv('INGEST_MAX_BODY_BYTES', str(16 * 1024 * 1024)))
+# Rows per insert request and concurrent insert requests per flush
+INGEST_CHUNK_SIZE = int(os.getenv('INGEST_CHUNK_SIZE', '2000'))
+INGEST_FLUSH_WORKERS = int(os.getenv('INGEST_FLUSH_WORKERS', '4'))
+
+# Durable write spool (see spool.py): SQLite queue replayed by a background
+# drainer; entries failing SPOOL_MAX_ATTEMPTS replays move to dead_letter
+SPOOL_PATH = os.getenv('SPOOL_PATH', str(Path(__file__).parent / 'spool.sqlite3'))
+SPOOL_MAX_ATTEMPTS = int(os.getenv('SPOOL_MAX_ATTEMPTS', '20'))
+SPOOL_DRAIN_INTERVAL_SECONDS = float(os.getenv('SPOOL_DRAIN_INTERVAL_SECONDS', '5'))
+# Consecutive write failures that open the database circuit, and how long it
+# stays open before one probe write is let through
+DB_BREAKER_FAILURE_THRESHOLD = int(os.getenv('DB_BREAKER_FAILURE_THRESHOLD', '3'))
+DB_BREAKER_RESET_SECONDS = float(os.getenv('DB_BREAKER_RESET_SECONDS', '30'))
+
+# Stored-weather lookup by coordinates (see spatial_index.py): farthest stored
+# location that still counts as a match, and weather_request rows scanned per
+# rebuild for each location's latest reading
+WEATHER_INDEX_MAX_DISTANCE_KM = float(os.getenv('WEATHER_INDEX_MAX_DISTANCE_KM', '1.5'))
+WEATHER_INDEX_SCAN_ROWS = int(os.getenv('WEATHER_INDEX_SCAN_ROWS', '5000'))
+
+# Flood predictions memoized per quantized feature vector and model version
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', '4096'))
+
+# Flood model file, loaded on first prediction and reloaded when it changes
+# on disk (checked every MODEL_RELOAD_INTERVAL_SECONDS, 0 disables)
+MODEL_PATH = os.getenv('MODEL_PATH', str(Path(__file__).parent / 'hcmc_flood_model.pkl'))
+MODEL_RELOAD_INTERVAL_SECONDS = float(os.getenv('MODEL_RELOAD_INTERVAL_SECONDS', '10'))
+# 'compiled' serves from the NumPy node arrays next to the model
+# (see compiled_forest.py, rebuilt when stale); 'sklearn' uses the pickle as is
+FLOOD_MODEL_ENGINE = os.getenv('FLOOD_MODEL_ENGINE', 'compiled')
+
+# City-wide flood risk raster (see risk_grid.py): south,west,north,east
+# bounds, cell size (0.005 deg ~ 550 m), nearest weather locations / sensors
+# interpolated per cell, rendered PNG tiles kept and tile zoom range
+RISK_GRID_BOUNDS = tuple(float(v) for v in os.getenv('RISK_GRID_BOUNDS', '10.37,106.36,11.16,107.03').split(','))
+RISK_GRID_CELL_DEGREES = float(os.getenv('RISK_GRID_CELL_DEGREES', '0.005'))
+RISK_GRID_IDW_NEIGHBORS = int(os.getenv('RISK_GRID_IDW_NEIGHBORS', '4'))
+RISK_TILE_CACHE_MAX_ENTRIES = int(os.getenv('RISK_TILE_CACHE_MAX_ENTRIES', '2048'))
+RISK_TILE_MIN_ZOOM = int(os.getenv('RISK_TILE_MIN_ZOOM', '8'))
+RISK_TILE_MAX_ZOOM = int(os.getenv('RISK_TILE_MAX_ZOOM', '18'))
+
+# Flood risk timeline (GET /api/flood/timeline): forecast hours scored per
+# location and hourly_weather rows read per keyset page while rebuilding
+FLOOD_TIMELINE_HOURS = int(os.getenv('FLOOD_TIMELINE_HOURS', '48'))
+FLOOD_TIMELINE_PAGE_ROWS = int(os.getenv('FLOOD_TIMELINE_PAGE_ROWS', '1000'))
 
 # ============================================
 # HCM LOCATIONS & SENSORS
@@ -61,10 +167,11 @@ HCM_LOCATIONS = [
     {'name': 'Phú Nhuận', 'lat': 10.798, 'lng': 106.686},
 ]
 
+# lat/lng place each sensor on the flood risk grid
 WATER_LEVEL_SENSORS = [
-    {'location': 'Sensor_Tram_A', 'current_level': 100.0},
-    {'location': 'Sensor_Tram_B', 'current_level': 85.0},
-    {'location': 'Sensor_Tram_C', 'current_level': 120.0},
+    {'location': 'Sensor_Tram_A', 'current_level': 100.0, 'lat': 10.7626, 'lng': 106.6822},
+    {'location': 'Sensor_Tram_B', 'current_level': 85.0, 'lat': 10.7952, 'lng': 106.6718},
+    {'location': 'Sensor_Tram_C', 'current_level': 120.0, 'lat': 10.7331, 'lng': 106.7189},
 ]
 
 # ============================================
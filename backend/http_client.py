@@ -0,0 +1,121 @@
+"""
+Shared Upstream HTTP Client for FlowGuard Backend
+One pooled, keep-alive session for every OpenWeather call, so requests reuse
+TCP+TLS connections instead of paying a new handshake each time
+"""
+
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (
+    UPSTREAM_POOL_SIZE,
+    UPSTREAM_MAX_RETRIES,
+    UPSTREAM_BACKOFF_FACTOR,
+    UPSTREAM_TIMEOUT_SECONDS
+)
+
+_session = None
+_adapter = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'errors': 0, 'retries': 0, 'total_latency_ms': 0.0, 'status_codes': {}}
+
+
+def get_upstream_session() -> requests.Session:
+    """
+    Return the process-wide upstream session (created on first use)
+    - connection pool of UPSTREAM_POOL_SIZE keep-alive connections per host
+    - retry with exponential backoff on 5xx and connection errors
+    - gzip/deflate response compression
+    """
+    global _session, _adapter
+
+    if _session is not None:
+        return _session
+
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=UPSTREAM_MAX_RETRIES,
+                backoff_factor=UPSTREAM_BACKOFF_FACTOR,
+                status_forcelist=(500, 502, 503, 504),
+                allowed_methods=frozenset(['GET']),
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=UPSTREAM_POOL_SIZE,
+                max_retries=retry
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({
+                'Accept-Encoding': 'gzip, deflate',
+                'Connection': 'keep-alive',
+                'User-Agent': 'FlowGuard-Backend/1.0'
+            })
+            _adapter = adapter
+            _session = session
+
+    return _session
+
+
+def upstream_get(url: str, params: dict | None = None, timeout: float | None = None) -> requests.Response:
+    """
+    GET through the shared session
+    Raises requests exceptions exactly like requests.get
+    """
+    session = get_upstream_session()
+    started = time.perf_counter()
+    try:
+        response = session.get(url, params=params, timeout=timeout or UPSTREAM_TIMEOUT_SECONDS)
+    except requests.exceptions.RequestException:
+        with _stats_lock:
+            _stats['requests'] += 1
+            _stats['errors'] += 1
+        raise
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    retries = getattr(getattr(response.raw, 'retries', None), 'history', None) or ()
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['retries'] += len(retries)
+        _stats['total_latency_ms'] += elapsed_ms
+        code = str(response.status_code)
+        _stats['status_codes'][code] = _stats['status_codes'].get(code, 0) + 1
+    return response
+
+
+def get_upstream_pool_stats() -> dict:
+    """Request counters and per-host connection pool usage for monitoring"""
+    with _stats_lock:
+        stats = dict(_stats)
+        stats['status_codes'] = dict(_stats['status_codes'])
+
+    completed = stats['requests'] - stats['errors']
+    stats['avg_latency_ms'] = round(stats['total_latency_ms'] / completed, 2) if completed else None
+    stats['total_latency_ms'] = round(stats['total_latency_ms'], 2)
+    stats['pool_maxsize'] = UPSTREAM_POOL_SIZE
+    stats['pools'] = []
+
+    if _adapter is not None:
+        pools = _adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            # The pool queue is pre-filled with None placeholders; count real sockets
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool else 0
+            stats['pools'].append({
+                'host': f"{pool.scheme}://{pool.host}:{pool.port}",
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                'idle_connections': idle,
+                # Every request beyond the opened connections reused a kept-alive one
+                'reused': max(0, pool.num_requests - pool.num_connections)
+            })
+    return stats
@@ -0,0 +1,226 @@
+"""
+Sensor Gateway Ingest for FlowGuard Backend
+Parsers for batched readings (NDJSON or a compact binary format) and a
+write-behind buffer that flushes them to the database in bulk
+
+Binary format (little-endian), content type application/octet-stream:
+    b'FGR1'                      magic
+    uint16 n                     number of sensor names
+    n x (uint8 len, utf-8 name)  sensor name table
+    records until end of body, 14 bytes each:
+        uint16 sensor index, float64 unix timestamp, float32 level (cm)
+"""
+
+import json
+import math
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+
+BINARY_MAGIC = b'FGR1'
+BINARY_RECORD = np.dtype([('sensor', '<u2'), ('ts', '<f8'), ('level', '<f4')])
+
+
+class IngestError(ValueError):
+    pass
+
+
+def _parse_timestamp(value, default: float) -> float:
+    if value is None:
+        return default
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        raise IngestError(f"Invalid timestamp '{value}'")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def parse_ndjson(body: bytes) -> list:
+    """
+    One JSON object per line: {"location": str, "water_level_cm": number,
+    "timestamp": unix seconds or ISO 8601 (optional, default now)}
+    Returns [(location, level, ts), ...]; raises IngestError with the line number
+    """
+    now = time.time()
+    readings = []
+    for line_no, line in enumerate(body.splitlines(), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+            location = item['location']
+            level = float(item['water_level_cm'])
+            ts = _parse_timestamp(item.get('timestamp'), now)
+        except IngestError as e:
+            raise IngestError(f"line {line_no}: {e}")
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            raise IngestError(f"line {line_no}: expected {{\"location\", \"water_level_cm\"}} ({type(e).__name__}: {e})")
+        if not isinstance(location, str) or not location or not math.isfinite(level):
+            raise IngestError(f"line {line_no}: invalid location or water_level_cm")
+        readings.append((location, level, ts))
+    return readings
+
+
+def parse_binary(body: bytes) -> list:
+    """Decode the FGR1 format above into [(location, level, ts), ...]"""
+    if body[:4] != BINARY_MAGIC or len(body) < 6:
+        raise IngestError("Binary body must start with b'FGR1' and a sensor count")
+    (count,) = struct.unpack_from('<H', body, 4)
+    offset = 6
+    names = []
+    for _ in range(count):
+        if offset >= len(body):
+            raise IngestError("Truncated sensor name table")
+        length = body[offset]
+        name = body[offset + 1:offset + 1 + length]
+        if len(name) != length or not length:
+            raise IngestError("Truncated sensor name table")
+        try:
+            names.append(name.decode('utf-8'))
+        except UnicodeDecodeError:
+            raise IngestError(f"Sensor name {len(names)} is not valid UTF-8")
+        offset += 1 + length
+
+    payload = len(body) - offset
+    if payload % BINARY_RECORD.itemsize:
+        raise IngestError(f"Record section is not a multiple of {BINARY_RECORD.itemsize} bytes")
+    records = np.frombuffer(body, dtype=BINARY_RECORD, offset=offset)
+    if len(records) and int(records['sensor'].max()) >= len(names):
+        raise IngestError("Sensor index out of range")
+    if not np.isfinite(records['level']).all() or not np.isfinite(records['ts']).all():
+        raise IngestError("Non-finite level or timestamp")
+
+    levels = np.round(records['level'].astype(np.float64), 2).tolist()
+    return list(zip([names[i] for i in records['sensor'].tolist()], levels, records['ts'].tolist()))
+
+
+def encode_binary(readings: list) -> bytes:
+    """Inverse of parse_binary, for gateways and benchmarks"""
+    names = {}
+    for location, _, _ in readings:
+        names.setdefault(location, len(names))
+    header = bytearray(BINARY_MAGIC + struct.pack('<H', len(names)))
+    for name in names:
+        encoded = name.encode('utf-8')
+        header += struct.pack('<B', len(encoded)) + encoded
+    records = np.empty(len(readings), dtype=BINARY_RECORD)
+    records['sensor'] = [names[location] for location, _, _ in readings]
+    records['level'] = [level for _, level, _ in readings]
+    records['ts'] = [ts for _, _, ts in readings]
+    return bytes(header) + records.tobytes()
+
+
+class WriteBehindBuffer:
+    """
+    Bounded in-memory queue of readings drained by a background thread
+    A flush runs when flush_rows readings are pending or flush_interval
+    seconds have passed; offer() refuses a batch that does not fit
+    (backpressure) instead of blocking the request
+
+    on_batch(batch) sees every reading exactly once, when it leaves the
+    queue; flush_fn(batch) writes it. Durability is flush_fn's job (the
+    backend passes services.store_ingested_readings, which spools what it
+    cannot write), so a batch is never retried from here: if flush_fn
+    raises anyway, the batch is counted as dropped
+    """
+
+    def __init__(self, flush_fn, max_rows: int, flush_rows: int, flush_interval: float, on_batch=None):
+        self.flush_fn = flush_fn
+        self.on_batch = on_batch
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._stats = {
+            'accepted': 0, 'rejected': 0, 'dropped': 0, 'flushed': 0, 'flushes': 0,
+            'flush_errors': 0, 'last_flush_rows': 0, 'last_flush_s': None
+        }
+
+    def offer(self, readings: list) -> bool:
+        """Queue readings; False (nothing queued) when the buffer would overflow"""
+        with self._cond:
+            if len(self._pending) + len(readings) > self.max_rows:
+                self._stats['rejected'] += len(readings)
+                return False
+            self._pending.extend(readings)
+            self._stats['accepted'] += len(readings)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='ingest-flusher', daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self.flush_rows:
+                self._cond.notify()
+        return True
+
+    def _take(self) -> list:
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._pending) < self.flush_rows:
+                    self._cond.wait(self.flush_interval)
+                batch = self._take()
+                closed = self._closed
+            if batch:
+                self._flush(batch)
+            if closed:
+                return
+
+    def _flush(self, batch: list) -> bool:
+        if self.on_batch:
+            try:
+                self.on_batch(batch)
+            except Exception as e:
+                print(f"[Ingest] on_batch error: {e}")
+
+        started = time.perf_counter()
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            print(f"[Ingest] ✗ Flush of {len(batch)} readings failed, dropping them: {e}")
+            with self._cond:
+                self._stats['flush_errors'] += 1
+                self._stats['dropped'] += len(batch)
+            return False
+
+        with self._cond:
+            self._stats['flushed'] += len(batch)
+            self._stats['flushes'] += 1
+            self._stats['last_flush_rows'] = len(batch)
+            self._stats['last_flush_s'] = round(time.perf_counter() - started, 4)
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Flush what is pending and stop the background thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+            batch = self._take() if thread is None else []
+        if thread:
+            thread.join(timeout)
+        elif batch:
+            self._flush(batch)
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        stats['max_rows'] = self.max_rows
+        stats['flush_rows'] = self.flush_rows
+        stats['flush_interval_s'] = self.flush_interval
+        return stats
@@ -0,0 +1,30 @@
+-- FlowGuard: weather_condition is keyed by the OpenWeather condition code.
+-- Required by services.get_condition_id, which fills cache misses with
+-- an upsert on api_id (PostgREST on_conflict needs a unique constraint).
+
+-- Remove duplicate api_id rows left by the old select-then-insert path,
+-- keeping the lowest condition_id (re-point references first).
+UPDATE current_weather cw SET condition_id = keep.condition_id
+FROM weather_condition dup
+JOIN (SELECT api_id, MIN(condition_id) AS condition_id FROM weather_condition GROUP BY api_id) keep
+  ON keep.api_id = dup.api_id
+WHERE cw.condition_id = dup.condition_id AND dup.condition_id <> keep.condition_id;
+
+UPDATE hourly_weather hw SET condition_id = keep.condition_id
+FROM weather_condition dup
+JOIN (SELECT api_id, MIN(condition_id) AS condition_id FROM weather_condition GROUP BY api_id) keep
+  ON keep.api_id = dup.api_id
+WHERE hw.condition_id = dup.condition_id AND dup.condition_id <> keep.condition_id;
+
+UPDATE daily_weather dw SET condition_id = keep.condition_id
+FROM weather_condition dup
+JOIN (SELECT api_id, MIN(condition_id) AS condition_id FROM weather_condition GROUP BY api_id) keep
+  ON keep.api_id = dup.api_id
+WHERE dw.condition_id = dup.condition_id AND dup.condition_id <> keep.condition_id;
+
+DELETE FROM weather_condition dup
+USING weather_condition keep
+WHERE dup.api_id = keep.api_id AND dup.condition_id > keep.condition_id;
+
+ALTER TABLE weather_condition
+  ADD CONSTRAINT weather_condition_api_id_key UNIQUE (api_id);
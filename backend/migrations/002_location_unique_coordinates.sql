@@ -0,0 +1,25 @@
+-- FlowGuard: one location row per coordinate pair.
+-- Required by services.get_location_id, which upserts on (latitude, longitude)
+-- so location_id stays stable across scheduler cycles.
+
+-- Re-point weather requests at the oldest row for each coordinate pair,
+-- then drop the duplicates created by the old delete-and-reinsert cycle.
+UPDATE weather_request wr SET location_id = keep.location_id
+FROM location dup
+JOIN (SELECT latitude, longitude, MIN(location_id) AS location_id
+      FROM location GROUP BY latitude, longitude) keep
+  ON keep.latitude = dup.latitude AND keep.longitude = dup.longitude
+WHERE wr.location_id = dup.location_id AND dup.location_id <> keep.location_id;
+
+DELETE FROM location dup
+USING location keep
+WHERE dup.latitude = keep.latitude
+  AND dup.longitude = keep.longitude
+  AND dup.location_id > keep.location_id;
+
+ALTER TABLE location
+  ADD CONSTRAINT location_latitude_longitude_key UNIQUE (latitude, longitude);
+
+-- Keep "latest request for a location" lookups index-only as history grows
+CREATE INDEX IF NOT EXISTS weather_request_location_time_idx
+  ON weather_request (location_id, request_time DESC);
@@ -0,0 +1,57 @@
+-- FlowGuard: forecast rows are keyed by (location_id, dt).
+-- Required by services.write_forecast_rows, which upserts only new or
+-- changed rows on that key. Unchanged rows keep the request_id of the cycle
+-- that last changed them, so forecasts are read by location_id and a dt
+-- window (lib/openweather-service.ts), not by request_id.
+
+-- minutely_weather
+ALTER TABLE minutely_weather ADD COLUMN IF NOT EXISTS location_id integer REFERENCES location (location_id);
+
+UPDATE minutely_weather mw SET location_id = wr.location_id
+FROM weather_request wr
+WHERE mw.request_id = wr.request_id AND mw.location_id IS NULL;
+
+-- Restarts re-inserted whole payloads; keep the newest row per key
+DELETE FROM minutely_weather dup
+USING minutely_weather keep
+WHERE dup.location_id = keep.location_id
+  AND dup.dt = keep.dt
+  AND dup.minutely_id < keep.minutely_id;
+
+ALTER TABLE minutely_weather ALTER COLUMN location_id SET NOT NULL;
+ALTER TABLE minutely_weather
+  ADD CONSTRAINT minutely_weather_location_id_dt_key UNIQUE (location_id, dt);
+
+-- hourly_weather
+ALTER TABLE hourly_weather ADD COLUMN IF NOT EXISTS location_id integer REFERENCES location (location_id);
+
+UPDATE hourly_weather hw SET location_id = wr.location_id
+FROM weather_request wr
+WHERE hw.request_id = wr.request_id AND hw.location_id IS NULL;
+
+DELETE FROM hourly_weather dup
+USING hourly_weather keep
+WHERE dup.location_id = keep.location_id
+  AND dup.dt = keep.dt
+  AND dup.hourly_id < keep.hourly_id;
+
+ALTER TABLE hourly_weather ALTER COLUMN location_id SET NOT NULL;
+ALTER TABLE hourly_weather
+  ADD CONSTRAINT hourly_weather_location_id_dt_key UNIQUE (location_id, dt);
+
+-- daily_weather
+ALTER TABLE daily_weather ADD COLUMN IF NOT EXISTS location_id integer REFERENCES location (location_id);
+
+UPDATE daily_weather dw SET location_id = wr.location_id
+FROM weather_request wr
+WHERE dw.request_id = wr.request_id AND dw.location_id IS NULL;
+
+DELETE FROM daily_weather dup
+USING daily_weather keep
+WHERE dup.location_id = keep.location_id
+  AND dup.dt = keep.dt
+  AND dup.daily_id < keep.daily_id;
+
+ALTER TABLE daily_weather ALTER COLUMN location_id SET NOT NULL;
+ALTER TABLE daily_weather
+  ADD CONSTRAINT daily_weather_location_id_dt_key UNIQUE (location_id, dt);
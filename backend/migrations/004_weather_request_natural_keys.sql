@@ -0,0 +1,55 @@
+-- FlowGuard: per-request weather rows are keyed by their natural keys.
+-- Required by services._write_weather, which upserts every step so a payload
+-- replayed from the write spool after a partial failure reuses the same
+-- weather_request (the spooled payload keeps its original request_time)
+-- instead of leaving an orphaned request and current_weather row behind.
+
+-- weather_request: one row per (location_id, request_time).
+-- Earlier replays inserted the same request again; re-point references to
+-- the newest copy, then drop the older ones.
+CREATE TEMP TABLE weather_request_dup AS
+SELECT dup.request_id AS old_id, keep.request_id AS new_id
+FROM weather_request dup
+JOIN (
+  SELECT location_id, request_time, MAX(request_id) AS request_id
+  FROM weather_request
+  GROUP BY location_id, request_time
+) keep
+  ON keep.location_id = dup.location_id
+ AND keep.request_time IS NOT DISTINCT FROM dup.request_time
+WHERE dup.request_id <> keep.request_id;
+
+UPDATE current_weather t SET request_id = d.new_id FROM weather_request_dup d WHERE t.request_id = d.old_id;
+UPDATE minutely_weather t SET request_id = d.new_id FROM weather_request_dup d WHERE t.request_id = d.old_id;
+UPDATE hourly_weather t SET request_id = d.new_id FROM weather_request_dup d WHERE t.request_id = d.old_id;
+UPDATE daily_weather t SET request_id = d.new_id FROM weather_request_dup d WHERE t.request_id = d.old_id;
+UPDATE weather_alerts t SET request_id = d.new_id FROM weather_request_dup d WHERE t.request_id = d.old_id;
+
+DELETE FROM weather_request WHERE request_id IN (SELECT old_id FROM weather_request_dup);
+DROP TABLE weather_request_dup;
+
+ALTER TABLE weather_request
+  ADD CONSTRAINT weather_request_location_id_request_time_key UNIQUE (location_id, request_time);
+
+-- current_weather: one row per request, keep the newest
+DELETE FROM current_weather dup
+USING current_weather keep
+WHERE dup.request_id = keep.request_id
+  AND dup.current_id < keep.current_id;
+
+ALTER TABLE current_weather
+  ADD CONSTRAINT current_weather_request_id_key UNIQUE (request_id);
+
+-- weather_alerts: one row per (request_id, sender_name, event, start);
+-- NULLS NOT DISTINCT so alerts without a sender or start still conflict
+DELETE FROM weather_alerts dup
+USING weather_alerts keep
+WHERE dup.request_id = keep.request_id
+  AND dup.sender_name IS NOT DISTINCT FROM keep.sender_name
+  AND dup.event IS NOT DISTINCT FROM keep.event
+  AND dup.start IS NOT DISTINCT FROM keep.start
+  AND dup.alert_id < keep.alert_id;
+
+ALTER TABLE weather_alerts
+  ADD CONSTRAINT weather_alerts_request_id_sender_name_event_start_key
+  UNIQUE NULLS NOT DISTINCT (request_id, sender_name, event, start);
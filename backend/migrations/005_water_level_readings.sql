@@ -0,0 +1,28 @@
+-- FlowGuard: water level history lives in water_level_readings.
+-- system_logs holds one row per sensor (its latest reading, read by
+-- services.get_latest_water_levels, ai_training and the frontend), so the
+-- gateway ingest path (services._write_ingested_rows) appends every reading
+-- here and only upserts each sensor's newest reading into system_logs.
+-- Replays from the write spool are dropped on the (location, created_at) key.
+
+CREATE TABLE IF NOT EXISTS water_level_readings (
+  id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  location text NOT NULL,
+  water_level_cm double precision NOT NULL,
+  created_at timestamp without time zone NOT NULL,
+  CONSTRAINT water_level_readings_location_created_at_key UNIQUE (location, created_at)
+);
+
+-- Time-range scans (training export, retention) across all sensors
+CREATE INDEX IF NOT EXISTS water_level_readings_created_at_idx
+  ON water_level_readings (created_at);
+
+-- Keep what ingest has already appended to system_logs as history
+INSERT INTO water_level_readings (location, water_level_cm, created_at)
+SELECT location, water_level_cm, created_at
+FROM system_logs
+WHERE created_at IS NOT NULL
+ON CONFLICT (location, created_at) DO NOTHING;
+
+-- Backend (service role) only; the frontend reads system_logs
+ALTER TABLE water_level_readings ENABLE ROW LEVEL SECURITY;
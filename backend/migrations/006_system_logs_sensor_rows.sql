@@ -0,0 +1,31 @@
+-- FlowGuard: system_logs holds exactly one row per sensor.
+-- Writers (services._write_water_level_rows, water_level.upload_batch)
+-- upsert each sensor's latest reading under a fixed id,
+-- uuid_generate_v5(SENSOR_ROW_NAMESPACE, location) (see sensor_rows.py),
+-- and append history to water_level_readings. This removes the rows left
+-- under random ids by the old delete-and-insert upload loop and by the
+-- simulator, which appended a row per reading.
+
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp" WITH SCHEMA extensions;
+
+-- Keep everything appended since migration 005 as history
+INSERT INTO water_level_readings (location, water_level_cm, created_at)
+SELECT location, water_level_cm, created_at
+FROM system_logs
+WHERE created_at IS NOT NULL
+ON CONFLICT (location, created_at) DO NOTHING;
+
+-- Newest reading per location moves to that sensor's fixed row
+-- ('59978c7e-...' is SENSOR_ROW_NAMESPACE)
+INSERT INTO system_logs (id, water_level_cm, location, created_at)
+SELECT DISTINCT ON (location)
+  extensions.uuid_generate_v5('59978c7e-0876-5b2d-bd8a-083522534375'::uuid, location),
+  water_level_cm, location, created_at
+FROM system_logs
+ORDER BY location, created_at DESC NULLS LAST
+ON CONFLICT (id) DO UPDATE
+  SET water_level_cm = EXCLUDED.water_level_cm, created_at = EXCLUDED.created_at
+  WHERE system_logs.created_at IS NULL OR EXCLUDED.created_at > system_logs.created_at;
+
+DELETE FROM system_logs
+WHERE id <> extensions.uuid_generate_v5('59978c7e-0876-5b2d-bd8a-083522534375'::uuid, location);
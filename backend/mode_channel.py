@@ -0,0 +1,226 @@
+"""
+Simulation Mode Propagation for FlowGuard Backend
+Process-local cache of the sensor_config mode, kept current by push instead
+of polling: the API process publishes every change over a localhost TCP
+channel (newline-delimited JSON) and simulator processes subscribe to it
+
+Supabase realtime is not available in the pinned supabase-py, so the
+channel is a small local pub/sub stand-in with the same role
+"""
+
+import json
+import socket
+import threading
+import time
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5051
+# While live, the database is still re-read this often so writes made
+# outside the API (e.g. directly in Supabase) show up eventually
+DEFAULT_LIVE_TTL_SECONDS = 60.0
+# While a subscriber is disconnected, a cached mode is trusted this long
+DEFAULT_FALLBACK_TTL_SECONDS = 30.0
+DEFAULT_MODE = 'SAFE'
+
+
+class ModeCache:
+    """
+    Current mode held in memory; get() is O(1) between changes
+    loader() reads the mode from the database and is called on first use,
+    after invalidate(), and whenever the cached mode is older than the TTL
+    (live_ttl_seconds while pushes keep it current, else fallback_ttl_seconds).
+    loader() returns None when the read failed: nothing is cached, get()
+    keeps answering with the last known mode (DEFAULT_MODE before the first
+    successful read) and the next get() retries
+    """
+
+    def __init__(self, loader, live: bool = False, fallback_ttl_seconds: float = DEFAULT_FALLBACK_TTL_SECONDS,
+                 live_ttl_seconds: float = DEFAULT_LIVE_TTL_SECONDS):
+        self._loader = loader
+        self._mode = None
+        self._version = 0
+        self._loaded_at = 0.0
+        self._listeners = []
+        self._lock = threading.Lock()
+        # Serializes loader() calls, so a stale cache is re-read once
+        self._load_lock = threading.Lock()
+        # live=True: pushes (or this process's own writes) keep the cache current
+        self.live = live
+        self.fallback_ttl_seconds = fallback_ttl_seconds
+        self.live_ttl_seconds = live_ttl_seconds
+        self._stats = {'reads': 0, 'loads': 0, 'load_errors': 0, 'changes': 0}
+
+    def _fresh(self) -> bool:
+        ttl = self.live_ttl_seconds if self.live else self.fallback_ttl_seconds
+        return self._mode is not None and time.monotonic() - self._loaded_at < ttl
+
+    def get(self) -> str:
+        self._stats['reads'] += 1
+        mode = self._mode
+        if mode is not None and self._fresh():
+            return mode
+
+        with self._load_lock:
+            if self._fresh():
+                return self._mode
+            self._stats['loads'] += 1
+            loaded = self._loader()
+            if loaded is None:
+                self._stats['load_errors'] += 1
+                return self._mode or DEFAULT_MODE
+            # A re-read that finds an outside change notifies listeners like a push
+            self.set(loaded)
+            return loaded
+
+    def set(self, mode: str, version: int | None = None):
+        """Store a new mode and notify listeners if it changed"""
+        with self._lock:
+            changed = mode != self._mode
+            self._mode = mode
+            self._loaded_at = time.monotonic()
+            self._version = version if version is not None else self._version + (1 if changed else 0)
+            if changed:
+                self._stats['changes'] += 1
+            listeners = list(self._listeners)
+            version = self._version
+        if changed:
+            for listener in listeners:
+                try:
+                    listener(mode, version)
+                except Exception as e:
+                    print(f"[Mode] Listener error: {e}")
+
+    def invalidate(self):
+        with self._lock:
+            self._mode = None
+
+    def subscribe(self, listener):
+        """listener(mode, version) runs after every change"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['mode'] = self._mode
+            stats['version'] = self._version
+        stats['live'] = self.live
+        stats['ttl_seconds'] = self.live_ttl_seconds if self.live else self.fallback_ttl_seconds
+        return stats
+
+
+def _encode(mode: str, version: int) -> bytes:
+    return (json.dumps({'mode': mode, 'version': version}) + '\n').encode('utf-8')
+
+
+class ModePublisher:
+    """
+    Accepts subscribers on host:port, sends them the current mode on
+    connect and every change of the cache afterwards
+    """
+
+    def __init__(self, cache: ModeCache, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.cache = cache
+        self.host = host
+        self.port = port
+        self._clients = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._published = 0
+        cache.subscribe(self._broadcast)
+
+    def start(self) -> 'ModePublisher':
+        self._server = socket.create_server((self.host, self.port))
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept_loop, name='mode-publisher', daemon=True).start()
+        print(f"[Mode] Publishing mode changes on {self.host}:{self.port}")
+        return self
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            try:
+                conn.sendall(_encode(self.cache.get(), self.cache.version))
+            except Exception as e:
+                print(f"[Mode] Could not greet subscriber: {e}")
+                conn.close()
+                continue
+            with self._lock:
+                self._clients.append(conn)
+
+    def _broadcast(self, mode: str, version: int):
+        message = _encode(mode, version)
+        with self._lock:
+            alive = []
+            for conn in self._clients:
+                try:
+                    conn.sendall(message)
+                    alive.append(conn)
+                except OSError:
+                    conn.close()
+            self._clients = alive
+            self._published += 1
+
+    def stop(self):
+        if self._server:
+            self._server.close()
+        with self._lock:
+            for conn in self._clients:
+                conn.close()
+            self._clients = []
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'host': self.host, 'port': self.port, 'subscribers': len(self._clients), 'published': self._published}
+
+
+class ModeSubscriber:
+    """
+    Background thread that keeps a ModeCache in sync with a ModePublisher
+    The cache is marked live while connected (the database is then re-read
+    every live_ttl_seconds); on disconnect it falls back to reloading at
+    most every fallback_ttl_seconds
+    """
+
+    def __init__(self, cache: ModeCache, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, retry_seconds: float = 5.0):
+        self.cache = cache
+        self.host = host
+        self.port = port
+        self.retry_seconds = retry_seconds
+        self.connected = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self) -> 'ModeSubscriber':
+        threading.Thread(target=self._run, name='mode-subscriber', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                with socket.create_connection((self.host, self.port), timeout=self.retry_seconds) as conn:
+                    conn.settimeout(None)
+                    print(f"[Mode] Subscribed to mode changes on {self.host}:{self.port}")
+                    for line in conn.makefile('r', encoding='utf-8'):
+                        message = json.loads(line)
+                        self.cache.set(str(message['mode']).upper(), message.get('version'))
+                        if not self.connected.is_set():
+                            self.cache.live = True
+                            self.connected.set()
+                        if self._stopped.is_set():
+                            break
+            except (OSError, ValueError) as e:
+                if self.connected.is_set():
+                    print(f"[Mode] Mode channel lost ({e}), falling back to database reads")
+            self.cache.live = False
+            self.connected.clear()
+            self._stopped.wait(self.retry_seconds)
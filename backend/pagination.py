@@ -0,0 +1,42 @@
+"""
+Keyset Pagination for FlowGuard Backend
+Reads PostgREST tables page by page in key order, resuming after the last
+row read instead of using offsets, so a scan is neither capped by the
+server's max-rows setting nor slowed down by deep offsets
+Used by the training pipeline (train_model.py) and the flood timeline
+(services.get_hourly_forecasts)
+"""
+
+from config import supabase_client
+
+
+def keyset_pages(table: str, select: str, keys: tuple, cursor: tuple | None = None,
+                 page_size: int = 1000, where=None):
+    """
+    Yield pages of rows ordered by keys, starting after cursor (the key
+    values of the last row already read)
+    The first key is filtered with gte and rows not after the cursor are
+    dropped here, so ties on it (one created_at per bulk upload) are never
+    skipped or read twice. Ends on the first page with nothing new, so a
+    server-side row cap below page_size is harmless
+    """
+    limit = page_size
+    while True:
+        query = supabase_client.table(table).select(select)
+        if where is not None:
+            query = where(query)
+        if cursor is not None:
+            query = query.gte(keys[0], cursor[0])
+        # One order parameter; PostgREST does not combine repeated ones
+        rows = query.order(','.join(keys)).limit(limit).execute().data or []
+
+        fresh = [row for row in rows if cursor is None or tuple(row[k] for k in keys) > cursor]
+        if fresh:
+            yield fresh
+            cursor = tuple(fresh[-1][k] for k in keys)
+            limit = page_size
+        elif len(rows) < limit:
+            return
+        else:
+            # A whole page tied with the cursor on the first key
+            limit *= 2
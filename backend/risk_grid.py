@@ -0,0 +1,255 @@
+"""
+City-Wide Flood Risk Raster for FlowGuard Backend
+A lat/lng grid over Ho Chi Minh City whose cells are scored in one batch:
+each cell's rain, humidity and water level are inverse-distance weighted
+from the nearest stored weather locations and sensors. The grid is served
+as XYZ (Web Mercator, 256 px) PNG tiles for Leaflet, rendered on demand
+and cached per grid version
+"""
+
+import hashlib
+import math
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from config import (
+    RISK_GRID_BOUNDS,
+    RISK_GRID_CELL_DEGREES,
+    RISK_GRID_IDW_NEIGHBORS,
+    RISK_TILE_CACHE_MAX_ENTRIES,
+    RISK_TILE_MIN_ZOOM,
+    RISK_TILE_MAX_ZOOM
+)
+from spatial_index import project_km
+from weather_cache import TTLCache
+
+TILE_SIZE = 256
+
+
+def interpolate_idw(points: np.ndarray, values: np.ndarray, targets: np.ndarray,
+                    neighbors: int, power: float = 2.0) -> np.ndarray:
+    """
+    Inverse distance weighting of values known at points (n, 2 lat/lng) onto
+    targets (m, 2), from the nearest `neighbors` points of each target
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    values = np.asarray(values, dtype=np.float64)
+    if len(points) == 1:
+        return np.full(len(targets), values[0])
+    cos_lat0 = math.cos(math.radians(points[:, 0].mean()))
+    k = min(neighbors, len(points))
+    distances, indexes = cKDTree(project_km(points, cos_lat0)).query(project_km(targets, cos_lat0), k=k)
+    distances = distances.reshape(len(targets), k)
+    indexes = indexes.reshape(len(targets), k)
+    # A target sitting on a point takes that point's value
+    weights = 1.0 / np.maximum(distances, 1e-6) ** power
+    return (weights * values[indexes]).sum(axis=1) / weights.sum(axis=1)
+
+
+def _risk_palette() -> np.ndarray:
+    """RGBA per risk 0..100 (index = round(risk)): clear below 20 %, then yellow -> red"""
+    palette = np.zeros((101, 4), dtype=np.uint8)
+    stops = [(20, (250, 204, 21, 70)), (50, (249, 115, 22, 140)), (80, (220, 38, 38, 190)), (100, (153, 27, 27, 220))]
+    for (start, c0), (end, c1) in zip(stops, stops[1:]):
+        t = (np.arange(start, end + 1) - start) / (end - start)
+        palette[start:end + 1] = np.round(np.outer(1 - t, c0) + np.outer(t, c1))
+    return palette
+
+
+PALETTE = _risk_palette()
+
+
+def encode_png(rgba: np.ndarray) -> bytes:
+    """(h, w, 4) uint8 -> PNG bytes (8-bit RGBA, no filtering, zlib level 6)"""
+    height, width, _ = rgba.shape
+    # Every scanline starts with filter type 0 (None)
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+EMPTY_TILE = encode_png(np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8))
+
+
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """(south, west, north, east) of an XYZ tile"""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return lat(y + 1), x / n * 360.0 - 180.0, lat(y), (x + 1) / n * 360.0 - 180.0
+
+
+class RiskGrid:
+    """One computed raster: risk (rows x cols, flood probability %) plus metadata"""
+
+    def __init__(self, south: float, west: float, cell_degrees: float, risk: np.ndarray, inputs: dict):
+        self.south = south
+        self.west = west
+        self.cell_degrees = cell_degrees
+        self.risk = risk.astype(np.float32)
+        self.rows, self.cols = risk.shape
+        self.north = south + self.rows * cell_degrees
+        self.east = west + self.cols * cell_degrees
+        self.inputs = inputs
+        self.computed_at = datetime.now().isoformat()
+        # Content hash: same risk values -> same tiles and ETags, across restarts
+        self.version = hashlib.sha256(
+            self.risk.tobytes() + struct.pack('<4d', south, west, cell_degrees, self.rows)
+        ).hexdigest()[:16]
+
+    @staticmethod
+    def cell_centers(bounds: tuple, cell_degrees: float) -> tuple:
+        """(rows, cols) shape and (rows * cols, 2) lat/lng centers, south-west first"""
+        south, west, north, east = bounds
+        rows = max(1, math.ceil((north - south) / cell_degrees))
+        cols = max(1, math.ceil((east - west) / cell_degrees))
+        lats = south + (np.arange(rows) + 0.5) * cell_degrees
+        lngs = west + (np.arange(cols) + 0.5) * cell_degrees
+        grid_lat, grid_lng = np.meshgrid(lats, lngs, indexing='ij')
+        return (rows, cols), np.column_stack((grid_lat.ravel(), grid_lng.ravel()))
+
+    def render_tile(self, z: int, x: int, y: int) -> bytes:
+        """PNG of one XYZ tile, nearest-cell sampled; EMPTY_TILE outside the grid"""
+        south, west, north, east = tile_bounds(z, x, y)
+        if south >= self.north or north <= self.south or west >= self.east or east <= self.west:
+            return EMPTY_TILE
+
+        n = 2 ** z
+        pixel = (np.arange(TILE_SIZE) + 0.5) / TILE_SIZE
+        lngs = (x + pixel) / n * 360.0 - 180.0
+        lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + pixel) / n))))
+        rows = np.floor((lats - self.south) / self.cell_degrees).astype(np.int64)
+        cols = np.floor((lngs - self.west) / self.cell_degrees).astype(np.int64)
+        row_ok = (rows >= 0) & (rows < self.rows)
+        col_ok = (cols >= 0) & (cols < self.cols)
+
+        levels = np.rint(self.risk[np.clip(rows, 0, self.rows - 1)][:, np.clip(cols, 0, self.cols - 1)])
+        rgba = PALETTE[np.clip(levels, 0, 100).astype(np.intp)]
+        rgba[~(row_ok[:, np.newaxis] & col_ok[np.newaxis, :])] = 0
+        return encode_png(rgba)
+
+    def summary(self) -> dict:
+        return {
+            'version': self.version,
+            'computed_at': self.computed_at,
+            'bounds': {'south': self.south, 'west': self.west, 'north': self.north, 'east': self.east},
+            'cell_degrees': self.cell_degrees,
+            'shape': [self.rows, self.cols],
+            'risk': {
+                'min': round(float(self.risk.min()), 1),
+                'max': round(float(self.risk.max()), 1),
+                'mean': round(float(self.risk.mean()), 1),
+                'cells_at_risk': int((self.risk >= 50).sum())
+            },
+            'inputs': self.inputs
+        }
+
+
+class RiskGridStore:
+    """
+    Latest RiskGrid and a bounded cache of its rendered tiles
+    Tiles are keyed by grid version, so publishing a new grid never serves
+    stale tiles; the old version's entries age out of the LRU
+    """
+
+    def __init__(self, bounds: tuple = RISK_GRID_BOUNDS, cell_degrees: float = RISK_GRID_CELL_DEGREES,
+                 neighbors: int = RISK_GRID_IDW_NEIGHBORS, tile_cache_entries: int = RISK_TILE_CACHE_MAX_ENTRIES):
+        self.bounds = bounds
+        self.cell_degrees = cell_degrees
+        self.neighbors = neighbors
+        self.min_zoom = RISK_TILE_MIN_ZOOM
+        self.max_zoom = RISK_TILE_MAX_ZOOM
+        self._grid = None
+        self._tiles = TTLCache(math.inf, tile_cache_entries)
+        self._lock = threading.Lock()
+        self._stats = {'computes': 0, 'last_compute_s': None, 'tiles_rendered': 0, 'last_tile_ms': None}
+
+    def compute(self, weather: tuple, sensors: tuple, defaults: tuple, predict) -> RiskGrid:
+        """
+        Score every cell and publish the grid
+        weather: (points (n, 2), rain_1h (n,), humidity (n,)); sensors:
+        (points (m, 2), water_level (m,)); defaults: (rain_1h, water_level,
+        humidity) used where no points exist; predict(features (k, 3)) ->
+        flood probability % per row
+        """
+        started = time.perf_counter()
+        shape, centers = RiskGrid.cell_centers(self.bounds, self.cell_degrees)
+        weather_points, rain, humidity = weather
+        sensor_points, levels = sensors
+        default_rain, default_level, default_humidity = defaults
+
+        features = np.empty((len(centers), 3))
+        if len(weather_points):
+            features[:, 0] = interpolate_idw(weather_points, rain, centers, self.neighbors)
+            features[:, 2] = interpolate_idw(weather_points, humidity, centers, self.neighbors)
+        else:
+            features[:, 0] = default_rain
+            features[:, 2] = default_humidity
+        if len(sensor_points):
+            features[:, 1] = interpolate_idw(sensor_points, levels, centers, self.neighbors)
+        else:
+            features[:, 1] = default_level
+
+        risk = np.asarray(predict(features), dtype=np.float64).reshape(shape)
+        grid = RiskGrid(self.bounds[0], self.bounds[1], self.cell_degrees, risk, {
+            'weather_points': len(weather_points),
+            'sensors': len(sensor_points),
+            'idw_neighbors': self.neighbors
+        })
+        with self._lock:
+            self._grid = grid
+            self._stats['computes'] += 1
+            self._stats['last_compute_s'] = round(time.perf_counter() - started, 4)
+        return grid
+
+    def get(self) -> RiskGrid | None:
+        return self._grid
+
+    def tile(self, z: int, x: int, y: int) -> tuple | None:
+        """(png bytes, grid version) of a tile of the current grid, or None before the first compute"""
+        grid = self._grid
+        if grid is None:
+            return None
+        key = (grid.version, z, x, y)
+        cached = self._tiles.get(key)
+        if cached is not None:
+            return cached[0], grid.version
+        started = time.perf_counter()
+        png = grid.render_tile(z, x, y)
+        self._tiles.set(key, png)
+        with self._lock:
+            self._stats['tiles_rendered'] += 1
+            self._stats['last_tile_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        return png, grid.version
+
+    def stats(self) -> dict:
+        grid = self._grid
+        with self._lock:
+            stats = dict(self._stats)
+        tiles = self._tiles.stats()
+        # No expiry; inf is not valid JSON
+        tiles.pop('ttl_seconds')
+        stats['tile_cache'] = tiles
+        stats['version'] = grid.version if grid else None
+        stats['computed_at'] = grid.computed_at if grid else None
+        stats['shape'] = [grid.rows, grid.cols] if grid else None
+        return stats
+
+
+# Recomputed by the scheduler after each weather cycle; tiles served by /api/flood/risk-grid
+flood_risk_grid = RiskGridStore()
@@ -0,0 +1,39 @@
+"""
+Water Level Row Keys for FlowGuard Backend
+Shared by the API (services.py) and the simulator (water_level.py) so both
+write a sensor's latest reading to the same system_logs row and its full
+history to water_level_readings
+"""
+
+import uuid
+
+# Each sensor's latest-reading row has a fixed id derived from its location,
+# so a tick is one bulk upsert on the primary key (no delete round trips).
+# migrations/006 uses the same namespace literal in uuid_generate_v5
+SENSOR_ROW_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, 'flowguard/system_logs')
+
+# Natural key of the water level history table (unique, see migrations/005)
+WATER_LEVEL_READINGS_CONFLICT_KEY = 'location,created_at'
+
+
+def sensor_row_id(location: str) -> str:
+    """Deterministic system_logs id for a sensor location"""
+    return str(uuid.uuid5(SENSOR_ROW_NAMESPACE, location))
+
+
+def split_readings(rows: list) -> tuple:
+    """
+    Rows with location, water_level_cm and created_at (ISO strings of one
+    format) -> (water_level_readings rows, newest system_logs row per sensor)
+    """
+    readings = [{
+        'location': row['location'],
+        'water_level_cm': row['water_level_cm'],
+        'created_at': row['created_at']
+    } for row in rows]
+    latest = {}
+    for row in readings:
+        current = latest.get(row['location'])
+        if current is None or row['created_at'] >= current['created_at']:
+            latest[row['location']] = row
+    return readings, [{'id': sensor_row_id(location), **row} for location, row in latest.items()]
@@ -4,15 +4,45 @@ Handles OpenWeather API calls and stores to existing Supabase schema
 """
 
 import requests
+import hashlib
 import json
 import random
-import uuid
-from datetime import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+from postgrest.types import ReturnMethod
+from http_client import upstream_get
+from weather_cache import TTLCache, SingleFlight, quantize_coords
+from timeseries import water_level_history
+from mode_channel import ModeCache
+from broadcast import live_updates
+from spool import Spool, SpoolDrainer, CircuitBreaker
+from spatial_index import SpatialIndex
+from pagination import keyset_pages
+from sensor_rows import sensor_row_id, split_readings, WATER_LEVEL_READINGS_CONFLICT_KEY
 from config import (
     API_KEY,
     OPENWEATHER_API_URL,
+    WEATHER_CACHE_TTL_SECONDS,
+    WEATHER_CACHE_MAX_ENTRIES,
+    WEATHER_CACHE_COORD_DECIMALS,
     supabase_client,
+    SUPABASE_INSERT_CHUNK_SIZE,
+    INGEST_CHUNK_SIZE,
+    INGEST_FLUSH_WORKERS,
+    SPOOL_PATH,
+    SPOOL_MAX_ATTEMPTS,
+    SPOOL_DRAIN_INTERVAL_SECONDS,
+    DB_BREAKER_FAILURE_THRESHOLD,
+    DB_BREAKER_RESET_SECONDS,
+    WEATHER_INDEX_MAX_DISTANCE_KM,
+    WEATHER_INDEX_SCAN_ROWS,
+    FLOOD_TIMELINE_PAGE_ROWS,
+    WATER_LEVEL_LATEST_LIMIT,
+    WATER_LEVEL_READINGS_RETENTION_DAYS,
     WATER_LEVEL_SENSORS,
+    MODE_LIVE_TTL_SECONDS,
     HCM_LOCATIONS
 )
 
@@ -21,7 +51,13 @@ from config import (
 # OPENWEATHER API FUNCTIONS
 # ============================================
 
-def fetch_from_openweather(lat: float, lng: float) -> dict | None:
+# One Call responses keyed by quantized (lat, lng); warmed by the scheduler
+_weather_cache = TTLCache(WEATHER_CACHE_TTL_SECONDS, WEATHER_CACHE_MAX_ENTRIES)
+# Concurrent misses for the same key share one upstream call
+_weather_inflight = SingleFlight()
+
+
+def _request_openweather(lat: float, lng: float) -> dict | None:
     """
     Internal function to call OpenWeather API
     This is called from backend, API key is hidden from frontend
@@ -35,7 +71,8 @@ def fetch_from_openweather(lat: float, lng: float) -> dict | None:
             'lang': 'en'
         }
         
-        response = requests.get(OPENWEATHER_API_URL, params=params, timeout=10)
+        # Shared pooled session: keep-alive, gzip, retry with backoff on 5xx
+        response = upstream_get(OPENWEATHER_API_URL, params=params)
         
         if response.status_code == 401:
             print(f"[Backend] ERROR: 401 Unauthorized - Invalid API key")
@@ -60,6 +97,416 @@ def fetch_from_openweather(lat: float, lng: float) -> dict | None:
         return None
 
 
+def fetch_weather_with_source(lat: float, lng: float, refresh: bool = False) -> tuple:
+    """
+    Get One Call data through the response cache
+    Returns (weather_data, source) where source is 'cache', 'live', or
+    'coalesced' when the caller waited on another caller's upstream request
+    refresh=True skips the cache read but still stores the fresh response
+    """
+    key = quantize_coords(lat, lng, WEATHER_CACHE_COORD_DECIMALS)
+    
+    if not refresh:
+        cached = _weather_cache.get(key)
+        if cached is not None:
+            return cached[0], 'cache'
+    
+    def request_and_cache():
+        data = _request_openweather(lat, lng)
+        if data:
+            _weather_cache.set(key, data)
+        return data
+    
+    weather_data, shared = _weather_inflight.do(key, request_and_cache)
+    return weather_data, 'coalesced' if shared else 'live'
+
+
+def fetch_from_openweather(lat: float, lng: float, refresh: bool = False) -> dict | None:
+    """
+    Get One Call data for coordinates (served from cache when fresh)
+    """
+    return fetch_weather_with_source(lat, lng, refresh=refresh)[0]
+
+
+def get_weather_cache_stats() -> dict:
+    """Hit/miss/eviction counters for the OpenWeather response cache"""
+    return _weather_cache.stats()
+
+
+def get_weather_inflight_stats() -> dict:
+    """Upstream calls made vs. callers coalesced onto an in-flight call"""
+    return _weather_inflight.stats()
+
+
+# ============================================
+# SUPABASE BULK WRITE HELPERS
+# ============================================
+
+def bulk_write(table: str, rows: list, on_conflict: str | None = None, return_rows: bool = False,
+               chunk_size: int | None = None, workers: int = 1, ignore_duplicates: bool = False) -> list:
+    """
+    Insert (or upsert when on_conflict is given) many rows into a Supabase
+    table with one request per chunk of SUPABASE_INSERT_CHUNK_SIZE rows
+    ignore_duplicates=True keeps existing rows on conflict instead of merging
+    workers > 1 sends chunks concurrently (row order across chunks is not kept)
+    Returns the written rows when return_rows=True, otherwise []
+    """
+    written = []
+    if not rows:
+        return written
+    
+    returning = ReturnMethod.representation if return_rows else ReturnMethod.minimal
+    chunk_size = max(1, chunk_size or SUPABASE_INSERT_CHUNK_SIZE)
+    
+    def write_chunk(chunk):
+        if on_conflict:
+            query = supabase_client.table(table).upsert(
+                chunk, on_conflict=on_conflict, returning=returning, ignore_duplicates=ignore_duplicates
+            )
+        else:
+            query = supabase_client.table(table).insert(chunk, returning=returning)
+        response = query.execute()
+        return (response.data or []) if return_rows else []
+    
+    chunks = [rows[start:start + chunk_size] for start in range(0, len(rows), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            results = list(executor.map(write_chunk, chunks))
+    else:
+        results = [write_chunk(chunk) for chunk in chunks]
+    for result in results:
+        written.extend(result)
+    return written
+
+
+# ============================================
+# DURABLE WRITE SPOOL
+# ============================================
+
+# Returned by store_weather_to_existing_schema when the payload was spooled
+WEATHER_SPOOLED = 'spooled'
+
+write_spool = Spool(SPOOL_PATH, max_attempts=SPOOL_MAX_ATTEMPTS)
+# Opened by consecutive write failures; while open, writes go straight to
+# the spool so the scheduler never waits on a database that is down
+db_breaker = CircuitBreaker(DB_BREAKER_FAILURE_THRESHOLD, DB_BREAKER_RESET_SECONDS)
+
+
+def write_or_spool(kind: str, payload, write_fn) -> bool:
+    """
+    Run write_fn(payload), or append payload to the spool when the breaker
+    is open, older entries of the same kind are still queued (keeps replay
+    order), or the write fails. Returns True when written directly
+    """
+    if write_spool.pending(kind) or not db_breaker.allow():
+        write_spool.append(kind, payload)
+        spool_drainer.start().wake()
+        return False
+    
+    try:
+        write_fn(payload)
+    except Exception as e:
+        db_breaker.record_failure()
+        print(f"[Spool] {kind} write failed ({type(e).__name__}: {e}), spooled for replay")
+        write_spool.append(kind, payload)
+        spool_drainer.start()
+        return False
+    db_breaker.record_success()
+    return True
+
+
+def _write_water_level_rows(rows: list, chunk_size: int | None = None, workers: int = 1):
+    """
+    Append readings to water_level_readings (a replayed reading is ignored as
+    a duplicate of its (location, created_at) key), then upsert each
+    sensor's newest reading into its system_logs row
+    """
+    readings, latest = split_readings(rows)
+    bulk_write('water_level_readings', readings, on_conflict=WATER_LEVEL_READINGS_CONFLICT_KEY,
+               chunk_size=chunk_size, workers=workers, ignore_duplicates=True)
+    bulk_write('system_logs', latest, on_conflict='id', chunk_size=chunk_size, workers=workers)
+
+
+def _write_water_levels(payloads: list):
+    """Upload ticks (one, or several replayed from the spool)"""
+    _write_water_level_rows([row for rows in payloads for row in rows])
+
+
+def _write_ingested_rows(payloads: list):
+    """Gateway row batches, written like upload ticks with larger concurrent chunks"""
+    _write_water_level_rows([row for chunk in payloads for row in chunk],
+                            chunk_size=INGEST_CHUNK_SIZE, workers=INGEST_FLUSH_WORKERS)
+
+
+def _write_weather_payloads(payloads: list):
+    for payload in payloads:
+        _write_weather(**payload)
+
+
+spool_drainer = SpoolDrainer(write_spool, db_breaker, {
+    'water_level': (_write_water_levels, 360),
+    'ingest': (_write_ingested_rows, 50),
+    # Multi-step writes with dependent ids: one payload per replay
+    'weather': (_write_weather_payloads, 1)
+}, interval=SPOOL_DRAIN_INTERVAL_SECONDS)
+
+
+def get_spool_stats() -> dict:
+    stats = write_spool.stats()
+    stats['breaker'] = db_breaker.stats()
+    stats['drainer'] = spool_drainer.stats()
+    return stats
+
+
+# ============================================
+# LOCATION IDS
+# ============================================
+
+# (latitude, longitude) -> location_id; ids are stable because location
+# rows are upserted on their coordinates instead of deleted and re-inserted
+_location_ids = {}
+_location_lock = threading.Lock()
+
+
+def get_location_id(lat: float, lng: float, timezone: str = 'Asia/Ho_Chi_Minh') -> int | None:
+    """
+    Return the stable location_id for coordinates
+    The first call per process upserts on the unique (latitude, longitude) key
+    """
+    key = (lat, lng)
+    with _location_lock:
+        location_id = _location_ids.get(key)
+    if location_id is not None:
+        return location_id
+    
+    location_data = {
+        'latitude': lat,
+        'longitude': lng,
+        'timezone': timezone
+    }
+    response = supabase_client.table('location').upsert(location_data, on_conflict='latitude,longitude').execute()
+    location_id = response.data[0]['location_id'] if response.data else None
+    
+    if location_id is not None:
+        with _location_lock:
+            _location_ids[key] = location_id
+    return location_id
+
+
+# ============================================
+# DIFFERENTIAL FORECAST INGESTION
+# ============================================
+
+# (table, location_id) -> {dt: fingerprint} for the rows of the latest
+# payload; older dts are dropped each cycle so memory stays bounded
+_forecast_fingerprints = {}
+_forecast_lock = threading.Lock()
+_ingest_stats = {'rows_inserted': 0, 'rows_updated': 0, 'rows_skipped': 0}
+
+# Natural key of the forecast tables (unique, see migrations/003)
+FORECAST_CONFLICT_KEY = 'location_id,dt'
+# Natural keys of the per-request weather tables (unique, see migrations/004)
+WEATHER_REQUEST_CONFLICT_KEY = 'location_id,request_time'
+CURRENT_WEATHER_CONFLICT_KEY = 'request_id'
+WEATHER_ALERT_CONFLICT_KEY = 'request_id,sender_name,event,start'
+
+
+def _row_fingerprint(record: dict) -> bytes:
+    # request_id changes every cycle, so it is not part of the row's content
+    content = {k: v for k, v in record.items() if k != 'request_id'}
+    return hashlib.blake2b(json.dumps(content, sort_keys=True, default=str).encode(), digest_size=16).digest()
+
+
+def write_forecast_rows(table: str, location_id: int, records: list) -> dict:
+    """
+    Write only new or changed forecast rows, keyed by (location_id, dt)
+    - unchanged rows (same fingerprint) are skipped and keep the request_id
+      of the cycle that last changed them, so readers select forecasts by
+      location_id and a dt window, never by request_id
+    - new and changed rows go out in one bulk upsert on (location_id, dt)
+    Fingerprints are per process: after a restart the first payload is
+    upserted in full, which overwrites rows instead of duplicating them.
+    Raises on failure (the fingerprints are then left as they were)
+    Returns {'inserted', 'updated', 'skipped'}, as seen by this process
+    """
+    with _forecast_lock:
+        previous = _forecast_fingerprints.get((table, location_id), {})
+    
+    current = {}
+    rows, changed = [], 0
+    for record in records:
+        dt = record.get('dt')
+        fingerprint = _row_fingerprint(record)
+        current[dt] = fingerprint
+        if previous.get(dt) == fingerprint:
+            continue
+        if dt in previous:
+            changed += 1
+        rows.append({**record, 'location_id': location_id})
+    
+    bulk_write(table, rows, on_conflict=FORECAST_CONFLICT_KEY)
+    
+    result = {
+        'inserted': len(rows) - changed,
+        'updated': changed,
+        'skipped': len(records) - len(rows)
+    }
+    with _forecast_lock:
+        _forecast_fingerprints[(table, location_id)] = current
+        _ingest_stats['rows_inserted'] += result['inserted']
+        _ingest_stats['rows_updated'] += result['updated']
+        _ingest_stats['rows_skipped'] += result['skipped']
+    return result
+
+
+def get_ingest_stats() -> dict:
+    """Cumulative forecast rows inserted/updated/skipped by differential ingestion"""
+    with _forecast_lock:
+        stats = dict(_ingest_stats)
+        stats['tracked_rows'] = sum(len(rows) for rows in _forecast_fingerprints.values())
+    return stats
+
+
+def get_hourly_forecasts(start_dt: int, end_dt: int) -> list:
+    """
+    Stored hourly forecast rows with start_dt <= dt < end_dt, grouped per
+    location: [{'location_id', 'latitude', 'longitude', 'hours': [{'dt',
+    'rain_1h', 'humidity', 'pop'}]}], hours in dt order
+    One row per (location_id, dt) (see write_forecast_rows), read in keyset
+    pages of FLOOD_TIMELINE_PAGE_ROWS so no location is cut off by a row
+    cap; coordinates come from one extra location query
+    """
+    if not supabase_client:
+        return []
+    
+    try:
+        window = lambda query: query.gte('dt', start_dt).lt('dt', end_dt)
+        rows = []
+        for page in keyset_pages('hourly_weather', 'location_id, dt, rain_1h, humidity, pop',
+                                 ('location_id', 'dt'), page_size=FLOOD_TIMELINE_PAGE_ROWS, where=window):
+            rows.extend(page)
+        location_ids = sorted({row['location_id'] for row in rows})
+        locations = supabase_client.table('location').select(
+            'location_id, latitude, longitude'
+        ).in_('location_id', location_ids).execute().data if location_ids else []
+    except Exception as e:
+        print(f"[Supabase] Error reading hourly forecasts: {e}")
+        return []
+    
+    coords = {
+        location['location_id']: (float(location['latitude']), float(location['longitude']))
+        for location in locations
+        if location.get('latitude') is not None and location.get('longitude') is not None
+    }
+    forecasts = {}
+    for row in rows:
+        if row['location_id'] not in coords:
+            continue
+        latitude, longitude = coords[row['location_id']]
+        forecasts.setdefault(row['location_id'], {
+            'location_id': row['location_id'],
+            'latitude': latitude,
+            'longitude': longitude,
+            'hours': []
+        })['hours'].append({
+            'dt': row['dt'],
+            'rain_1h': float(row.get('rain_1h') or 0.0),
+            'humidity': row.get('humidity'),
+            'pop': row.get('pop')
+        })
+    return list(forecasts.values())
+
+
+# ============================================
+# WEATHER CONDITION CACHE
+# ============================================
+
+# OpenWeather has ~60 condition codes, so api_id -> condition_id is cached
+# in-process and shared by the scheduler and the request paths
+_condition_cache = {}
+_condition_cache_lock = threading.Lock()
+_condition_cache_loaded = False
+_condition_cache_stats = {'hits': 0, 'misses': 0, 'preloaded': 0, 'upserts': 0, 'errors': 0}
+
+
+def preload_condition_cache() -> int:
+    """
+    Load every weather_condition row into the cache with one query
+    Called at startup; returns the number of cached conditions
+    """
+    global _condition_cache_loaded
+    
+    if not supabase_client:
+        return 0
+    
+    # Only attempted once: if it fails, misses are filled by upserts instead
+    _condition_cache_loaded = True
+    try:
+        response = supabase_client.table('weather_condition').select('condition_id, api_id').execute()
+        with _condition_cache_lock:
+            for row in response.data or []:
+                if row.get('api_id') is not None:
+                    _condition_cache[row['api_id']] = row['condition_id']
+            _condition_cache_stats['preloaded'] = len(_condition_cache)
+        print(f"[Supabase] ✓ Preloaded {len(_condition_cache)} weather conditions")
+    except Exception as e:
+        print(f"[Supabase] Error preloading weather conditions: {e}")
+    
+    return len(_condition_cache)
+
+
+def get_condition_id(condition: dict) -> int | None:
+    """
+    Resolve an OpenWeather condition ({'id', 'main', 'description', 'icon'})
+    to its weather_condition.condition_id
+    Cache hits cost nothing; a miss is filled with a single upsert on api_id
+    """
+    api_id = condition.get('id') if condition else None
+    if not api_id or not supabase_client:
+        return None
+    
+    if not _condition_cache_loaded:
+        preload_condition_cache()
+    
+    with _condition_cache_lock:
+        condition_id = _condition_cache.get(api_id)
+        if condition_id is not None:
+            _condition_cache_stats['hits'] += 1
+            return condition_id
+        _condition_cache_stats['misses'] += 1
+    
+    condition_data = {
+        'api_id': api_id,
+        'main': condition.get('main'),
+        'description': condition.get('description'),
+        'icon': condition.get('icon')
+    }
+    try:
+        response = supabase_client.table('weather_condition').upsert(condition_data, on_conflict='api_id').execute()
+        condition_id = response.data[0]['condition_id'] if response.data else None
+    except Exception as e:
+        print(f"[Supabase] Error upserting weather condition {api_id}: {e}")
+        with _condition_cache_lock:
+            _condition_cache_stats['errors'] += 1
+        return None
+    
+    if condition_id is not None:
+        with _condition_cache_lock:
+            _condition_cache[api_id] = condition_id
+            _condition_cache_stats['upserts'] += 1
+    return condition_id
+
+
+def get_condition_cache_stats() -> dict:
+    """Hit/miss counters for the weather condition cache"""
+    with _condition_cache_lock:
+        stats = dict(_condition_cache_stats)
+        stats['size'] = len(_condition_cache)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+
 def store_weather_to_existing_schema(location_name: str, lat: float, lng: float, weather_data: dict):
     """
     Store weather data to existing Supabase schema tables:
@@ -67,285 +514,33 @@ def store_weather_to_existing_schema(location_name: str, lat: float, lng: float,
     - weather_request: API request metadata
     - weather_condition: weather condition codes
     - current_weather: current weather data
+    - minutely/hourly/daily_weather: forecasts, written differentially
+      (only rows that are new or changed since the last payload)
+    - weather_alerts: active alerts
+    
+    The location row is upserted on (latitude, longitude), so its location_id
+    is stable across cycles and everything else is keyed off it
     
-    Uses UPSERT pattern: deletes old data for location → inserts new data
+    When the database is failing (or older weather writes are still queued)
+    the payload goes to the durable spool instead and is replayed later;
+    returns True when stored, WEATHER_SPOOLED when spooled, False otherwise
     """
     if not supabase_client or not weather_data:
         print(f"[DEBUG] ✗ store_weather_to_existing_schema skipped: supabase_client={bool(supabase_client)}, weather_data={bool(weather_data)}")
         return False
     
-    print(f"[DEBUG] Starting to store weather for {location_name} (lat={lat}, lng={lng})")
-    
+    payload = {
+        'location_name': location_name,
+        'lat': lat,
+        'lng': lng,
+        'weather_data': weather_data,
+        'request_time': datetime.utcnow().isoformat()
+    }
     try:
-        # Step 1: Get or create location entry
-        location_data = {
-            'latitude': lat,
-            'longitude': lng,
-            'timezone': weather_data.get('timezone', 'Asia/Ho_Chi_Minh')
-        }
-        print(f"[DEBUG] Step 1: Deleting old location entries for ({lat}, {lng})...")
-        
-        # Delete old location entry for these coordinates
-        try:
-            delete_result = supabase_client.table('location').delete().eq('latitude', lat).eq('longitude', lng).execute()
-            print(f"[DEBUG] Step 1a: Deleted old entries")
-        except Exception as del_e:
-            print(f"[DEBUG] Step 1a: Delete failed (continuing): {del_e}")
-            pass
-        
-        # Insert new location
-        print(f"[DEBUG] Step 1b: Inserting location data: {location_data}")
-        location_response = supabase_client.table('location').insert(location_data).execute()
-        print(f"[DEBUG] Step 1c: Location insert response: {location_response.data}")
-        location_id = location_response.data[0]['location_id'] if location_response.data else None
-        
-        if not location_id:
-            print(f"[DEBUG] ✗ Error: Could not get location_id from response")
-            return False
-        
-        print(f"[DEBUG] Step 1d: Got location_id = {location_id}")
-        
-        # Step 2: Insert weather request metadata
-        request_data = {
-            'location_id': location_id,
-            'request_time': datetime.utcnow().isoformat(),
-            'source': 'openweather_api'
-        }
-        print(f"[DEBUG] Step 2a: Inserting request data: {request_data}")
-        
-        request_response = supabase_client.table('weather_request').insert(request_data).execute()
-        print(f"[DEBUG] Step 2b: Request insert response: {request_response.data}")
-        request_id = request_response.data[0]['request_id'] if request_response.data else None
-        
-        if not request_id:
-            print(f"[DEBUG] ✗ Error: Could not get request_id from response")
-            return False
-        
-        print(f"[DEBUG] Step 2c: Got request_id = {request_id}")
-        
-        # Step 3: Store weather condition
-        current = weather_data.get('current', {})
-        weather_condition = current.get('weather', [{}])[0]
-        condition_id = weather_condition.get('id')
-        
-        print(f"[DEBUG] Step 3a: Weather condition = {weather_condition}")
-        
-        if condition_id:
-            condition_data = {
-                'api_id': condition_id,
-                'main': weather_condition.get('main'),
-                'description': weather_condition.get('description'),
-                'icon': weather_condition.get('icon')
-            }
-            print(f"[DEBUG] Step 3b: Checking for existing condition with api_id={condition_id}")
-            
-            # Check if condition exists, if not insert it
-            try:
-                existing = supabase_client.table('weather_condition').select('*').eq('api_id', condition_id).execute()
-                print(f"[DEBUG] Step 3c: Existing conditions: {existing.data}")
-                if not existing.data:
-                    print(f"[DEBUG] Step 3d: Inserting new condition: {condition_data}")
-                    supabase_client.table('weather_condition').insert(condition_data).execute()
-                    # Get the new condition_id
-                    new_condition = supabase_client.table('weather_condition').select('*').eq('api_id', condition_id).execute()
-                    print(f"[DEBUG] Step 3e: New condition response: {new_condition.data}")
-                    condition_id = new_condition.data[0]['condition_id'] if new_condition.data else condition_id
-                else:
-                    # IMPORTANT: Extract the database condition_id from existing record
-                    condition_id = existing.data[0]['condition_id']
-                    print(f"[DEBUG] Step 3e: Using existing condition_id = {condition_id}")
-            except Exception as cond_e:
-                print(f"[DEBUG] Step 3: Condition insert error (continuing): {cond_e}")
-                pass
-        
-        # Step 4: Store current weather data
-        current_weather_data = {
-            'request_id': request_id,
-            'dt': current.get('dt'),
-            'temp': current.get('temp'),
-            'feels_like': current.get('feels_like'),
-            'pressure': current.get('pressure'),
-            'humidity': current.get('humidity'),
-            'dew_point': current.get('dew_point'),
-            'uvi': current.get('uvi'),
-            'clouds': current.get('clouds'),
-            'visibility': current.get('visibility'),
-            'wind_speed': current.get('wind_speed'),
-            'wind_deg': current.get('wind_deg'),
-            'wind_gust': current.get('wind_gust'),
-            'rain_1h': current.get('rain', {}).get('1h'),
-            'snow_1h': current.get('snow', {}).get('1h'),
-            'condition_id': condition_id
-        }
-        
-        print(f"[DEBUG] Step 4a: Current weather data: {current_weather_data}")
-        
-        # Delete old current weather for this request
-        try:
-            print(f"[DEBUG] Step 4b: Deleting old current weather for request_id={request_id}")
-            supabase_client.table('current_weather').delete().eq('request_id', request_id).execute()
-        except Exception as del_e:
-            print(f"[DEBUG] Step 4b: Delete failed (continuing): {del_e}")
-            pass
-        
-        # Insert new current weather
-        print(f"[DEBUG] Step 4c: Inserting new current weather")
-        weather_response = supabase_client.table('current_weather').insert(current_weather_data).execute()
-        print(f"[DEBUG] Step 4d: Current weather insert response: {weather_response.data}")
-        
-        # Step 5: Store minutely weather data (precipitation every minute)
-        print(f"[DEBUG] Step 5a: Processing minutely weather data...")
-        minutely_data = weather_data.get('minutely', [])
-        if minutely_data:
-            try:
-                # Delete old minutely data for this request
-                supabase_client.table('minutely_weather').delete().eq('request_id', request_id).execute()
-                
-                # Insert new minutely data (limit to first 60 for reasonable data size)
-                for minute in minutely_data[:60]:
-                    minutely_record = {
-                        'request_id': request_id,
-                        'dt': minute.get('dt'),
-                        'precipitation': minute.get('precipitation')
-                    }
-                    supabase_client.table('minutely_weather').insert(minutely_record).execute()
-                print(f"[DEBUG] Step 5b: ✓ Inserted {len(minutely_data[:60])} minutely records")
-            except Exception as min_e:
-                print(f"[DEBUG] Step 5: Minutely insert error: {min_e}")
-        
-        # Step 6: Store hourly weather data (48 hours)
-        print(f"[DEBUG] Step 6a: Processing hourly weather data...")
-        hourly_data = weather_data.get('hourly', [])
-        if hourly_data:
-            try:
-                # Delete old hourly data for this request
-                supabase_client.table('hourly_weather').delete().eq('request_id', request_id).execute()
-                
-                # Insert new hourly data
-                for hour in hourly_data:
-                    hour_condition = hour.get('weather', [{}])[0]
-                    hour_condition_api_id = hour_condition.get('id')
-                    hour_condition_id = None
-                    
-                    # Look up the database condition_id if API id exists
-                    if hour_condition_api_id:
-                        try:
-                            existing_cond = supabase_client.table('weather_condition').select('condition_id').eq('api_id', hour_condition_api_id).execute()
-                            if existing_cond.data:
-                                hour_condition_id = existing_cond.data[0]['condition_id']
-                        except:
-                            pass
-                    
-                    hourly_record = {
-                        'request_id': request_id,
-                        'dt': hour.get('dt'),
-                        'temp': hour.get('temp'),
-                        'feels_like': hour.get('feels_like'),
-                        'pressure': hour.get('pressure'),
-                        'humidity': hour.get('humidity'),
-                        'dew_point': hour.get('dew_point'),
-                        'uvi': hour.get('uvi'),
-                        'clouds': hour.get('clouds'),
-                        'visibility': hour.get('visibility'),
-                        'wind_speed': hour.get('wind_speed'),
-                        'wind_deg': hour.get('wind_deg'),
-                        'wind_gust': hour.get('wind_gust'),
-                        'pop': hour.get('pop'),
-                        'rain_1h': hour.get('rain', {}).get('1h'),
-                        'snow_1h': hour.get('snow', {}).get('1h'),
-                        'condition_id': hour_condition_id
-                    }
-                    supabase_client.table('hourly_weather').insert(hourly_record).execute()
-                print(f"[DEBUG] Step 6b: ✓ Inserted {len(hourly_data)} hourly records")
-            except Exception as hour_e:
-                print(f"[DEBUG] Step 6: Hourly insert error: {hour_e}")
-        
-        # Step 7: Store daily weather data (7-8 days)
-        print(f"[DEBUG] Step 7a: Processing daily weather data...")
-        daily_data = weather_data.get('daily', [])
-        if daily_data:
-            try:
-                # Delete old daily data for this request
-                supabase_client.table('daily_weather').delete().eq('request_id', request_id).execute()
-                
-                # Insert new daily data
-                for day in daily_data:
-                    day_condition = day.get('weather', [{}])[0]
-                    day_condition_api_id = day_condition.get('id')
-                    day_condition_id = None
-                    
-                    # Look up the database condition_id if API id exists
-                    if day_condition_api_id:
-                        try:
-                            existing_cond = supabase_client.table('weather_condition').select('condition_id').eq('api_id', day_condition_api_id).execute()
-                            if existing_cond.data:
-                                day_condition_id = existing_cond.data[0]['condition_id']
-                        except:
-                            pass
-                    
-                    daily_record = {
-                        'request_id': request_id,
-                        'dt': day.get('dt'),
-                        'sunrise': day.get('sunrise'),
-                        'sunset': day.get('sunset'),
-                        'moonrise': day.get('moonrise'),
-                        'moonset': day.get('moonset'),
-                        'moon_phase': day.get('moon_phase'),
-                        'summary': day.get('summary'),
-                        'temp_morn': day.get('temp', {}).get('morn'),
-                        'temp_day': day.get('temp', {}).get('day'),
-                        'temp_eve': day.get('temp', {}).get('eve'),
-                        'temp_night': day.get('temp', {}).get('night'),
-                        'temp_min': day.get('temp', {}).get('min'),
-                        'temp_max': day.get('temp', {}).get('max'),
-                        'feels_morn': day.get('feels_like', {}).get('morn'),
-                        'feels_day': day.get('feels_like', {}).get('day'),
-                        'feels_eve': day.get('feels_like', {}).get('eve'),
-                        'feels_night': day.get('feels_like', {}).get('night'),
-                        'pressure': day.get('pressure'),
-                        'humidity': day.get('humidity'),
-                        'dew_point': day.get('dew_point'),
-                        'wind_speed': day.get('wind_speed'),
-                        'wind_deg': day.get('wind_deg'),
-                        'wind_gust': day.get('wind_gust'),
-                        'clouds': day.get('clouds'),
-                        'pop': day.get('pop'),
-                        'rain': day.get('rain'),
-                        'snow': day.get('snow'),
-                        'uvi': day.get('uvi'),
-                        'condition_id': day_condition_id
-                    }
-                    supabase_client.table('daily_weather').insert(daily_record).execute()
-                print(f"[DEBUG] Step 7b: ✓ Inserted {len(daily_data)} daily records")
-            except Exception as day_e:
-                print(f"[DEBUG] Step 7: Daily insert error: {day_e}")
-        
-        # Step 8: Store weather alerts
-        print(f"[DEBUG] Step 8a: Processing weather alerts...")
-        alerts_data = weather_data.get('alerts', [])
-        if alerts_data:
-            try:
-                # Delete old alerts for this request
-                supabase_client.table('weather_alerts').delete().eq('request_id', request_id).execute()
-                
-                # Insert new alerts
-                for alert in alerts_data:
-                    alert_record = {
-                        'request_id': request_id,
-                        'sender_name': alert.get('sender_name'),
-                        'event': alert.get('event'),
-                        'start': alert.get('start'),
-                        'end': alert.get('end'),
-                        'description': alert.get('description')
-                    }
-                    supabase_client.table('weather_alerts').insert(alert_record).execute()
-                print(f"[DEBUG] Step 8b: ✓ Inserted {len(alerts_data)} alert records")
-            except Exception as alert_e:
-                print(f"[DEBUG] Step 8: Alert insert error: {alert_e}")
-        
-        print(f"[Supabase] ✓ Weather stored for {location_name}: {current_weather_data['temp']}°C, {weather_condition.get('main')}")
-        return True
-        
+        if write_or_spool('weather', payload, lambda p: _write_weather(**p)):
+            return True
+        print(f"[Spool] Weather for {location_name} spooled for replay")
+        return WEATHER_SPOOLED
     except Exception as e:
         print(f"[DEBUG] ✗ Exception in store_weather_to_existing_schema: {type(e).__name__}: {str(e)}")
         import traceback
@@ -353,6 +548,193 @@ def store_weather_to_existing_schema(location_name: str, lat: float, lng: float,
         return False
 
 
+def _write_weather(location_name: str, lat: float, lng: float, weather_data: dict, request_time: str | None = None):
+    """
+    The writes behind store_weather_to_existing_schema; raises on failure
+    request_time keeps the original fetch time when replayed from the spool
+    """
+    print(f"[DEBUG] Starting to store weather for {location_name} (lat={lat}, lng={lng})")
+    
+    # Step 1: Get or create location entry (stable id, upserted on lat/lng)
+    location_id = get_location_id(lat, lng, weather_data.get('timezone', 'Asia/Ho_Chi_Minh'))
+    
+    if not location_id:
+        raise RuntimeError(f"Could not get location_id for ({lat}, {lng})")
+    
+    print(f"[DEBUG] Step 1: Got location_id = {location_id}")
+    
+    # Step 2: Upsert weather request metadata on (location_id, request_time),
+    # so a spooled replay of a partly written payload reuses the same request_id
+    request_data = {
+        'location_id': location_id,
+        'request_time': request_time or datetime.utcnow().isoformat(),
+        'source': 'openweather_api'
+    }
+    print(f"[DEBUG] Step 2a: Upserting request data: {request_data}")
+    
+    request_response = supabase_client.table('weather_request').upsert(
+        request_data, on_conflict=WEATHER_REQUEST_CONFLICT_KEY
+    ).execute()
+    print(f"[DEBUG] Step 2b: Request upsert response: {request_response.data}")
+    request_id = request_response.data[0]['request_id'] if request_response.data else None
+    
+    if not request_id:
+        raise RuntimeError("Could not get request_id from response")
+    
+    print(f"[DEBUG] Step 2c: Got request_id = {request_id}")
+    
+    # Step 3: Resolve weather condition (cached api_id -> condition_id)
+    current = weather_data.get('current', {})
+    weather_condition = current.get('weather', [{}])[0]
+    condition_id = get_condition_id(weather_condition)
+    print(f"[DEBUG] Step 3: Weather condition {weather_condition.get('id')} -> condition_id = {condition_id}")
+    
+    # Step 4: Store current weather data
+    current_weather_data = {
+        'request_id': request_id,
+        'dt': current.get('dt'),
+        'temp': current.get('temp'),
+        'feels_like': current.get('feels_like'),
+        'pressure': current.get('pressure'),
+        'humidity': current.get('humidity'),
+        'dew_point': current.get('dew_point'),
+        'uvi': current.get('uvi'),
+        'clouds': current.get('clouds'),
+        'visibility': current.get('visibility'),
+        'wind_speed': current.get('wind_speed'),
+        'wind_deg': current.get('wind_deg'),
+        'wind_gust': current.get('wind_gust'),
+        'rain_1h': current.get('rain', {}).get('1h'),
+        'snow_1h': current.get('snow', {}).get('1h'),
+        'condition_id': condition_id
+    }
+    
+    print(f"[DEBUG] Step 4a: Current weather data: {current_weather_data}")
+    
+    # One current weather row per request (upserted on request_id)
+    print(f"[DEBUG] Step 4c: Upserting current weather")
+    weather_response = supabase_client.table('current_weather').upsert(
+        current_weather_data, on_conflict=CURRENT_WEATHER_CONFLICT_KEY
+    ).execute()
+    print(f"[DEBUG] Step 4d: Current weather upsert response: {weather_response.data}")
+    
+    # Steps 5-7 are differential: rows are upserted on (location_id, dt) and only
+    # new or changed rows are written (unchanged rows keep their old request_id)
+    # Failures in steps 5-8 propagate so write_or_spool spools the payload;
+    # every step is an upsert on a natural key, so the replay is idempotent
+    forecast_results = {}
+    
+    # Step 5: Store minutely weather data (precipitation every minute)
+    print(f"[DEBUG] Step 5a: Processing minutely weather data...")
+    minutely_data = weather_data.get('minutely', [])
+    if minutely_data:
+        # Limit to first 60 for reasonable data size
+        minutely_records = [{
+            'request_id': request_id,
+            'dt': minute.get('dt'),
+            'precipitation': minute.get('precipitation')
+        } for minute in minutely_data[:60]]
+        result = write_forecast_rows('minutely_weather', location_id, minutely_records)
+        forecast_results['minutely'] = result
+        print(f"[DEBUG] Step 5b: ✓ Minutely records {result}")
+    
+    # Step 6: Store hourly weather data (48 hours)
+    print(f"[DEBUG] Step 6a: Processing hourly weather data...")
+    hourly_data = weather_data.get('hourly', [])
+    if hourly_data:
+        hourly_records = []
+        for hour in hourly_data:
+            hour_condition_id = get_condition_id(hour.get('weather', [{}])[0])
+            hourly_records.append({
+                'request_id': request_id,
+                'dt': hour.get('dt'),
+                'temp': hour.get('temp'),
+                'feels_like': hour.get('feels_like'),
+                'pressure': hour.get('pressure'),
+                'humidity': hour.get('humidity'),
+                'dew_point': hour.get('dew_point'),
+                'uvi': hour.get('uvi'),
+                'clouds': hour.get('clouds'),
+                'visibility': hour.get('visibility'),
+                'wind_speed': hour.get('wind_speed'),
+                'wind_deg': hour.get('wind_deg'),
+                'wind_gust': hour.get('wind_gust'),
+                'pop': hour.get('pop'),
+                'rain_1h': hour.get('rain', {}).get('1h'),
+                'snow_1h': hour.get('snow', {}).get('1h'),
+                'condition_id': hour_condition_id
+            })
+        result = write_forecast_rows('hourly_weather', location_id, hourly_records)
+        forecast_results['hourly'] = result
+        print(f"[DEBUG] Step 6b: ✓ Hourly records {result}")
+    
+    # Step 7: Store daily weather data (7-8 days)
+    print(f"[DEBUG] Step 7a: Processing daily weather data...")
+    daily_data = weather_data.get('daily', [])
+    if daily_data:
+        daily_records = []
+        for day in daily_data:
+            day_condition_id = get_condition_id(day.get('weather', [{}])[0])
+            daily_records.append({
+                'request_id': request_id,
+                'dt': day.get('dt'),
+                'sunrise': day.get('sunrise'),
+                'sunset': day.get('sunset'),
+                'moonrise': day.get('moonrise'),
+                'moonset': day.get('moonset'),
+                'moon_phase': day.get('moon_phase'),
+                'summary': day.get('summary'),
+                'temp_morn': day.get('temp', {}).get('morn'),
+                'temp_day': day.get('temp', {}).get('day'),
+                'temp_eve': day.get('temp', {}).get('eve'),
+                'temp_night': day.get('temp', {}).get('night'),
+                'temp_min': day.get('temp', {}).get('min'),
+                'temp_max': day.get('temp', {}).get('max'),
+                'feels_morn': day.get('feels_like', {}).get('morn'),
+                'feels_day': day.get('feels_like', {}).get('day'),
+                'feels_eve': day.get('feels_like', {}).get('eve'),
+                'feels_night': day.get('feels_like', {}).get('night'),
+                'pressure': day.get('pressure'),
+                'humidity': day.get('humidity'),
+                'dew_point': day.get('dew_point'),
+                'wind_speed': day.get('wind_speed'),
+                'wind_deg': day.get('wind_deg'),
+                'wind_gust': day.get('wind_gust'),
+                'clouds': day.get('clouds'),
+                'pop': day.get('pop'),
+                'rain': day.get('rain'),
+                'snow': day.get('snow'),
+                'uvi': day.get('uvi'),
+                'condition_id': day_condition_id
+            })
+        result = write_forecast_rows('daily_weather', location_id, daily_records)
+        forecast_results['daily'] = result
+        print(f"[DEBUG] Step 7b: ✓ Daily records {result}")
+    
+    # Step 8: Store weather alerts (upserted on request_id, sender, event, start)
+    print(f"[DEBUG] Step 8a: Processing weather alerts...")
+    alerts_data = weather_data.get('alerts', [])
+    if alerts_data:
+        # Keyed per payload too: one upsert cannot touch the same row twice
+        alert_records = list({
+            (alert.get('sender_name'), alert.get('event'), alert.get('start')): {
+                'request_id': request_id,
+                'sender_name': alert.get('sender_name'),
+                'event': alert.get('event'),
+                'start': alert.get('start'),
+                'end': alert.get('end'),
+                'description': alert.get('description')
+            } for alert in alerts_data
+        }.values())
+        bulk_write('weather_alerts', alert_records, on_conflict=WEATHER_ALERT_CONFLICT_KEY)
+        print(f"[DEBUG] Step 8b: ✓ Upserted {len(alert_records)} alert records")
+    
+    written = sum(r['inserted'] + r['updated'] for r in forecast_results.values())
+    skipped = sum(r['skipped'] for r in forecast_results.values())
+    print(f"[Supabase] ✓ Weather stored for {location_name}: {current_weather_data['temp']}°C, {weather_condition.get('main')} "
+          f"(forecast rows: {written} written, {skipped} unchanged)")
+
+
 # ============================================
 # WATER LEVEL FUNCTIONS
 # ============================================
@@ -375,58 +757,240 @@ def update_water_level(sensor):
     return sensor['current_level']
 
 
-def upload_water_level_to_supabase():
+def upload_water_level_to_supabase(sensors: list | None = None):
     """
     Upload water level data to Supabase (runs every 10 seconds)
     Uses UPSERT: replaces data for same location instead of creating duplicates
+    
+    All sensors are written in one bulk upsert per tick (chunked by
+    SUPABASE_INSERT_CHUNK_SIZE), keyed by each location's fixed row id;
+    the readings are also appended to water_level_readings (kept for
+    WATER_LEVEL_READINGS_RETENTION_DAYS, see prune_water_level_readings)
+    Every reading is also appended to the in-memory water_level_history
+    and pushed to /api/stream clients
     """
     if not supabase_client:
         return
     
+    sensors = WATER_LEVEL_SENSORS if sensors is None else sensors
+    
     try:
-        for sensor in WATER_LEVEL_SENSORS:
-            # Update water level
-            water_level = update_water_level(sensor)
-            
-            # Prepare data
-            data = {
-                'id': str(uuid.uuid4()),  # Generate UUID for the id field
-                'water_level_cm': water_level,
-                'location': sensor['location'],
-                # created_at is auto-handled by Supabase
-            }
-            
-            # UPSERT: Delete old data for this location, then insert new
-            # This prevents duplicates and always keeps the latest reading
-            try:
-                # First, delete old entries for this location
-                supabase_client.table('system_logs').delete().eq('location', sensor['location']).execute()
-                
-                # Then insert new data
-                response = supabase_client.table('system_logs').insert(data).execute()
-                print(f"[Supabase] ✓ {sensor['location']}: {water_level} cm")
-                
-            except Exception as e:
-                print(f"[Supabase] Error for {sensor['location']}: {e}")
+        created_at = datetime.utcnow().isoformat()
+        rows = [{
+            'id': sensor_row_id(sensor['location']),
+            'water_level_cm': update_water_level(sensor),
+            'location': sensor['location'],
+            # Set explicitly: the column default only applies on insert
+            'created_at': created_at
+        } for sensor in sensors]
+        
+        # Recorded and streamed before the write so a failed upload loses neither
+        water_level_history.record_many((row['location'], row['water_level_cm']) for row in rows)
+        live_updates.publish('water_level', {
+            'timestamp': created_at,
+            'readings': [{'location': row['location'], 'water_level_cm': row['water_level_cm']} for row in rows]
+        })
+        
+        if not write_or_spool('water_level', rows, lambda r: _write_water_levels([r])):
+            print(f"[Spool] {len(rows)} water level readings spooled for replay")
+            return
+        
+        if len(rows) <= 10:
+            for row in rows:
+                print(f"[Supabase] ✓ {row['location']}: {row['water_level_cm']} cm")
+        else:
+            print(f"[Supabase] ✓ Uploaded {len(rows)} water level readings")
                 
     except Exception as e:
         print(f"[Supabase] Error updating water levels: {e}")
 
 
-def get_latest_water_levels():
+def publish_ingested_readings(readings: list):
     """
-    Retrieve latest water level readings from Supabase
+    Record gateway readings [(location, water_level_cm, unix_ts), ...] in
+    water_level_history and stream the latest reading per sensor
+    """
+    water_level_history.record_readings(readings)
+    
+    latest = {}
+    for location, level, ts in readings:
+        if location not in latest or ts >= latest[location][1]:
+            latest[location] = (level, ts)
+    live_updates.publish('water_level', {
+        'timestamp': datetime.utcnow().isoformat(),
+        'readings': [{'location': loc, 'water_level_cm': level} for loc, (level, _) in latest.items()]
+    })
+
+
+def store_ingested_readings(readings: list):
+    """
+    Store gateway readings [(location, water_level_cm, unix_ts), ...] in bulk:
+    all of them in water_level_readings, the newest per sensor in system_logs
+    Spooled for replay when the database is failing
+    """
+    if not supabase_client:
+        return
+    # Vectorized unix seconds -> ISO strings (per-row datetime calls dominate otherwise)
+    stamps = np.array([ts for _, _, ts in readings]) * 1e6
+    created_at = np.datetime_as_string(stamps.astype('datetime64[us]')).tolist()
+    rows = [{
+        'water_level_cm': level,
+        'location': location,
+        'created_at': stamp
+    } for (location, level, _), stamp in zip(readings, created_at)]
+    write_or_spool('ingest', rows, lambda r: _write_ingested_rows([r]))
+
+
+def prune_water_level_readings():
+    """
+    Delete water_level_readings older than WATER_LEVEL_READINGS_RETENTION_DAYS
+    (runs daily; system_logs keeps each sensor's latest reading regardless)
+    """
+    if not supabase_client or WATER_LEVEL_READINGS_RETENTION_DAYS <= 0:
+        return
+    
+    cutoff = (datetime.utcnow() - timedelta(days=WATER_LEVEL_READINGS_RETENTION_DAYS)).isoformat()
+    try:
+        supabase_client.table('water_level_readings').delete(
+            returning=ReturnMethod.minimal
+        ).lt('created_at', cutoff).execute()
+        print(f"[Supabase] ✓ Pruned water_level_readings before {cutoff}")
+    except Exception as e:
+        print(f"[Supabase] Error pruning water_level_readings: {e}")
+
+
+def get_latest_water_levels(location: str | None = None):
+    """
+    Retrieve latest water level readings from Supabase (one system_logs row
+    per sensor), freshest first; only that sensor's row when location is given
     """
     if not supabase_client:
         return []
     
     try:
-        response = supabase_client.table('system_logs').select('*').execute()
+        query = supabase_client.table('system_logs').select('*')
+        if location:
+            query = query.eq('location', location)
+        response = query.order('created_at', desc=True).limit(WATER_LEVEL_LATEST_LIMIT).execute()
         return response.data if hasattr(response, 'data') else []
     except Exception as e:
         print(f"[Supabase] Error retrieving water levels: {e}")
         return []
 
+
+# ============================================
+# SIMULATION MODE
+# ============================================
+
+def _load_simulation_mode() -> str | None:
+    """
+    Read the mode from sensor_config (id=1); SAFE when missing,
+    None when the read failed so the cache retries instead of keeping it
+    """
+    if not supabase_client:
+        return 'SAFE'
+    try:
+        print('[Backend] Fetching sensor_config mode (id=1)')
+        response = supabase_client.table('sensor_config').select('mode').eq('id', 1).execute()
+        return str(response.data[0]['mode']).upper() if response.data else 'SAFE'
+    except Exception as e:
+        print(f"[Backend] ✗ Could not read sensor_config mode: {e}")
+        return None
+
+
+# Writes through set_simulation_mode update the cache at once; writes made
+# elsewhere are picked up by the re-read every MODE_LIVE_TTL_SECONDS. Either
+# way changes are pushed to simulators by the ModePublisher started in main
+simulation_mode = ModeCache(_load_simulation_mode, live=True, live_ttl_seconds=MODE_LIVE_TTL_SECONDS)
+
+
+def get_simulation_mode() -> str:
+    """Current mode, from memory after the first read"""
+    return simulation_mode.get()
+
+
+def set_simulation_mode(mode: str) -> str:
+    """
+    Persist the mode to sensor_config, then update the cache (which
+    notifies subscribers). Raises on database errors
+    """
+    # Try update first
+    try:
+        print('[Backend] Updating sensor_config mode to', mode)
+        update_resp = supabase_client.table('sensor_config').update({'mode': mode}).eq('id', 1).execute()
+        # If no row updated, insert
+        if not getattr(update_resp, 'data', None):
+            print('[Backend] No existing row updated, inserting new mode row')
+            supabase_client.table('sensor_config').insert({'id': 1, 'mode': mode}).execute()
+    except Exception:
+        # Fallback to insert
+        print('[Backend] Update failed, inserting mode row')
+        supabase_client.table('sensor_config').insert({'id': 1, 'mode': mode}).execute()
+    
+    simulation_mode.set(mode)
+    return mode
+
+# ============================================
+# WEATHER LOCATION INDEX
+# ============================================
+
+# Latest stored weather per location, looked up by nearest coordinates;
+# rebuilt by the scheduler after every weather cycle
+weather_location_index = SpatialIndex(WEATHER_INDEX_MAX_DISTANCE_KM)
+_weather_index_loaded = False
+
+
+def refresh_weather_location_index() -> int:
+    """
+    Rebuild weather_location_index from the newest weather_request per location
+    (same row shape as get_latest_weather_from_db). On error the previous
+    index is kept. Returns the number of indexed locations
+    """
+    global _weather_index_loaded
+    if not supabase_client:
+        return 0
+    _weather_index_loaded = True
+    
+    try:
+        response = supabase_client.table('weather_request').select(
+            '*, location(latitude, longitude, timezone), current_weather(*, weather_condition(*))'
+        ).order('request_time', desc=True).limit(WEATHER_INDEX_SCAN_ROWS).execute()
+    except Exception as e:
+        print(f"[Supabase] Error refreshing weather location index: {e}")
+        return len(weather_location_index)
+    
+    entries = []
+    seen = set()
+    for reading in response.data or []:
+        location = reading.get('location') or {}
+        key = reading.get('location_id') or (location.get('latitude'), location.get('longitude'))
+        if key in seen or location.get('latitude') is None or location.get('longitude') is None:
+            continue
+        seen.add(key)
+        entries.append((location['latitude'], location['longitude'], reading))
+    
+    count = weather_location_index.rebuild(entries)
+    print(f"[Index] ✓ Indexed latest weather for {count} locations")
+    return count
+
+
+def find_stored_weather(coords: list) -> list:
+    """
+    Latest stored weather row of the nearest location for each (lat, lon),
+    or None beyond WEATHER_INDEX_MAX_DISTANCE_KM; loads the index on first use
+    """
+    if supabase_client and not _weather_index_loaded:
+        refresh_weather_location_index()
+    return [match[0] if match else None for match in weather_location_index.nearest_many(coords)]
+
+
+def stored_weather_points() -> tuple:
+    """(coords (n, 2) lat/lon, latest weather rows) of every indexed location"""
+    if supabase_client and not _weather_index_loaded:
+        refresh_weather_location_index()
+    return weather_location_index.points()
+
+
 # ============================================
 # DATA RETRIEVAL FUNCTIONS
 # ============================================
@@ -441,16 +1005,18 @@ def get_weather_for_all_districts():
     for location in HCM_LOCATIONS:
         print(f"[Backend] Fetching {location['name']}...")
         
-        weather_data = fetch_from_openweather(location['lat'], location['lng'])
+        weather_data, source = fetch_weather_with_source(location['lat'], location['lng'])
         
         if weather_data:
-            # Store to existing Supabase schema
-            store_weather_to_existing_schema(location['name'], location['lat'], location['lng'], weather_data)
+            # Store to existing Supabase schema (cached data is already stored)
+            if source == 'live':
+                store_weather_to_existing_schema(location['name'], location['lat'], location['lng'], weather_data)
             
             results.append({
                 'location_name': location['name'],
                 'latitude': location['lat'],
                 'longitude': location['lng'],
+                'source': source,
                 'weather_data': weather_data
             })
     
@@ -467,10 +1033,10 @@ def get_weather_for_district(district_name: str):
     if not location:
         return None
     
-    weather_data = fetch_from_openweather(location['lat'], location['lng'])
+    weather_data, source = fetch_weather_with_source(location['lat'], location['lng'])
     
-    if weather_data:
-        # Store to existing Supabase schema
+    if weather_data and source == 'live':
+        # Store to existing Supabase schema (cached data is already stored)
         store_weather_to_existing_schema(location['name'], location['lat'], location['lng'], weather_data)
     
     return weather_data
@@ -481,10 +1047,10 @@ def get_weather_for_coordinates(lat: float, lng: float):
     Fetch weather data for custom coordinates
     Automatically stores data to existing Supabase schema when fetched
     """
-    weather_data = fetch_from_openweather(lat, lng)
+    weather_data, source = fetch_weather_with_source(lat, lng)
     
-    if weather_data:
-        # Store to existing Supabase schema
+    if weather_data and source == 'live':
+        # Store to existing Supabase schema (cached data is already stored)
         location_name = f"Custom_{lat:.4f}_{lng:.4f}"
         store_weather_to_existing_schema(location_name, lat, lng, weather_data)
     
@@ -498,12 +1064,13 @@ def get_all_weather_alerts():
     alerts = []
     
     for location in HCM_LOCATIONS:
-        weather_data = fetch_from_openweather(location['lat'], location['lng'])
+        weather_data, source = fetch_weather_with_source(location['lat'], location['lng'])
         
         if weather_data and 'alerts' in weather_data:
             for alert in weather_data['alerts']:
                 alerts.append({
                     'location': location['name'],
+                    'source': source,
                     'alert': alert
                 })
     
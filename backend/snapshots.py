@@ -0,0 +1,68 @@
+"""
+Pre-serialized Snapshots for FlowGuard Backend
+Background jobs publish immutable, already-encoded JSON payloads; endpoints
+serve them as-is with a strong ETag, independent of upstream latency
+"""
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+
+class Snapshot(NamedTuple):
+    body: bytes
+    etag: str
+    published_at: str
+    published_monotonic: float
+    version: int
+
+    def age_seconds(self) -> float:
+        return time.monotonic() - self.published_monotonic
+
+
+class SnapshotStore:
+    """
+    Holds the latest published Snapshot
+    publish() serializes once; get() is a single attribute read
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._current = None
+        self._lock = threading.Lock()
+        self._version = 0
+
+    def publish(self, payload: dict) -> Snapshot:
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        with self._lock:
+            self._version += 1
+            snapshot = Snapshot(
+                body=body,
+                etag=etag,
+                published_at=datetime.now().isoformat(),
+                published_monotonic=time.monotonic(),
+                version=self._version
+            )
+            self._current = snapshot
+        return snapshot
+
+    def get(self) -> Snapshot | None:
+        return self._current
+
+    def stats(self) -> dict:
+        snapshot = self._current
+        if snapshot is None:
+            return {'name': self.name, 'published': False}
+        return {
+            'name': self.name,
+            'published': True,
+            'version': snapshot.version,
+            'etag': snapshot.etag,
+            'bytes': len(snapshot.body),
+            'published_at': snapshot.published_at,
+            'age_s': round(snapshot.age_seconds(), 1)
+        }
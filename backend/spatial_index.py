@@ -0,0 +1,105 @@
+"""
+Spatial Index for FlowGuard Backend
+Nearest-neighbour lookup of stored locations by coordinates: points are
+projected to kilometres (equirectangular around their mean latitude, exact
+enough at city scale) and held in a KD-tree, so each query is O(log n) and
+bounded by a maximum distance
+"""
+
+import math
+import threading
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def project_km(coords: np.ndarray, cos_lat0: float) -> np.ndarray:
+    """(n, 2) lat/lon degrees -> (n, 2) x/y kilometres, equirectangular at cos(lat0)"""
+    radians = np.radians(coords)
+    return np.column_stack((radians[:, 1] * cos_lat0, radians[:, 0])) * EARTH_RADIUS_KM
+
+
+class _IndexState(NamedTuple):
+    tree: cKDTree | None
+    coords: np.ndarray
+    payloads: list
+    cos_lat0: float
+    built_at: float
+
+
+class SpatialIndex:
+    """
+    KD-tree over (lat, lon, payload) entries
+    rebuild() builds a new tree and swaps it in; queries read whichever
+    tree is current without taking a lock
+    """
+
+    def __init__(self, max_distance_km: float):
+        self.max_distance_km = max_distance_km
+        self._state = _IndexState(None, np.empty((0, 2)), [], 1.0, 0.0)
+        self._lock = threading.Lock()
+        self._stats = {'rebuilds': 0, 'queries': 0, 'hits': 0, 'misses': 0, 'last_build_s': None}
+
+    def rebuild(self, entries: list) -> int:
+        """entries: [(lat, lon, payload), ...]; returns the indexed count"""
+        started = time.perf_counter()
+        coords = np.array([(lat, lon) for lat, lon, _ in entries], dtype=np.float64).reshape(-1, 2)
+        cos_lat0 = math.cos(math.radians(coords[:, 0].mean())) if len(coords) else 1.0
+        tree = cKDTree(project_km(coords, cos_lat0)) if len(coords) else None
+        state = _IndexState(tree, coords, [payload for _, _, payload in entries], cos_lat0, time.time())
+        with self._lock:
+            self._state = state
+            self._stats['rebuilds'] += 1
+            self._stats['last_build_s'] = round(time.perf_counter() - started, 4)
+        return len(entries)
+
+    def nearest_many(self, coords: list, max_distance_km: float | None = None) -> list:
+        """
+        [(lat, lon), ...] -> [(payload, distance_km) or None, ...]
+        None when no indexed point lies within max_distance_km
+        """
+        state = self._state
+        limit = self.max_distance_km if max_distance_km is None else max_distance_km
+        if not coords or state.tree is None:
+            found = [None] * len(coords)
+        else:
+            points = project_km(np.asarray(coords, dtype=np.float64).reshape(-1, 2), state.cos_lat0)
+            # Unmatched queries come back with distance inf and index n
+            distances, indexes = state.tree.query(points, k=1, distance_upper_bound=limit)
+            found = [
+                (state.payloads[i], round(float(d), 3)) if math.isfinite(d) else None
+                for d, i in zip(distances.tolist(), indexes.tolist())
+            ]
+        hits = sum(1 for f in found if f is not None)
+        with self._lock:
+            self._stats['queries'] += len(coords)
+            self._stats['hits'] += hits
+            self._stats['misses'] += len(coords) - hits
+        return found
+
+    def nearest(self, lat: float, lon: float, max_distance_km: float | None = None):
+        """(payload, distance_km) of the closest point, or None"""
+        return self.nearest_many([(lat, lon)], max_distance_km)[0]
+
+    def points(self) -> tuple:
+        """(coords (n, 2) lat/lon array, payloads) of the current index"""
+        state = self._state
+        return state.coords, state.payloads
+
+    def __len__(self) -> int:
+        return len(self._state.payloads)
+
+    def stats(self) -> dict:
+        state = self._state
+        with self._lock:
+            stats = dict(self._stats)
+        stats['points'] = len(state.payloads)
+        stats['max_distance_km'] = self.max_distance_km
+        stats['built_at'] = datetime.fromtimestamp(state.built_at).isoformat() if state.built_at else None
+        return stats
+
@@ -0,0 +1,226 @@
+"""
+Durable Write Spool for FlowGuard Backend
+Database writes that fail (or are skipped while the circuit is open) are
+appended to a local SQLite queue; a background drainer replays them in
+bulk, oldest first, once the database is reachable again
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+
+class CircuitBreaker:
+    """
+    Closed: calls go through. After failure_threshold consecutive failures
+    it opens for reset_seconds, then lets a single probe through (half-open);
+    the probe's outcome closes or re-opens it
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'short_circuited': 0}
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if not self._probing and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self._probing = True
+                return True
+            self._stats['short_circuited'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+                if self._opened_at is None:
+                    self._stats['opened'] += 1
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half_open' if self._probing else 'open'
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['consecutive_failures'] = self._failures
+        stats['state'] = self.state
+        return stats
+
+
+class Spool:
+    """
+    Append-only SQLite queue of (kind, JSON payload) entries
+    Entries that keep failing move to a dead-letter table after max_attempts
+    """
+
+    def __init__(self, path: str, max_attempts: int = 20):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS spool ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, created_at REAL NOT NULL, last_error TEXT)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS spool_kind ON spool (kind, id)')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS dead_letter ('
+            'id INTEGER PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL, created_at REAL NOT NULL, last_error TEXT)'
+        )
+        self._pending = dict(self._conn.execute('SELECT kind, COUNT(*) FROM spool GROUP BY kind').fetchall())
+        self._stats = {'appended': 0, 'replayed': 0, 'dead_lettered': 0}
+
+    def append(self, kind: str, payload):
+        body = json.dumps(payload, separators=(',', ':'), default=str)
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO spool (kind, payload, created_at) VALUES (?, ?, ?)',
+                (kind, body, time.time())
+            )
+            self._pending[kind] = self._pending.get(kind, 0) + 1
+            self._stats['appended'] += 1
+
+    def pending(self, kind: str | None = None) -> int:
+        """Entries waiting for replay (all kinds, or one), from an in-memory count"""
+        with self._lock:
+            if kind is None:
+                return sum(self._pending.values())
+            return self._pending.get(kind, 0)
+
+    def oldest(self, limit: int) -> list:
+        """[(id, kind, payload), ...] oldest first"""
+        with self._lock:
+            rows = self._conn.execute('SELECT id, kind, payload FROM spool ORDER BY id LIMIT ?', (limit,)).fetchall()
+        return [(entry_id, kind, json.loads(payload)) for entry_id, kind, payload in rows]
+
+    def ack(self, kind: str, ids: list):
+        with self._lock:
+            self._conn.executemany('DELETE FROM spool WHERE id = ?', [(i,) for i in ids])
+            self._pending[kind] = max(0, self._pending.get(kind, 0) - len(ids))
+            self._stats['replayed'] += len(ids)
+
+    def fail(self, kind: str, ids: list, error: str):
+        """Count a failed replay; entries past max_attempts go to dead_letter"""
+        with self._lock:
+            self._conn.execute('BEGIN')
+            self._conn.executemany(
+                'UPDATE spool SET attempts = attempts + 1, last_error = ? WHERE id = ?',
+                [(error[:500], i) for i in ids]
+            )
+            placeholders = ','.join('?' * len(ids))
+            dead = self._conn.execute(
+                f'SELECT id FROM spool WHERE id IN ({placeholders}) AND attempts >= ?', (*ids, self.max_attempts)
+            ).fetchall()
+            if dead:
+                dead_ids = [(row[0],) for row in dead]
+                self._conn.executemany(
+                    'INSERT INTO dead_letter SELECT id, kind, payload, attempts, created_at, last_error FROM spool WHERE id = ?',
+                    dead_ids
+                )
+                self._conn.executemany('DELETE FROM spool WHERE id = ?', dead_ids)
+                self._pending[kind] = max(0, self._pending.get(kind, 0) - len(dead))
+                self._stats['dead_lettered'] += len(dead)
+            self._conn.execute('COMMIT')
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = {kind: count for kind, count in self._pending.items() if count}
+            stats['dead_letter'] = self._conn.execute('SELECT COUNT(*) FROM dead_letter').fetchone()[0]
+        stats['path'] = self.path
+        return stats
+
+
+class SpoolDrainer:
+    """
+    Background replay of a Spool
+    handlers: {kind: (fn, batch_size)}; fn(payloads) writes a list of
+    consecutive same-kind payloads in one go and raises on failure.
+    Replay goes through the circuit breaker and backs off while it is open
+    """
+
+    def __init__(self, spool: Spool, breaker: CircuitBreaker, handlers: dict, interval: float):
+        self.spool = spool
+        self.breaker = breaker
+        self.handlers = handlers
+        self.interval = interval
+        self._wake = threading.Event()
+        self._thread = None
+        self._stats = {'runs': 0, 'batches': 0, 'errors': 0, 'last_error': None}
+
+    def start(self) -> 'SpoolDrainer':
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='spool-drainer', daemon=True)
+            self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self.spool.pending():
+                self.drain()
+
+    def drain(self) -> int:
+        """Replay until the spool is empty or a write fails; returns entries replayed"""
+        self._stats['runs'] += 1
+        replayed = 0
+        while self.spool.pending() and self.breaker.allow():
+            entries = self.spool.oldest(max(batch for _, batch in self.handlers.values()))
+            if not entries:
+                return replayed
+            kind = entries[0][1]
+            fn, batch_size = self.handlers[kind]
+            batch = []
+            for entry in entries[:batch_size]:
+                if entry[1] != kind:
+                    break
+                batch.append(entry)
+
+            ids = [entry_id for entry_id, _, _ in batch]
+            try:
+                fn([payload for _, _, payload in batch])
+            except Exception as e:
+                self.breaker.record_failure()
+                self.spool.fail(kind, ids, f'{type(e).__name__}: {e}')
+                self._stats['errors'] += 1
+                self._stats['last_error'] = f'{type(e).__name__}: {e}'
+                print(f"[Spool] Replay of {len(ids)} {kind} entries failed: {e}")
+                return replayed
+            self.breaker.record_success()
+            self.spool.ack(kind, ids)
+            self._stats['batches'] += 1
+            replayed += len(ids)
+        if replayed:
+            print(f"[Spool] ✓ Replayed {replayed} spooled writes")
+        return replayed
+
+    def stats(self) -> dict:
+        return dict(self._stats)
@@ -0,0 +1,274 @@
+"""
+Server-Sent Events Server for FlowGuard Backend
+Serves /api/stream from one thread: every client socket is non-blocking and
+multiplexed with selectors, so an idle client costs a socket and a queued
+Subscription instead of a blocked Werkzeug worker thread. The Flask route
+redirects EventSource clients here while it runs (see backend_weather_service)
+
+Frames come from the shared Broadcaster (broadcast.py); a publish wakes the
+loop once through a socketpair, and a client's frames are only taken from its
+bounded queue once its previous writes went out, so a slow client still just
+loses its oldest frames
+"""
+
+import json
+import selectors
+import socket
+import threading
+import time
+from urllib.parse import urlsplit, parse_qs
+from broadcast import TooManySubscribers
+
+STREAM_PATH = '/api/stream'
+# Request line and headers larger than this are refused (431)
+MAX_REQUEST_BYTES = 8192
+
+
+class _Client:
+    __slots__ = ('sock', 'inbox', 'outbox', 'subscription', 'closing', 'writing')
+
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.inbox = bytearray()
+        self.outbox = bytearray()
+        self.subscription = None
+        # Close once the outbox is flushed (error responses)
+        self.closing = False
+        # Registered for EVENT_WRITE while the outbox did not fit the socket
+        self.writing = False
+
+
+def _response(status: str, body: dict, headers: dict | None = None) -> bytes:
+    payload = json.dumps(body).encode('utf-8')
+    lines = [f'HTTP/1.1 {status}', 'Content-Type: application/json', f'Content-Length: {len(payload)}',
+             'Access-Control-Allow-Origin: *', 'Connection: close']
+    lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + payload
+
+
+_STREAM_HEADERS = (
+    'HTTP/1.1 200 OK\r\n'
+    'Content-Type: text/event-stream\r\n'
+    'Cache-Control: no-cache\r\n'
+    'X-Accel-Buffering: no\r\n'
+    'Access-Control-Allow-Origin: *\r\n'
+    'Connection: keep-alive\r\n'
+    '\r\n'
+    'retry: 5000\n\n'
+).encode('latin-1')
+
+
+class EventStreamServer:
+    """
+    GET /api/stream?topics=a,b on host:port, same contract as the Flask
+    route: 400 for unknown topics, 503 once the Broadcaster is full, the
+    latest event of each topic replayed on connect, a keep-alive comment
+    every heartbeat_seconds
+    """
+
+    def __init__(self, broadcaster, topics: tuple, host: str = '0.0.0.0', port: int = 0,
+                 heartbeat_seconds: float = 15.0):
+        self.broadcaster = broadcaster
+        self.topics = tuple(topics)
+        self.host = host
+        self.port = port
+        self.heartbeat_seconds = heartbeat_seconds
+        self._selector = selectors.DefaultSelector()
+        self._clients = set()
+        self._server = None
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_pending = threading.Event()
+        self._stopped = threading.Event()
+        self._stats = {'connections': 0, 'rejected': 0}
+
+    def start(self) -> 'EventStreamServer':
+        self._server = socket.create_server((self.host, self.port), backlog=1024)
+        self.port = self._server.getsockname()[1]
+        for sock in (self._server, self._wake_r, self._wake_w):
+            sock.setblocking(False)
+        self._selector.register(self._server, selectors.EVENT_READ, 'accept')
+        self._selector.register(self._wake_r, selectors.EVENT_READ, 'wake')
+        self.broadcaster.on_publish(self._wake)
+        threading.Thread(target=self._run, name='event-stream', daemon=True).start()
+        print(f"[Stream] Serving {STREAM_PATH} on {self.host}:{self.port}")
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wake()
+
+    def _wake(self):
+        # One byte per burst of publishes; the loop drains every client anyway
+        if not self._wake_pending.is_set():
+            self._wake_pending.set()
+            try:
+                self._wake_w.send(b'\0')
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------------
+    # Event loop
+    # ------------------------------------------------------------------
+
+    def _run(self):
+        next_heartbeat = time.monotonic() + self.heartbeat_seconds
+        while not self._stopped.is_set():
+            for key, mask in self._selector.select(max(0.0, next_heartbeat - time.monotonic())):
+                if key.data == 'accept':
+                    self._accept()
+                elif key.data == 'wake':
+                    self._drain_wake()
+                    for client in list(self._clients):
+                        self._fill(client)
+                elif mask & selectors.EVENT_READ:
+                    self._read(key.data)
+                elif mask & selectors.EVENT_WRITE:
+                    self._flush(key.data)
+            if time.monotonic() >= next_heartbeat:
+                next_heartbeat = time.monotonic() + self.heartbeat_seconds
+                for client in list(self._clients):
+                    if client.subscription is not None and not client.outbox:
+                        # Comment line keeps proxies open and detects gone clients
+                        client.outbox += b': keep-alive\n\n'
+                        self._flush(client)
+        for client in list(self._clients):
+            self._close(client)
+        self._selector.close()
+        for sock in (self._server, self._wake_r, self._wake_w):
+            sock.close()
+
+    def _drain_wake(self):
+        self._wake_pending.clear()
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._server.accept()
+            except BlockingIOError:
+                return
+            except OSError as e:
+                print(f"[Stream] Accept failed: {e}")
+                return
+            sock.setblocking(False)
+            client = _Client(sock)
+            self._clients.add(client)
+            self._selector.register(sock, selectors.EVENT_READ, client)
+
+    def _read(self, client: _Client):
+        try:
+            data = client.sock.recv(4096)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._close(client)
+            return
+        if client.subscription is not None or client.closing:
+            # EventSource never sends after the request; ignore anything else
+            return
+        client.inbox += data
+        end = client.inbox.find(b'\r\n\r\n')
+        if end >= 0:
+            self._handle_request(client, bytes(client.inbox[:end]))
+        elif len(client.inbox) > MAX_REQUEST_BYTES:
+            self._reject(client, '431 Request Header Fields Too Large', {'success': False, 'error': 'Request too large'})
+
+    def _handle_request(self, client: _Client, head: bytes):
+        client.inbox.clear()
+        try:
+            method, target, _ = head.split(b'\r\n', 1)[0].decode('latin-1').split(' ', 2)
+        except ValueError:
+            self._reject(client, '400 Bad Request', {'success': False, 'error': 'Malformed request'})
+            return
+        url = urlsplit(target)
+        if url.path != STREAM_PATH:
+            self._reject(client, '404 Not Found', {'success': False, 'error': 'Endpoint not found'})
+            return
+        if method != 'GET':
+            self._reject(client, '405 Method Not Allowed', {'success': False, 'error': 'Use GET'}, {'Allow': 'GET'})
+            return
+
+        topics = None
+        topics_arg = parse_qs(url.query).get('topics', [''])[0]
+        if topics_arg:
+            topics = frozenset(t.strip() for t in topics_arg.split(',') if t.strip())
+            unknown = topics - set(self.topics)
+            if unknown:
+                self._reject(client, '400 Bad Request', {
+                    'success': False,
+                    'error': f"Unknown topics: {', '.join(sorted(unknown))}",
+                    'available_topics': list(self.topics)
+                })
+                return
+        try:
+            client.subscription = self.broadcaster.subscribe(topics)
+        except TooManySubscribers as e:
+            self._reject(client, '503 Service Unavailable', {'success': False, 'error': str(e)}, {'Retry-After': '30'})
+            return
+        self._stats['connections'] += 1
+        client.outbox += _STREAM_HEADERS + b''.join(client.subscription.take())
+        self._flush(client)
+
+    def _reject(self, client: _Client, status: str, body: dict, headers: dict | None = None):
+        self._stats['rejected'] += 1
+        client.closing = True
+        client.outbox += _response(status, body, headers)
+        self._flush(client)
+
+    def _fill(self, client: _Client):
+        """Move queued frames into the outbox once the previous ones went out"""
+        if client.subscription is None or client.outbox:
+            return
+        frames = client.subscription.take()
+        if frames:
+            client.outbox += b''.join(frames)
+            self._flush(client)
+
+    def _flush(self, client: _Client):
+        try:
+            sent = client.sock.send(client.outbox)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._close(client)
+            return
+        del client.outbox[:sent]
+        if client.outbox:
+            if not client.writing:
+                client.writing = True
+                self._selector.modify(client.sock, selectors.EVENT_READ | selectors.EVENT_WRITE, client)
+        elif client.closing:
+            self._close(client)
+        elif client.writing:
+            client.writing = False
+            self._selector.modify(client.sock, selectors.EVENT_READ, client)
+            # Frames published while this client was blocked
+            self._fill(client)
+
+    def _close(self, client: _Client):
+        if client not in self._clients:
+            return
+        self._clients.discard(client)
+        if client.subscription is not None:
+            self.broadcaster.unsubscribe(client.subscription)
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+
+    def stats(self) -> dict:
+        return {
+            'host': self.host,
+            'port': self.port,
+            'open_sockets': len(self._clients),
+            'connections': self._stats['connections'],
+            'rejected': self._stats['rejected'],
+            'threads': 1
+        }
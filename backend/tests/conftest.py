@@ -0,0 +1,23 @@
+"""
+Shared pytest setup for the backend
+Backend modules import config, which exits without OPENWEATHER_API_KEY and
+connects to Supabase when it is configured, and services opens the write
+spool at SPOOL_PATH; tests run offline against a throwaway spool, so all of
+it is settled here before any backend module is imported
+
+Run (from backend/):
+    python -m pytest -q tests
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+os.environ.setdefault('OPENWEATHER_API_KEY', 'test')
+os.environ['SUPABASE_URL'] = ''
+os.environ['SERVICE_ROLE_PRIVATE'] = ''
+os.environ['SPOOL_PATH'] = os.path.join(tempfile.mkdtemp(prefix='flowguard-tests-'), 'spool.sqlite3')
@@ -0,0 +1,117 @@
+"""CompiledForest against sklearn: table and node-walk engines, save/load, single rows"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+import compiled_forest
+from compiled_forest import CompiledForest, verify
+
+FEATURES = ['rainfall_1h', 'tide_level', 'humidity']
+
+
+@pytest.fixture(scope='module')
+def model():
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(0, 80, 3000), rng.uniform(50, 200, 3000), rng.uniform(40, 100, 3000)])
+    y = (X[:, 0] * 1.5 + X[:, 1] + rng.normal(0, 15, len(X))) > 190
+    frame = pd.DataFrame(X, columns=FEATURES)
+    return RandomForestClassifier(n_estimators=25, max_depth=6, random_state=0).fit(frame, y)
+
+
+@pytest.fixture(scope='module')
+def inputs():
+    rng = np.random.default_rng(1)
+    X = np.column_stack([rng.uniform(-5, 100, 4000), rng.uniform(0, 250, 4000), rng.uniform(0, 110, 4000)])
+    # Rows sitting exactly on split thresholds are where float32/float64 handling matters
+    return X
+
+
+def _expected(model, X):
+    return model.predict_proba(pd.DataFrame(X, columns=FEATURES))
+
+
+def _on_thresholds(model):
+    tree = model.estimators_[0].tree_
+    split = tree.children_left != -1
+    rows = np.full((int(split.sum()), 3), 60.0)
+    rows[np.arange(len(rows)), tree.feature[split]] = tree.threshold[split]
+    return rows
+
+
+def test_tables_match_sklearn(model, inputs):
+    forest = CompiledForest.from_sklearn(model)
+    assert forest.table_cells > 0
+    X = np.vstack([inputs, _on_thresholds(model)])
+    np.testing.assert_allclose(forest.predict_proba(X), _expected(model, X), rtol=0, atol=1e-12)
+    assert (forest.predict(X) == model.predict(pd.DataFrame(X, columns=FEATURES))).all()
+
+
+def test_node_walk_matches_sklearn(model, inputs, monkeypatch):
+    monkeypatch.setattr(compiled_forest, 'TABLE_MAX_CELLS', 0)
+    forest = CompiledForest.from_sklearn(model)
+    assert forest.table_cells == 0
+    X = np.vstack([inputs, _on_thresholds(model)])
+    np.testing.assert_allclose(forest.predict_proba(X), _expected(model, X), rtol=0, atol=1e-12)
+
+
+def test_chunked_batches_match_one_chunk(model, inputs, monkeypatch):
+    forest = CompiledForest.from_sklearn(model)
+    whole = forest.predict_proba(inputs)
+    monkeypatch.setattr(compiled_forest, 'CHUNK_ROWS', 7)
+    np.testing.assert_array_equal(forest.predict_proba(inputs), whole)
+
+
+@pytest.mark.parametrize('tables', [True, False])
+def test_predict_proba_one_matches_batch(model, inputs, monkeypatch, tables):
+    if not tables:
+        monkeypatch.setattr(compiled_forest, 'TABLE_MAX_CELLS', 0)
+    forest = CompiledForest.from_sklearn(model)
+    batch = forest.predict_proba(inputs[:300])
+    out = np.empty(2)
+    for row, expected in zip(inputs[:300], batch):
+        np.testing.assert_array_equal(forest.predict_proba_one(row), expected)
+        assert forest.predict_proba_one(row.astype(np.float32), out=out) is out
+        np.testing.assert_array_equal(out, expected)
+
+
+def test_save_and_load_memory_maps_every_array(model, inputs, tmp_path):
+    path = tmp_path / 'model.npz'
+    CompiledForest.from_sklearn(model, 'abc123').save(path)
+    loaded = CompiledForest.load(path)
+    assert loaded.mapped and loaded.source_version == 'abc123'
+    maps, table = loaded._tables
+    for array in (loaded.feature, loaded.threshold, loaded.value, table, maps[0], loaded.cuts[0]):
+        assert isinstance(array.base, np.memmap) and not array.flags.writeable
+        assert array.ctypes.data % array.dtype.alignment == 0
+    np.testing.assert_array_equal(loaded.predict_proba(inputs), CompiledForest.from_sklearn(model).predict_proba(inputs))
+    assert list(loaded.feature_names_in_) == FEATURES
+    assert verify(model, loaded, samples=2000) <= compiled_forest.TOLERANCE
+
+
+def test_load_format_1_builds_tables(model, inputs, tmp_path):
+    forest = CompiledForest.from_sklearn(model)
+    path = tmp_path / 'format1.npz'
+    np.savez(path, format_version=np.array(1), feature=forest.feature, threshold=forest.threshold,
+             left=forest.left, right=forest.right, value=forest.value, roots=forest.roots,
+             max_depth=np.array(forest.max_depth), classes=forest.classes_,
+             feature_names=forest.feature_names_in_, source_version=np.array(''))
+    loaded = CompiledForest.load(path)
+    assert loaded.table_cells == forest.table_cells
+    np.testing.assert_array_equal(loaded.predict_proba(inputs), forest.predict_proba(inputs))
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / 'other.npz'
+    np.savez(path, values=np.arange(3))
+    with pytest.raises(ValueError, match='not a compiled forest'):
+        CompiledForest.load(path)
+    np.savez_compressed(path, format_version=np.array(2))
+    with pytest.raises(ValueError, match='compressed'):
+        CompiledForest.load(path)
+
+
+def test_from_sklearn_rejects_unfitted_model():
+    with pytest.raises(ValueError):
+        CompiledForest.from_sklearn(RandomForestClassifier())
@@ -0,0 +1,162 @@
+"""Gateway ingest: NDJSON/FGR1 parsers, the ingest route's error paths, WriteBehindBuffer"""
+
+import io
+import json
+import struct
+
+import pytest
+
+import backend_weather_service as service
+from ingest import (
+    BINARY_MAGIC, IngestError, WriteBehindBuffer, encode_binary, parse_binary, parse_ndjson
+)
+
+INGEST_URL = '/api/water-level/ingest'
+
+
+# ============================================
+# PARSERS
+# ============================================
+
+def test_parse_ndjson_reads_numeric_and_iso_timestamps():
+    body = b'\n'.join([
+        b'{"location": "A", "water_level_cm": 12.5, "timestamp": 1700000000}',
+        b'',
+        b'{"location": "B", "water_level_cm": 3, "timestamp": "2023-11-14T22:13:20Z"}',
+    ])
+    assert parse_ndjson(body) == [('A', 12.5, 1700000000.0), ('B', 3.0, 1700000000.0)]
+
+
+def test_parse_ndjson_defaults_timestamp_to_now():
+    [(_, _, ts)] = parse_ndjson(b'{"location": "A", "water_level_cm": 1}')
+    assert ts > 1.7e9
+
+
+@pytest.mark.parametrize('line, message', [
+    (b'{"location": "A"}', 'line 2: expected'),
+    (b'not json', 'line 2: expected'),
+    (b'{"location": "", "water_level_cm": 1}', 'line 2: invalid location'),
+    (b'{"location": "A", "water_level_cm": "NaN"}', 'line 2: invalid location'),
+    (b'{"location": "A", "water_level_cm": 1, "timestamp": "yesterday"}', "line 2: Invalid timestamp"),
+])
+def test_parse_ndjson_reports_bad_line(line, message):
+    body = b'{"location": "A", "water_level_cm": 1}\n' + line
+    with pytest.raises(IngestError, match=message):
+        parse_ndjson(body)
+
+
+def test_binary_round_trip():
+    readings = [('Sensor_A', 12.25, 1700000000.5), ('Sensor_B', 0.0, 1700000001.0), ('Sensor_A', 13.5, 1700000002.0)]
+    assert parse_binary(encode_binary(readings)) == readings
+
+
+def test_parse_binary_empty_record_section():
+    assert parse_binary(BINARY_MAGIC + struct.pack('<H', 1) + b'\x01A') == []
+
+
+@pytest.mark.parametrize('body, message', [
+    (b'FGR2\x00\x00', "must start with b'FGR1'"),
+    (BINARY_MAGIC, "must start with b'FGR1'"),
+    (BINARY_MAGIC + struct.pack('<H', 2) + b'\x01A', 'Truncated sensor name table'),
+    (BINARY_MAGIC + struct.pack('<H', 1) + b'\x02\xff\xfe', 'not valid UTF-8'),
+    (BINARY_MAGIC + struct.pack('<H', 1) + b'\x01A' + b'\x00' * 13, 'multiple of 14 bytes'),
+    (BINARY_MAGIC + struct.pack('<H', 1) + b'\x01A' + struct.pack('<Hdf', 1, 1.0, 1.0), 'out of range'),
+    (BINARY_MAGIC + struct.pack('<H', 1) + b'\x01A' + struct.pack('<Hdf', 0, 1.0, float('inf')), 'Non-finite'),
+])
+def test_parse_binary_rejects(body, message):
+    with pytest.raises(IngestError, match=message):
+        parse_binary(body)
+
+
+# ============================================
+# ROUTE
+# ============================================
+
+@pytest.fixture
+def client(monkeypatch):
+    flushed = []
+    buffer = WriteBehindBuffer(flushed.extend, max_rows=10, flush_rows=10, flush_interval=60)
+    monkeypatch.setattr(service, 'ingest_buffer', buffer)
+    yield service.app.test_client()
+    buffer.close()
+
+
+def _post(client, body, content_type, **kwargs):
+    return client.post(INGEST_URL, data=body, content_type=content_type, **kwargs)
+
+
+def test_ingest_accepts_ndjson_and_binary(client):
+    response = _post(client, b'{"location": "A", "water_level_cm": 1}\n', 'application/x-ndjson')
+    assert response.status_code == 202 and response.get_json()['accepted'] == 1
+    response = _post(client, encode_binary([('A', 2.0, 1700000000.0)] * 2), 'application/octet-stream')
+    assert response.status_code == 202 and response.get_json()['pending'] == 3
+
+
+def test_ingest_rejects_malformed_body_with_400(client):
+    response = _post(client, b'{"location": "A"}', 'application/x-ndjson')
+    assert response.status_code == 400
+    assert 'line 1' in response.get_json()['error']
+    assert _post(client, BINARY_MAGIC + b'\x01', 'application/octet-stream').status_code == 400
+
+
+def test_ingest_rejects_unknown_content_type_with_415(client):
+    response = _post(client, json.dumps({'location': 'A', 'water_level_cm': 1}), 'application/json')
+    assert response.status_code == 415
+
+
+def test_ingest_rejects_oversized_body_with_413(client, monkeypatch):
+    monkeypatch.setattr(service, 'INGEST_MAX_BODY_BYTES', 64)
+    monkeypatch.setitem(service.app.config, 'MAX_CONTENT_LENGTH', 64)
+    body = b'{"location": "A", "water_level_cm": 1}\n' * 4
+    assert _post(client, body, 'application/x-ndjson').status_code == 413
+
+
+def test_ingest_rejects_oversized_chunked_body_with_413(client, monkeypatch):
+    # No Content-Length: Werkzeug cuts the stream at MAX_CONTENT_LENGTH instead of
+    # refusing it; the dev server marks chunked input as terminated, like here
+    monkeypatch.setattr(service, 'INGEST_MAX_BODY_BYTES', 64)
+    monkeypatch.setitem(service.app.config, 'MAX_CONTENT_LENGTH', 64)
+    body = b'{"location": "A", "water_level_cm": 1}\n' * 4
+    response = client.post(INGEST_URL, input_stream=io.BytesIO(body), content_type='application/x-ndjson',
+                           headers={'Transfer-Encoding': 'chunked'},
+                           environ_overrides={'wsgi.input_terminated': True})
+    assert response.status_code == 413
+
+
+def test_ingest_returns_503_when_buffer_is_full(client):
+    body = encode_binary([('A', 1.0, 1700000000.0)] * 11)
+    response = _post(client, body, 'application/octet-stream')
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+
+# ============================================
+# WRITE-BEHIND BUFFER
+# ============================================
+
+def test_buffer_flushes_in_order_and_on_close():
+    flushed, seen = [], []
+    buffer = WriteBehindBuffer(flushed.extend, max_rows=100, flush_rows=1000, flush_interval=60, on_batch=seen.extend)
+    assert buffer.offer([1, 2]) and buffer.offer([3])
+    buffer.close()
+    assert flushed == [1, 2, 3] and seen == [1, 2, 3]
+    assert buffer.stats()['flushed'] == 3 and buffer.pending() == 0
+
+
+def test_buffer_refuses_batches_that_do_not_fit():
+    buffer = WriteBehindBuffer(lambda batch: None, max_rows=3, flush_rows=100, flush_interval=60)
+    assert buffer.offer([1, 2])
+    assert not buffer.offer([3, 4])
+    assert buffer.pending() == 2 and buffer.stats()['rejected'] == 2
+    buffer.close()
+
+
+def test_buffer_counts_a_failed_flush_as_dropped():
+    def fail(batch):
+        raise RuntimeError('database down')
+
+    buffer = WriteBehindBuffer(fail, max_rows=10, flush_rows=100, flush_interval=60)
+    buffer.offer([1, 2, 3])
+    buffer.close()
+    stats = buffer.stats()
+    assert stats['flush_errors'] == 1 and stats['dropped'] == 3 and stats['pending'] == 0
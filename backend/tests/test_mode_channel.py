@@ -0,0 +1,122 @@
+"""ModeCache: TTL re-reads while live and disconnected, failed loads, push channel"""
+
+import threading
+
+import pytest
+
+import mode_channel
+from mode_channel import ModeCache, ModePublisher, ModeSubscriber
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(mode_channel.time, 'monotonic', clock)
+    return clock
+
+
+class Loader:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.results.pop(0) if len(self.results) > 1 else self.results[0]
+
+
+def test_get_loads_once_within_ttl(clock):
+    loader = Loader('WARNING')
+    cache = ModeCache(loader, fallback_ttl_seconds=30)
+    assert cache.get() == 'WARNING'
+    clock.now += 29
+    assert cache.get() == 'WARNING'
+    assert loader.calls == 1
+
+
+def test_disconnected_cache_rereads_after_fallback_ttl(clock):
+    loader = Loader('SAFE', 'CRITICAL')
+    cache = ModeCache(loader, fallback_ttl_seconds=30)
+    assert cache.get() == 'SAFE'
+    clock.now += 31
+    assert cache.get() == 'CRITICAL'
+    assert loader.calls == 2
+
+
+def test_live_cache_rereads_after_live_ttl(clock):
+    # Writes made outside the API still show up while pushes keep the cache live
+    loader = Loader('SAFE', 'WARNING')
+    cache = ModeCache(loader, live=True, fallback_ttl_seconds=30, live_ttl_seconds=60)
+    assert cache.get() == 'SAFE'
+    clock.now += 45
+    assert cache.get() == 'SAFE'
+    assert loader.calls == 1
+    clock.now += 20
+    assert cache.get() == 'WARNING'
+    assert loader.calls == 2
+
+
+def test_reread_change_notifies_listeners(clock):
+    cache = ModeCache(Loader('SAFE', 'CRITICAL'), live=True, live_ttl_seconds=60)
+    seen = []
+    cache.subscribe(lambda mode, version: seen.append((mode, version)))
+    cache.get()
+    clock.now += 61
+    cache.get()
+    assert seen == [('SAFE', 1), ('CRITICAL', 2)]
+
+
+def test_failed_first_load_is_not_cached(clock):
+    loader = Loader(None, 'WARNING')
+    cache = ModeCache(loader, live=True)
+    assert cache.get() == mode_channel.DEFAULT_MODE
+    assert cache.get() == 'WARNING'
+    assert loader.calls == 2
+    assert cache.stats()['load_errors'] == 1
+
+
+def test_failed_reload_keeps_last_mode_and_retries(clock):
+    loader = Loader('CRITICAL', None, 'WARNING')
+    cache = ModeCache(loader, fallback_ttl_seconds=30)
+    cache.get()
+    clock.now += 31
+    assert cache.get() == 'CRITICAL'
+    assert cache.get() == 'WARNING'
+    assert loader.calls == 3
+
+
+def test_set_and_invalidate(clock):
+    loader = Loader('SAFE')
+    cache = ModeCache(loader, live=True)
+    cache.set('CRITICAL')
+    assert cache.get() == 'CRITICAL'
+    assert loader.calls == 0
+    cache.invalidate()
+    assert cache.get() == 'SAFE'
+    assert loader.calls == 1
+
+
+def test_subscriber_follows_publisher():
+    source = ModeCache(lambda: 'SAFE', live=True)
+    publisher = ModePublisher(source, port=0).start()
+    mirror = ModeCache(lambda: 'SAFE')
+    changed = threading.Event()
+    mirror.subscribe(lambda mode, version: mode == 'CRITICAL' and changed.set())
+    subscriber = ModeSubscriber(mirror, port=publisher.port, retry_seconds=0.1).start()
+    try:
+        assert subscriber.connected.wait(5)
+        assert mirror.live
+        source.set('CRITICAL')
+        assert changed.wait(5)
+        assert mirror.get() == 'CRITICAL'
+    finally:
+        subscriber.stop()
+        publisher.stop()
@@ -0,0 +1,79 @@
+"""keyset_pages against the PostgREST stand-in: ties on the first key, cursors, filters, row caps"""
+
+import pytest
+from supabase import create_client
+
+import pagination
+from pagination import keyset_pages
+from postgrest_standin import PostgrestStandin, STANDIN_KEY
+
+KEYS = ('created_at', 'id')
+
+
+@pytest.fixture
+def standin(monkeypatch):
+    standin = PostgrestStandin().start()
+    monkeypatch.setattr(pagination, 'supabase_client', create_client(standin.url, STANDIN_KEY))
+    yield standin
+    standin.stop()
+
+
+def _seed(standin, groups):
+    """groups: (created_at, count) bulk uploads, each sharing one timestamp"""
+    standin.db.insert('water_level_readings', [
+        {'created_at': created_at, 'station': 'A' if n % 2 else 'B', 'level': float(n)}
+        for created_at, count in groups for n in range(count)
+    ])
+    standin.db.reset_counters()
+    return sorted((r['created_at'], r['id']) for r in standin.db.rows('water_level_readings'))
+
+
+def _read(**kwargs):
+    pages = list(keyset_pages('water_level_readings', '*', KEYS, **kwargs))
+    return pages, [(r['created_at'], r['id']) for page in pages for r in page]
+
+
+def test_reads_every_row_once_across_ties(standin):
+    expected = _seed(standin, [('2026-10-18T00:00:00', 3), ('2026-10-18T01:00:00', 25), ('2026-10-18T02:00:00', 4)])
+    pages, keys = _read(page_size=10)
+    assert keys == expected
+    assert all(len(page) <= 20 for page in pages)
+
+
+def test_tie_group_larger_than_page_doubles_the_limit(standin):
+    expected = _seed(standin, [('2026-10-18T00:00:00', 1), ('2026-10-18T01:00:00', 40)])
+    pages, keys = _read(page_size=8)
+    assert keys == expected
+    # The doubled limit reaches past the tie and drops back to page_size after
+    assert max(len(page) for page in pages) > 8
+
+
+def test_resumes_after_cursor_inside_a_tie(standin):
+    expected = _seed(standin, [('2026-10-18T00:00:00', 12), ('2026-10-18T01:00:00', 6)])
+    _, keys = _read(cursor=expected[4], page_size=5)
+    assert keys == expected[5:]
+    _, keys = _read(cursor=expected[-1], page_size=5)
+    assert keys == []
+
+
+def test_where_filter_applies_to_every_page(standin):
+    _seed(standin, [('2026-10-18T00:00:00', 15), ('2026-10-18T01:00:00', 15)])
+    expected = sorted((r['created_at'], r['id']) for r in standin.db.rows('water_level_readings') if r['station'] == 'A')
+    _, keys = _read(page_size=4, where=lambda query: query.eq('station', 'A'))
+    assert keys == expected
+
+
+def test_server_row_cap_below_page_size(standin, monkeypatch):
+    expected = _seed(standin, [(f'2026-10-18T{hour:02d}:00:00', 3) for hour in range(10)])
+    select = standin.db.select
+    monkeypatch.setattr(standin.db, 'select', lambda table, filters, order=None, limit=None:
+                        select(table, filters, order, min(limit or 7, 7)))
+    pages, keys = _read(page_size=1000)
+    assert keys == expected
+    assert all(len(page) <= 7 for page in pages)
+
+
+def test_empty_table_is_one_request(standin):
+    pages, _ = _read(page_size=10)
+    assert pages == []
+    assert standin.db.total_requests() == 1
@@ -0,0 +1,154 @@
+"""Durable write spool: persistence, batched replay, dead-lettering, circuit breaker"""
+
+import pytest
+
+import services
+import spool as spool_module
+from spool import CircuitBreaker, Spool, SpoolDrainer
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(spool_module.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return Spool(str(tmp_path / 'spool.sqlite3'), max_attempts=3)
+
+
+class Recorder:
+    """Write handler that records its batches and fails while `failing`"""
+
+    def __init__(self, failing: bool = False):
+        self.batches = []
+        self.failing = failing
+
+    def __call__(self, payloads):
+        if self.failing:
+            raise ConnectionError('database down')
+        self.batches.append(payloads)
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / 'spool.sqlite3')
+    first = Spool(path)
+    first.append('water_level', [{'location': 'A', 'water_level_cm': 1.5}])
+    first.append('weather', {'location_name': 'District 1'})
+    reopened = Spool(path)
+    assert reopened.pending() == 2 and reopened.pending('weather') == 1
+    assert [(kind, payload) for _, kind, payload in reopened.oldest(10)] == [
+        ('water_level', [{'location': 'A', 'water_level_cm': 1.5}]),
+        ('weather', {'location_name': 'District 1'}),
+    ]
+
+
+def test_drain_replays_in_order_batching_consecutive_kinds(spool):
+    a, b = Recorder(), Recorder()
+    for kind, n in [('a', 1), ('a', 2), ('a', 3), ('b', 4), ('a', 5)]:
+        spool.append(kind, n)
+    drainer = SpoolDrainer(spool, CircuitBreaker(3, 60), {'a': (a, 2), 'b': (b, 5)}, interval=60)
+    assert drainer.drain() == 5
+    assert a.batches == [[1, 2], [3], [5]] and b.batches == [[4]]
+    assert spool.pending() == 0 and spool.stats()['replayed'] == 5
+
+
+def test_failed_replays_move_to_dead_letter_after_max_attempts(spool):
+    handler = Recorder(failing=True)
+    spool.append('a', 1)
+    drainer = SpoolDrainer(spool, CircuitBreaker(100, 60), {'a': (handler, 10)}, interval=60)
+    for attempt in range(3):
+        assert spool.pending('a') == 1
+        assert drainer.drain() == 0
+    stats = spool.stats()
+    assert spool.pending() == 0
+    assert stats['dead_letter'] == 1 and stats['dead_lettered'] == 1
+    assert drainer.stats()['errors'] == 3
+    assert 'ConnectionError' in drainer.stats()['last_error']
+
+
+def test_failed_replay_keeps_later_entries_queued(spool):
+    handler = Recorder(failing=True)
+    spool.append('a', 1)
+    spool.append('a', 2)
+    drainer = SpoolDrainer(spool, CircuitBreaker(100, 60), {'a': (handler, 1)}, interval=60)
+    drainer.drain()
+    handler.failing = False
+    assert drainer.drain() == 2
+    assert handler.batches == [[1], [2]]
+
+
+def test_breaker_opens_probes_and_closes(clock):
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == 'closed'
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    clock.now += 30
+    # One probe while half-open; the probe failing re-opens it
+    assert breaker.allow() and not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open' and not breaker.allow()
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+    assert breaker.stats()['opened'] == 1
+
+
+def test_drain_stops_while_breaker_is_open(spool, clock):
+    handler = Recorder(failing=True)
+    spool.append('a', 1)
+    drainer = SpoolDrainer(spool, CircuitBreaker(1, 30), {'a': (handler, 10)}, interval=60)
+    drainer.drain()
+    handler.failing = False
+    assert drainer.drain() == 0 and handler.batches == []
+    clock.now += 30
+    assert drainer.drain() == 1 and handler.batches == [[1]]
+
+
+class IdleDrainer:
+    def start(self):
+        return self
+
+    def wake(self):
+        pass
+
+
+@pytest.fixture
+def write_path(monkeypatch, spool):
+    monkeypatch.setattr(services, 'write_spool', spool)
+    monkeypatch.setattr(services, 'db_breaker', CircuitBreaker(2, 60))
+    monkeypatch.setattr(services, 'spool_drainer', IdleDrainer())
+    return spool
+
+
+def test_write_or_spool_spools_failures_and_keeps_order(write_path):
+    written, failing = [], Recorder(failing=True)
+    assert services.write_or_spool('a', 1, written.append)
+    assert not services.write_or_spool('a', 2, failing)
+    # Queued entries of the same kind go first, so 3 waits behind 2
+    assert not services.write_or_spool('a', 3, written.append)
+    assert services.write_or_spool('b', 4, written.append)
+    assert written == [1, 4]
+    assert [payload for _, _, payload in write_path.oldest(10)] == [2, 3]
+
+
+def test_write_or_spool_skips_the_database_while_breaker_is_open(write_path):
+    failing = Recorder(failing=True)
+    services.write_or_spool('a', 1, failing)
+    services.write_or_spool('b', 2, failing)
+    assert services.db_breaker.state == 'open'
+    written = []
+    assert not services.write_or_spool('c', 3, written.append)
+    assert written == [] and write_path.pending() == 3
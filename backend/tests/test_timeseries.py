@@ -0,0 +1,123 @@
+"""In-memory water level history: rollups, late readings, window coverage"""
+
+import random
+
+import pytest
+
+import timeseries
+from timeseries import HistoryUnavailable, TimeSeriesStore, parse_duration
+
+# 2026-01-01T00:00:00Z, on an hour boundary
+T0 = 1767225600.0
+
+
+@pytest.fixture
+def small_rings(monkeypatch):
+    """Rings small enough to overflow in a test: 50 raw samples, 10 minutes, 5 hours"""
+    monkeypatch.setattr(timeseries, 'WATER_LEVEL_RAW_CAPACITY', 50)
+    monkeypatch.setattr(timeseries, 'WATER_LEVEL_MINUTE_BUCKETS', 10)
+    monkeypatch.setattr(timeseries, 'WATER_LEVEL_HOUR_BUCKETS', 5)
+
+
+def _levels(points):
+    return [(p['min'], p['max'], p['avg'], p['count']) for p in points]
+
+
+def test_parse_duration():
+    assert [parse_duration(v) for v in ('30s', '5m', '1h', '7d')] == [30, 300, 3600, 604800]
+    for bad in ('0m', '5x', '', '1.5h'):
+        with pytest.raises(ValueError):
+            parse_duration(bad)
+
+
+def test_minute_rollup_min_max_avg():
+    store = TimeSeriesStore()
+    for i, level in enumerate([10, 20, 30, 40, 50, 60]):
+        store.record('A', level, T0 + i * 20)
+    points = store.history('A', 600, 60, now=T0 + 120)
+    assert _levels(points) == [(10, 30, 20, 3), (40, 60, 50, 3)]
+    assert points[0]['timestamp'] == '2026-01-01T00:00:00+00:00'
+
+
+def test_hour_resolution_reads_hour_rollups():
+    store = TimeSeriesStore()
+    for i in range(6):
+        store.record('A', i, T0 + i * 1800)
+    points = store.history('A', 4 * 3600, 3600, now=T0 + 3 * 3600)
+    assert _levels(points) == [(0, 1, 0.5, 2), (2, 3, 2.5, 2), (4, 5, 4.5, 2)]
+
+
+def test_raw_and_sub_minute_resolution():
+    store = TimeSeriesStore()
+    for i in range(6):
+        store.record('A', i, T0 + i * 10)
+    assert [p['avg'] for p in store.history('A', 60, None, now=T0 + 55)] == [0, 1, 2, 3, 4, 5]
+    assert _levels(store.history('A', 60, 30, now=T0 + 55)) == [(0, 2, 1, 3), (3, 5, 4, 3)]
+
+
+@pytest.mark.parametrize('resolution', [None, 20, 60, 120, 3600])
+def test_late_readings_match_in_order_readings(resolution):
+    readings = [('A', float(i % 7), T0 + i * 10) for i in range(300)]
+    in_order, shuffled = TimeSeriesStore(), TimeSeriesStore()
+    in_order.record_readings(readings)
+    late = list(readings)
+    random.Random(0).shuffle(late)
+    shuffled.record_readings(late)
+    now = T0 + 3000
+    assert shuffled.history('A', 3000, resolution, now=now) == in_order.history('A', 3000, resolution, now=now)
+
+
+def test_late_reading_updates_its_minute_bucket():
+    store = TimeSeriesStore()
+    store.record('A', 10, T0 + 5)
+    store.record('A', 20, T0 + 65)
+    store.record('A', 40, T0 + 30)
+    assert _levels(store.history('A', 120, 60, now=T0 + 120)) == [(10, 40, 25, 2), (20, 20, 20, 1)]
+
+
+def test_window_past_minute_rollups_falls_back_to_raw(small_rings):
+    store = TimeSeriesStore()
+    # 20 minutes at one reading a minute: the 10 minute buckets lost the first half
+    for i in range(20):
+        store.record('A', i, T0 + i * 60)
+    points = store.history('A', 20 * 60, 120, now=T0 + 20 * 60)
+    assert len(points) == 10 and points[0]['min'] == 0
+
+
+def test_window_nothing_covers_is_rejected(small_rings):
+    store = TimeSeriesStore()
+    # 90 minutes at one reading a minute: 10 minute buckets and 50 raw samples both overflow
+    for i in range(90):
+        store.record('A', i, T0 + i * 60)
+    now = T0 + 90 * 60
+    assert store.history('A', 8 * 60, 120, now=now)
+    with pytest.raises(HistoryUnavailable):
+        store.history('A', 90 * 60, 30 * 60, now=now)
+    with pytest.raises(HistoryUnavailable):
+        store.history('A', 90 * 60, None, now=now)
+    # Hour rollups still hold all of it
+    assert sum(p['count'] for p in store.history('A', 2 * 3600, 3600, now=now)) == 90
+
+
+def test_late_reading_older_than_the_rollups_is_rejected(small_rings):
+    store = TimeSeriesStore()
+    for i in range(5):
+        store.record('A', i, T0 + 3600 + i * 60)
+    # 40 minutes before the newest bucket: past the 10 minute ring
+    store.record('A', 99, T0 + 3600 - 40 * 60)
+    now = T0 + 3600 + 5 * 60
+    assert _levels(store.history('A', 5 * 60, 60, now=now))[0] == (0, 0, 0, 1)
+    assert store.history('A', 60 * 60, 60, now=now)[0]['max'] == 99  # from raw
+    for i in range(50):
+        store.record('A', 0, T0 + 3600 + 5 * 60 + i)
+    with pytest.raises(HistoryUnavailable):
+        store.history('A', 60 * 60, 60, now=now + 60)
+
+
+def test_unknown_sensor_and_sensor_cap():
+    store = TimeSeriesStore(max_sensors=2)
+    assert store.history('missing', 60) is None
+    store.record_many([('A', 1), ('B', 2), ('C', 3)], ts=T0)
+    assert store.sensors() == ['A', 'B']
+    assert store.stats()['rejected_readings'] == 1
+    assert store.latest() == {'A': (T0, 1.0), 'B': (T0, 2.0)}
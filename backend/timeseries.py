@@ -0,0 +1,292 @@
+"""
+In-Memory Water Level Time Series for FlowGuard Backend
+Per-sensor fixed-memory ring buffers of recent readings plus rolling
+per-minute and per-hour min/max/avg rollups, filled by the upload job so
+history windows can be served without a database query
+"""
+
+import re
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+from config import (
+    WATER_LEVEL_RAW_CAPACITY,
+    WATER_LEVEL_MINUTE_BUCKETS,
+    WATER_LEVEL_HOUR_BUCKETS,
+    WATER_LEVEL_MAX_SENSORS
+)
+
+class HistoryUnavailable(ValueError):
+    """The retained samples and rollups do not cover the requested window"""
+
+
+_DURATION_RE = re.compile(r'^(\d+)\s*([smhd])$')
+_DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value: str) -> int:
+    """Parse '30s', '5m', '1h', '7d' into seconds (raises ValueError)"""
+    match = _DURATION_RE.match(str(value).strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Invalid duration '{value}' (use e.g. 30s, 5m, 1h, 7d)")
+    return int(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+class _RawRing:
+    """Last `capacity` (timestamp, value) samples in preallocated arrays"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.values = array('d', bytes(8 * capacity))
+        self.head = -1
+        self.size = 0
+        # Newest timestamp overwritten so far; samples since it are all kept
+        self.lost_until = float('-inf')
+
+    def add(self, ts: float, value: float):
+        self.head = (self.head + 1) % self.capacity
+        if self.size == self.capacity:
+            self.lost_until = max(self.lost_until, self.times[self.head])
+        self.times[self.head] = ts
+        self.values[self.head] = value
+        self.size = min(self.size + 1, self.capacity)
+
+    def covers(self, start: float) -> bool:
+        return self.lost_until < start
+
+    def since(self, start: float):
+        """Yield (ts, value) with ts >= start, in arrival order"""
+        first = (self.head - self.size + 1) % self.capacity
+        for i in range(self.size):
+            idx = (first + i) % self.capacity
+            if self.times[idx] >= start:
+                yield self.times[idx], self.values[idx]
+
+
+class _RollupRing:
+    """
+    Rolling min/max/sum/count buckets of `bucket_seconds`, one slot per
+    bucket; advancing past the last slot overwrites the oldest bucket
+    """
+
+    def __init__(self, bucket_seconds: int, capacity: int):
+        self.bucket_seconds = bucket_seconds
+        self.capacity = capacity
+        self.starts = array('d', bytes(8 * capacity))
+        self.mins = array('d', bytes(8 * capacity))
+        self.maxs = array('d', bytes(8 * capacity))
+        self.sums = array('d', bytes(8 * capacity))
+        self.counts = array('l', bytes(array('l').itemsize * capacity))
+        self.head = -1
+        # End of the newest bucket overwritten or refused so far
+        self.lost_until = float('-inf')
+
+    def _evict(self, idx: int):
+        if self.counts[idx]:
+            self.lost_until = max(self.lost_until, self.starts[idx] + self.bucket_seconds)
+
+    def _reset(self, idx: int, start: float, value: float):
+        self._evict(idx)
+        self.starts[idx] = start
+        self.mins[idx] = self.maxs[idx] = self.sums[idx] = value
+        self.counts[idx] = 1
+
+    def add(self, ts: float, value: float):
+        start = ts - ts % self.bucket_seconds
+        if self.head < 0:
+            self.head = 0
+            self._reset(0, start, value)
+            return
+
+        current = self.starts[self.head]
+        if start > current:
+            # Skip the slots of empty buckets so slot spacing stays uniform
+            steps = min(int((start - current) // self.bucket_seconds), self.capacity)
+            for step in range(1, steps):
+                idx = (self.head + step) % self.capacity
+                self._evict(idx)
+                self.starts[idx] = current + step * self.bucket_seconds
+                self.counts[idx] = 0
+            self.head = (self.head + steps) % self.capacity
+            self._reset(self.head, start, value)
+            return
+
+        # Late reading: update its bucket if it is still in the ring
+        offset = int((current - start) // self.bucket_seconds)
+        if offset >= self.capacity:
+            self.lost_until = max(self.lost_until, start + self.bucket_seconds)
+            return
+        idx = (self.head - offset) % self.capacity
+        if self.starts[idx] != start or self.counts[idx] == 0:
+            self._reset(idx, start, value)
+            return
+        self.mins[idx] = min(self.mins[idx], value)
+        self.maxs[idx] = max(self.maxs[idx], value)
+        self.sums[idx] += value
+        self.counts[idx] += 1
+
+    def covers(self, start: float) -> bool:
+        return self.lost_until <= start
+
+    def since(self, start: float):
+        """Yield (bucket_start, min, max, sum, count) oldest first"""
+        if self.head < 0:
+            return
+        for i in range(self.capacity):
+            idx = (self.head + 1 + i) % self.capacity
+            if self.counts[idx] and self.starts[idx] + self.bucket_seconds > start:
+                yield self.starts[idx], self.mins[idx], self.maxs[idx], self.sums[idx], self.counts[idx]
+
+
+class SensorSeries:
+    def __init__(self):
+        self.raw = _RawRing(WATER_LEVEL_RAW_CAPACITY)
+        self.minutes = _RollupRing(60, WATER_LEVEL_MINUTE_BUCKETS)
+        self.hours = _RollupRing(3600, WATER_LEVEL_HOUR_BUCKETS)
+        self.latest = None
+
+    def add(self, ts: float, value: float):
+        self.raw.add(ts, value)
+        self.minutes.add(ts, value)
+        self.hours.add(ts, value)
+        if self.latest is None or ts >= self.latest[0]:
+            self.latest = (ts, value)
+
+
+class TimeSeriesStore:
+    """
+    Thread-safe collection of SensorSeries keyed by sensor location
+    At most max_sensors series are kept (each preallocates its rings);
+    readings for further unknown sensors are counted and dropped
+    """
+
+    def __init__(self, max_sensors: int = WATER_LEVEL_MAX_SENSORS):
+        self.max_sensors = max_sensors
+        self._series = {}
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def _get(self, sensor: str) -> SensorSeries | None:
+        series = self._series.get(sensor)
+        if series is None:
+            if len(self._series) >= self.max_sensors:
+                self._rejected += 1
+                return None
+            series = self._series[sensor] = SensorSeries()
+        return series
+
+    def record(self, sensor: str, value: float, ts: float | None = None):
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            series = self._get(sensor)
+            if series is not None:
+                series.add(ts, float(value))
+
+    def record_many(self, readings: list, ts: float | None = None):
+        """readings: iterable of (sensor, value) sharing one timestamp"""
+        ts = time.time() if ts is None else ts
+        with self._lock:
+            for sensor, value in readings:
+                series = self._get(sensor)
+                if series is not None:
+                    series.add(ts, float(value))
+
+    def record_readings(self, readings: list):
+        """readings: iterable of (sensor, value, ts) triples"""
+        with self._lock:
+            for sensor, value, ts in readings:
+                series = self._get(sensor)
+                if series is not None:
+                    series.add(ts, float(value))
+
+    def sensors(self) -> list:
+        with self._lock:
+            return sorted(self._series)
+
+    def history(self, sensor: str, window_seconds: int, resolution_seconds: int | None = None, now: float | None = None):
+        """
+        Readings of one sensor over the last window_seconds
+        resolution_seconds=None returns raw samples; otherwise points are
+        min/max/avg over buckets of that size, built from the coarsest
+        source that divides it and still holds the whole window (hour
+        rollups, minute rollups, then raw samples)
+        Returns None for an unknown sensor; raises HistoryUnavailable when
+        no such source covers the window
+        """
+        now = time.time() if now is None else now
+        start = now - window_seconds
+
+        with self._lock:
+            series = self._series.get(sensor)
+            if series is None:
+                return None
+            if resolution_seconds is None:
+                if not series.raw.covers(start):
+                    raise HistoryUnavailable(
+                        f"Raw samples of {sensor} do not reach back {window_seconds}s; use a resolution")
+                samples = sorted(series.raw.since(start), key=lambda item: item[0])
+                return [_point(ts, value, value, value, 1) for ts, value in samples]
+            if resolution_seconds % 3600 == 0 and series.hours.covers(start):
+                source = list(series.hours.since(start))
+            elif resolution_seconds % 60 == 0 and series.minutes.covers(start):
+                source = list(series.minutes.since(start))
+            elif series.raw.covers(start):
+                source = [(ts, v, v, v, 1) for ts, v in series.raw.since(start)]
+            else:
+                raise HistoryUnavailable(
+                    f"History of {sensor} at {resolution_seconds}s resolution does not reach back "
+                    f"{window_seconds}s; use a resolution that is a whole number of hours")
+
+        # Late gateway readings sit in arrival order in the raw ring
+        source.sort(key=lambda item: item[0])
+        points = []
+        bucket = None
+        for ts, lo, hi, total, count in source:
+            bucket_start = ts - ts % resolution_seconds
+            if bucket is None or bucket[0] != bucket_start:
+                if bucket is not None:
+                    points.append(_point(*bucket))
+                bucket = [bucket_start, lo, hi, total, count]
+            else:
+                bucket[1] = min(bucket[1], lo)
+                bucket[2] = max(bucket[2], hi)
+                bucket[3] += total
+                bucket[4] += count
+        if bucket is not None:
+            points.append(_point(*bucket))
+        return points
+
+    def latest(self) -> dict:
+        with self._lock:
+            return {name: s.latest for name, s in self._series.items() if s.latest}
+
+    def stats(self) -> dict:
+        with self._lock:
+            sensors = len(self._series)
+            samples = sum(s.raw.size for s in self._series.values())
+            rejected = self._rejected
+        return {
+            'sensors': sensors,
+            'max_sensors': self.max_sensors,
+            'rejected_readings': rejected,
+            'raw_samples': samples,
+            'raw_capacity_per_sensor': WATER_LEVEL_RAW_CAPACITY,
+            'minute_buckets_per_sensor': WATER_LEVEL_MINUTE_BUCKETS,
+            'hour_buckets_per_sensor': WATER_LEVEL_HOUR_BUCKETS
+        }
+
+
+def _point(ts, lo, hi, total, count) -> dict:
+    return {
+        'timestamp': datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(),
+        'min': round(lo, 2),
+        'max': round(hi, 2),
+        'avg': round(total / count, 2),
+        'count': count
+    }
+
+
+# Shared by the upload job (writer) and the history endpoints (readers)
+water_level_history = TimeSeriesStore()
@@ -0,0 +1,406 @@
+"""
+Flood Model Training Pipeline for FlowGuard Backend
+Streams history out of Supabase in keyset-paginated pages and trains the
+rainfall_1h / tide_level / humidity random forest chunk by chunk:
+- water_level_readings: each sensor's peak water level per hour; a
+  sensor-hour is labelled flood when its peak level --horizon hours later
+  reaches --flood-level (in the sensors' own cm scale)
+- hourly_weather: rain and humidity of the sensor's nearest location, read
+  by (location_id, dt) for the hours the current readings page needs
+Every chunk of samples adds --trees-per-chunk trees to the forest
+(warm_start), so memory is bounded by the page and chunk sizes, not by the
+length of the history. Each chunk is scored before it is learned
+(prequential accuracy).
+
+The result is a versioned artifact in --out-dir: the pickle, its compiled
+.npz (see compiled_forest.py) and a .json with metrics and the read cursor
+that --resume continues from. --publish copies it over MODEL_PATH with
+os.replace; the running backend hot-reloads it.
+
+Run (from backend/):
+    python train_model.py --flood-level 150
+    python train_model.py --resume models/flood_model_<version>.pkl --publish
+"""
+
+import argparse
+import functools
+import json
+import math
+import os
+import shutil
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+from compiled_forest import CompiledForest, file_version, verify
+from config import supabase_client, MODEL_PATH, WATER_LEVEL_SENSORS
+from pagination import keyset_pages
+from spatial_index import project_km
+
+# Column order MUST MATCH ai_training.FEATURE_COLUMNS
+FEATURE_COLUMNS = ['rainfall_1h', 'tide_level', 'humidity']
+DEFAULT_OUT_DIR = Path(__file__).parent / 'models'
+
+
+@functools.lru_cache(maxsize=4096)
+def _hour_of(prefix: str) -> int:
+    return int(datetime.strptime(prefix, '%Y-%m-%dT%H').replace(tzinfo=timezone.utc).timestamp()) // 3600
+
+
+def hour_of(created_at: str) -> int:
+    """Hours since the epoch of a water_level_readings created_at (UTC, ISO 8601)"""
+    return _hour_of(f"{created_at[:10]}T{created_at[11:13]}")
+
+
+# ============================================
+# FEATURES AND LABELS
+# ============================================
+
+def load_locations() -> dict:
+    """{location_id: (lat, lon)} of every weather location"""
+    rows = supabase_client.table('location').select('location_id, latitude, longitude').execute().data or []
+    return {
+        row['location_id']: (float(row['latitude']), float(row['longitude']))
+        for row in rows
+        if row.get('latitude') is not None and row.get('longitude') is not None
+    }
+
+
+def assign_locations(locations: dict, sensors: list) -> dict:
+    """{sensor location name: nearest weather location_id} for sensors with lat/lng"""
+    placed = [sensor for sensor in sensors if 'lat' in sensor and 'lng' in sensor]
+    if not locations or not placed:
+        return {}
+
+    location_ids = list(locations)
+    coords = np.array([locations[location_id] for location_id in location_ids])
+    cos_lat0 = math.cos(math.radians(coords[:, 0].mean()))
+    points = project_km(coords, cos_lat0)
+    assigned = {}
+    for sensor in placed:
+        distances = np.hypot(*(points - project_km(np.array([[sensor['lat'], sensor['lng']]]), cos_lat0)).T)
+        nearest = int(distances.argmin())
+        assigned[sensor['location']] = location_ids[nearest]
+        print(f"[Train] {sensor['location']} -> weather location {location_ids[nearest]} ({distances[nearest]:.2f} km)")
+    return assigned
+
+
+class WeatherWindow:
+    """
+    (rain_1h, humidity) per (location_id, hour) for a sliding range of
+    hours: load() reads hourly_weather rows of the sensors' locations for
+    hours not read yet, evict() drops hours that are no longer needed, so
+    memory is bounded by locations x hours per readings page
+    hourly_weather is unique on (location_id, dt) (migrations/003): one row
+    per location-hour, the latest forecast of that hour
+    """
+
+    def __init__(self, location_ids, page_size: int):
+        self.location_ids = sorted(set(location_ids))
+        self.page_size = page_size
+        self.hours = {}
+        self.loaded_until = None
+        self.rows = 0
+
+    def load(self, start_hour: int, end_hour: int):
+        """Make hours [start_hour, end_hour) available"""
+        if self.loaded_until is not None:
+            start_hour = max(start_hour, self.loaded_until)
+        if start_hour >= end_hour:
+            return
+        where = lambda query: query.in_('location_id', self.location_ids).lt('dt', end_hour * 3600)
+        cursor = (start_hour * 3600, -1)
+        for page in keyset_pages('hourly_weather', 'location_id, dt, rain_1h, humidity',
+                                 ('dt', 'location_id'), cursor, self.page_size, where):
+            self.rows += len(page)
+            for row in page:
+                if row.get('humidity') is None:
+                    continue
+                self.hours[(row['location_id'], row['dt'] // 3600)] = (
+                    float(row.get('rain_1h') or 0.0), float(row['humidity'])
+                )
+        self.loaded_until = end_hour
+
+    def evict(self, before_hour: int):
+        for key in [key for key in self.hours if key[1] < before_hour]:
+            del self.hours[key]
+
+    def get(self, location_id: int, hour: int):
+        return self.hours.get((location_id, hour))
+
+
+def stream_samples(sensor_locations: dict, flood_level: float, horizon: int, page_size: int,
+                   cursor: tuple | None = None, first_hour: int | None = None, stats: dict | None = None):
+    """
+    Yield (features (k, 3), labels (k,), last sample hour, cursor) per page
+    of water_level_readings, in time order
+    Rows arrive in created_at order, so every hour before the newest row's
+    is complete; only samples whose label hour is complete are emitted and
+    the state is a few hours of peak levels per sensor plus the weather of
+    those hours. The newest hour may still be filling up, so it is left for
+    the next (resumed) run
+    """
+    stats = stats if stats is not None else {}
+    for key in ('readings', 'unplaced_readings', 'samples', 'no_weather', 'no_label', 'weather_rows'):
+        stats.setdefault(key, 0)
+    peaks = {sensor: {} for sensor in sensor_locations}
+    weather = WeatherWindow(sensor_locations.values(), page_size)
+
+    def emit(until_hour):
+        due = [h for levels in peaks.values() for h in levels if h + horizon < until_hour]
+        if due:
+            weather.load(min(due), until_hour - horizon)
+        features, labels = [], []
+        for sensor, levels in peaks.items():
+            location_id = sensor_locations[sensor]
+            for hour in sorted(h for h in levels if h + horizon < until_hour):
+                if first_hour is not None and hour < first_hour:
+                    continue
+                if hour + horizon not in levels:
+                    stats['no_label'] += 1
+                    continue
+                hour_weather = weather.get(location_id, hour)
+                if hour_weather is None:
+                    stats['no_weather'] += 1
+                    continue
+                rain_1h, humidity = hour_weather
+                features.append((rain_1h, levels[hour], humidity))
+                labels.append(levels[hour + horizon] >= flood_level)
+            # Emitted hours are no longer needed as labels either
+            for hour in [h for h in levels if h + horizon < until_hour]:
+                del levels[hour]
+        weather.evict(until_hour - horizon)
+        stats['samples'] += len(labels)
+        stats['weather_rows'] = weather.rows
+        return np.array(features, dtype=np.float64).reshape(-1, 3), np.array(labels, dtype=bool)
+
+    for page in keyset_pages('water_level_readings', 'id, location, water_level_cm, created_at',
+                             ('created_at', 'id'), cursor, page_size):
+        stats['readings'] += len(page)
+        for row in page:
+            levels = peaks.get(row['location'])
+            if levels is None:
+                stats['unplaced_readings'] += 1
+                continue
+            hour = hour_of(row['created_at'])
+            level = float(row['water_level_cm'])
+            if level > levels.get(hour, -math.inf):
+                levels[hour] = level
+        newest_hour = hour_of(page[-1]['created_at'])
+        yield (*emit(newest_hour), newest_hour - horizon - 1, (page[-1]['created_at'], page[-1]['id']))
+
+
+def chunked(samples, chunk_rows: int):
+    """
+    Regroup stream_samples pages into chunks of at least chunk_rows
+    A chunk with one class only cannot add trees to the forest, so it keeps
+    growing until the other class shows up, up to 4 x chunk_rows; the last
+    chunk may be smaller
+    """
+    features, labels, rows = [], [], 0
+    last_hour = cursor = None
+    for page_features, page_labels, last_hour, cursor in samples:
+        features.append(page_features)
+        labels.append(page_labels)
+        rows += len(page_labels)
+        if rows >= chunk_rows:
+            y = np.concatenate(labels)
+            if (y.any() and not y.all()) or rows >= 4 * chunk_rows:
+                yield np.concatenate(features), y, last_hour, cursor
+                features, labels, rows = [], [], 0
+    if rows:
+        yield np.concatenate(features), np.concatenate(labels), last_hour, cursor
+
+
+# ============================================
+# TRAINING
+# ============================================
+
+def new_model(args) -> RandomForestClassifier:
+    return RandomForestClassifier(
+        n_estimators=0,
+        max_depth=args.max_depth,
+        min_samples_leaf=args.min_samples_leaf,
+        n_jobs=args.jobs,
+        random_state=args.seed,
+        warm_start=True
+    )
+
+
+def train(model, chunks, trees_per_chunk: int, max_trees: int) -> dict:
+    """
+    Add trees_per_chunk trees per chunk; beyond max_trees the oldest trees
+    are dropped, so the forest follows the most recent history
+    """
+    report = {'chunks': 0, 'rows': 0, 'positives': 0, 'skipped_chunks': 0, 'scored_rows': 0, 'correct': 0,
+              'last_sample_hour': None, 'cursor': None}
+    for X, y, last_hour, cursor in chunks:
+        started = time.perf_counter()
+        report['last_sample_hour'] = last_hour
+        report['cursor'] = cursor
+        frame = pd.DataFrame(X, columns=FEATURE_COLUMNS)
+        if y.all() or not y.any():
+            report['skipped_chunks'] += 1
+            print(f"[Train] ✗ Skipping chunk of {len(y)} rows: only one class")
+            continue
+
+        accuracy = None
+        if getattr(model, 'estimators_', None):
+            correct = int((model.predict(frame) == y).sum())
+            report['scored_rows'] += len(y)
+            report['correct'] += correct
+            accuracy = correct / len(y)
+
+        model.n_estimators = len(getattr(model, 'estimators_', [])) + trees_per_chunk
+        model.fit(frame, y)
+        if len(model.estimators_) > max_trees:
+            model.estimators_ = model.estimators_[-max_trees:]
+            model.n_estimators = max_trees
+
+        report['chunks'] += 1
+        report['rows'] += len(y)
+        report['positives'] += int(y.sum())
+        print(f"[Train] ✓ Chunk {report['chunks']}: {len(y)} rows ({y.mean():.1%} flood), "
+              f"{len(model.estimators_)} trees, prequential accuracy "
+              f"{'-' if accuracy is None else f'{accuracy:.3f}'} in {time.perf_counter() - started:.2f}s")
+    return report
+
+
+# ============================================
+# ARTIFACTS
+# ============================================
+
+def _atomic_copy(source: Path, target: Path):
+    tmp = target.with_name(f".{target.name}.tmp")
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, target)
+
+
+def write_artifact(model, out_dir: Path, metadata: dict) -> Path:
+    """
+    Write flood_model_<UTC time>_<content hash>.pkl, its compiled .npz and
+    .json metadata; each file is written under a temporary name and moved
+    into place, so readers never see a partial artifact
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tmp = out_dir / '.flood_model.pkl.tmp'
+    joblib.dump(model, tmp)
+    version = file_version(tmp)
+    path = out_dir / f"flood_model_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}_{version}.pkl"
+    os.replace(tmp, path)
+
+    try:
+        forest = CompiledForest.from_sklearn(model, version)
+        verify(model, forest)
+        forest.save(path.with_suffix('.npz'))
+    except ValueError as e:
+        print(f"[Train] ✗ Not compiled ({e}); the backend will compile it on load")
+
+    metadata = {**metadata, 'version': version, 'model': path.name}
+    tmp = out_dir / '.flood_model.json.tmp'
+    tmp.write_text(json.dumps(metadata, indent=2, default=str))
+    os.replace(tmp, path.with_suffix('.json'))
+    return path
+
+
+def publish(path: Path, model_path: Path):
+    """
+    Copy an artifact over MODEL_PATH; the .npz goes first so the reloading
+    backend finds it already built for the new model
+    """
+    if path.with_suffix('.npz').exists():
+        _atomic_copy(path.with_suffix('.npz'), model_path.with_suffix('.npz'))
+    _atomic_copy(path, model_path)
+    print(f"[Train] ✓ Published {path.name} -> {model_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming flood model training')
+    parser.add_argument('--flood-level', type=float, default=None,
+                        help='water level (cm, on the scale of the trained sensors) labelled as flood; '
+                             'required unless --resume, which reuses the artifact\'s')
+    parser.add_argument('--horizon', type=int, default=1, help='hours ahead the label looks')
+    parser.add_argument('--page-size', type=int, default=1000, help='rows per database page')
+    parser.add_argument('--chunk-rows', type=int, default=50000, help='samples per training chunk')
+    parser.add_argument('--trees-per-chunk', type=int, default=10)
+    parser.add_argument('--max-trees', type=int, default=200)
+    parser.add_argument('--max-depth', type=int, default=12)
+    parser.add_argument('--min-samples-leaf', type=int, default=5)
+    parser.add_argument('--jobs', type=int, default=None, help='tree building processes (sklearn n_jobs)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--resume', help='artifact .pkl to extend with the history after its cursor')
+    parser.add_argument('--out-dir', default=str(DEFAULT_OUT_DIR))
+    parser.add_argument('--publish', action='store_true', help=f'replace MODEL_PATH ({MODEL_PATH})')
+    args = parser.parse_args()
+
+    if not supabase_client:
+        print("[Train] ✗ Supabase not configured")
+        return 1
+
+    started = time.perf_counter()
+    cursor = first_hour = None
+    if args.resume:
+        model = joblib.load(args.resume)
+        model.warm_start = True
+        metadata_path = Path(args.resume).with_suffix('.json')
+        previous = json.loads(metadata_path.read_text()) if metadata_path.exists() else {}
+        if previous.get('last_sample_hour') is not None:
+            # Re-read the hours the previous run still needed for labels,
+            # but only emit samples it has not learned yet
+            first_hour = previous['last_sample_hour'] + 1
+            resume_at = datetime.fromtimestamp(first_hour * 3600, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+            cursor = (resume_at, 0)
+        if args.flood_level is None:
+            args.flood_level = previous.get('params', {}).get('flood_level')
+        print(f"[Train] Resuming {Path(args.resume).name} ({len(model.estimators_)} trees) "
+              f"from {cursor[0] if cursor else 'the beginning'}")
+    else:
+        model = new_model(args)
+    if args.flood_level is None:
+        print("[Train] ✗ --flood-level is required (the sensors' cm scale varies by installation)")
+        return 1
+
+    sensor_locations = assign_locations(load_locations(), WATER_LEVEL_SENSORS)
+    if not sensor_locations:
+        print("[Train] ✗ No weather locations or no sensors with lat/lng")
+        return 1
+
+    stream_stats = {}
+    samples = stream_samples(sensor_locations, args.flood_level, args.horizon, args.page_size,
+                             cursor, first_hour, stream_stats)
+    report = train(model, chunked(samples, args.chunk_rows), args.trees_per_chunk, args.max_trees)
+    if not report['chunks']:
+        print(f"[Train] ✗ Nothing to learn from ({stream_stats})")
+        return 1
+
+    path = write_artifact(model, Path(args.out_dir), {
+        'trained_at': datetime.now(timezone.utc).isoformat(),
+        'resumed_from': Path(args.resume).name if args.resume else None,
+        'features': FEATURE_COLUMNS,
+        'params': {k: v for k, v in vars(args).items() if k not in ('resume', 'out_dir', 'publish')},
+        'trees': len(model.estimators_),
+        'rows': report['rows'],
+        'positives': report['positives'],
+        'chunks': report['chunks'],
+        'prequential_accuracy': round(report['correct'] / report['scored_rows'], 4) if report['scored_rows'] else None,
+        'stream': stream_stats,
+        'last_sample_hour': report['last_sample_hour'],
+        'cursor': report['cursor'],
+        'duration_s': round(time.perf_counter() - started, 2)
+    })
+    print(f"[Train] ✓ Wrote {path} ({len(model.estimators_)} trees, {report['rows']} rows, "
+          f"{time.perf_counter() - started:.1f}s)")
+
+    if args.publish:
+        publish(path, Path(MODEL_PATH))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
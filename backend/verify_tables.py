@@ -13,7 +13,8 @@ tables = [
     ('hourly_weather', 'Hourly weather records'),
     ('daily_weather', 'Daily weather records'),
     ('weather_alerts', 'Weather alerts'),
-    ('system_logs', 'Water level sensor logs')
+    ('system_logs', 'Water level sensor logs'),
+    ('water_level_readings', 'Water level history')
 ]
 
 for table_name, description in tables:
@@ -1,40 +1,102 @@
+"""
+Water level simulator
+
+    python water_level.py
+        single sensor (Sensor_Tram_A), one reading every 2 seconds
+
+    python water_level.py --sensors 5000 --tick-seconds 1 --ticks 60 --standin
+        fleet mode for load testing: advances every virtual sensor in one
+        vectorized step per tick and uploads the tick as one chunked batch
+
+Each reading is appended to water_level_readings and upserted into the
+sensor's fixed system_logs row (see sensor_rows.py), like the API's own
+upload job, so system_logs stays one row per sensor
+"""
+
+import argparse
+import io
 import os
 import time
 import random
-import uuid
+from contextlib import redirect_stdout
+from datetime import datetime
 from dotenv import load_dotenv
-from supabase import create_client, Client
-
-# Try to use shared config first, fallback to local env vars
-try:
-    from config import supabase_client
-    if supabase_client:
-        supabase = supabase_client
-        print("[Water Level] Using shared Supabase client from config")
-    else:
-        raise ImportError
-except (ImportError, AttributeError):
-    # Fallback to local configuration
-    load_dotenv()
-    url = os.getenv("SUPABASE_URL")
-    key = os.getenv("SUPABASE_KEY") or os.getenv("SERVICE_ROLE_PRIVATE")
-    if url and key:
-        supabase: Client = create_client(url, key)
-        print("[Water Level] Using local Supabase client")
-    else:
-        raise ValueError("Supabase configuration not found. Please set SUPABASE_URL and SUPABASE_KEY in .env")
+from supabase import create_client
+from postgrest.types import ReturnMethod
+import numpy as np
+from mode_channel import ModeCache, ModeSubscriber, DEFAULT_HOST, DEFAULT_PORT
+from sensor_rows import split_readings, WATER_LEVEL_READINGS_CONFLICT_KEY
 
-def get_current_mode():
+# (min, max) water level in cm for each simulation mode
+MODE_BANDS = {
+    'SAFE': (0, 0),
+    'WARNING': (1, 40),
+    'CRITICAL': (41, 100),
+}
+
+DEFAULT_CHUNK_SIZE = 500
+
+supabase = None
+
+
+def connect_supabase():
+    """Create the Supabase client on first use"""
+    global supabase
+    if supabase is not None:
+        return supabase
+
+    # Try to use shared config first, fallback to local env vars
     try:
-        response = supabase.table("sensor_config").select("mode").eq("id", 1).execute()
-        if response.data:
-            return str(response.data[0]['mode']).upper()
-    except Exception:
-        pass
+        from config import supabase_client
+        if supabase_client:
+            supabase = supabase_client
+            print("[Water Level] Using shared Supabase client from config")
+        else:
+            raise ImportError
+    except (ImportError, AttributeError):
+        # Fallback to local configuration
+        load_dotenv()
+        url = os.getenv("SUPABASE_URL")
+        key = os.getenv("SUPABASE_KEY") or os.getenv("SERVICE_ROLE_PRIVATE")
+        if url and key:
+            supabase = create_client(url, key)
+            print("[Water Level] Using local Supabase client")
+        else:
+            raise ValueError("Supabase configuration not found. Please set SUPABASE_URL and SUPABASE_KEY in .env")
+    return supabase
+
+def read_mode_from_db():
+    # None on errors: ModeCache keeps the last mode and retries on the next get()
+    try:
+        response = connect_supabase().table("sensor_config").select("mode").eq("id", 1).execute()
+    except Exception as e:
+        print(f" [Error] Could not read mode: {e}")
+        return None
+    if response.data:
+        return str(response.data[0]['mode']).upper()
     return 'SAFE'
 
+# Kept current by the API's mode channel (see start_mode_subscriber), with a
+# re-read every 60 seconds; without it the mode is re-read at most every 30
+mode_cache = ModeCache(read_mode_from_db)
+
+def get_current_mode():
+    return mode_cache.get()
+
+def start_mode_subscriber():
+    host = os.getenv("MODE_CHANNEL_HOST", DEFAULT_HOST)
+    port = int(os.getenv("MODE_CHANNEL_PORT", str(DEFAULT_PORT)))
+    subscriber = ModeSubscriber(mode_cache, host, port).start()
+    # Give the first push a moment so the opening tick skips the DB read
+    subscriber.connected.wait(1.0)
+    return subscriber
+
+def utc_timestamp() -> str:
+    # Millisecond precision: (location, created_at) keys the history table
+    return datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+
 def simulate_and_upload():
-    current_level = 0.0 
+    current_level = 0.0
     sensor_location = "Sensor_Tram_A"
 
     print("--- Bắt đầu mô phỏng theo 3 chế độ (SAFE, WARNING, CRITICAL) ---")
@@ -42,18 +104,9 @@ def simulate_and_upload():
     try:
         while True:
             mode = get_current_mode()
-            
-            min_val, max_val = 0, 0
-            
-            if mode == 'SAFE':
-                min_val, max_val = 0, 0
-                
-            elif mode == 'WARNING':
-                min_val, max_val = 1, 40
-                
-            elif mode == 'CRITICAL':
-                min_val, max_val = 41, 100
-            
+
+            min_val, max_val = MODE_BANDS.get(mode, MODE_BANDS['SAFE'])
+
             if mode == 'SAFE':
                 current_level = 0.0
             else:
@@ -63,22 +116,20 @@ def simulate_and_upload():
                     change = random.uniform(1.0, 3.0)
                     direction = random.choice([-1, 1])
                     new_level = current_level + (change * direction)
-                    
+
                     if new_level > max_val: new_level = max_val
                     elif new_level < min_val: new_level = min_val
-                    
+
                     current_level = round(new_level, 2)
 
-            log_id = str(uuid.uuid4())
             data_payload = {
-                "id": log_id,
                 "water_level_cm": current_level,
                 "location": sensor_location,
-                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "created_at": utc_timestamp(),
             }
 
             try:
-                supabase.table("system_logs").insert(data_payload).execute()
+                upload_batch([data_payload])
                 print(f" [Mode: {mode}] Level: {current_level} cm")
             except Exception as e:
                 print(f" [Error] {e}")
@@ -88,5 +139,148 @@ def simulate_and_upload():
     except KeyboardInterrupt:
         print("Stop.")
 
+# ============================================
+# FLEET SIMULATION (LOAD TESTING)
+# ============================================
+
+class SensorFleet:
+    """
+    N virtual sensors held in one numpy array; step() applies the same
+    per-sensor rules as simulate_and_upload to all of them at once
+    """
+
+    def __init__(self, count: int, prefix: str = 'Sensor_Sim', seed: int | None = None):
+        self.locations = [f'{prefix}_{i:05d}' for i in range(count)]
+        self.levels = np.zeros(count)
+        self.rng = np.random.default_rng(seed)
+
+    def step(self, mode: str) -> np.ndarray:
+        min_val, max_val = MODE_BANDS.get(mode, MODE_BANDS['SAFE'])
+        if mode == 'SAFE':
+            self.levels.fill(0.0)
+            return self.levels
+
+        count = len(self.levels)
+        out_of_band = (self.levels < min_val) | (self.levels > max_val)
+        change = self.rng.uniform(1.0, 3.0, count) * self.rng.choice((-1.0, 1.0), count)
+        stepped = np.round(np.clip(self.levels + change, min_val, max_val), 2)
+        self.levels = np.where(out_of_band, self.rng.uniform(min_val, max_val, count), stepped)
+        return self.levels
+
+    def rows(self) -> list:
+        created_at = utc_timestamp()
+        return [{
+            "water_level_cm": level,
+            "location": location,
+            "created_at": created_at,
+        } for location, level in zip(self.locations, self.levels.tolist())]
+
+
+def upload_batch(rows: list, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Append a tick's rows to water_level_readings and upsert each sensor's
+    system_logs row, one request per chunk
+    """
+    client = connect_supabase()
+    readings, latest = split_readings(rows)
+    chunk_size = max(1, chunk_size)
+    for start in range(0, len(readings), chunk_size):
+        client.table("water_level_readings").upsert(
+            readings[start:start + chunk_size], on_conflict=WATER_LEVEL_READINGS_CONFLICT_KEY,
+            ignore_duplicates=True, returning=ReturnMethod.minimal
+        ).execute()
+    for start in range(0, len(latest), chunk_size):
+        client.table("system_logs").upsert(
+            latest[start:start + chunk_size], on_conflict="id", returning=ReturnMethod.minimal
+        ).execute()
+
+
+def simulate_fleet(sensor_count: int, tick_seconds: float = 1.0, ticks: int | None = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, mode: str | None = None, seed: int | None = None) -> list:
+    """
+    Advance and upload sensor_count sensors every tick_seconds
+    mode=None reads sensor_config once per tick; ticks=None runs until Ctrl+C
+    Returns per-tick reports
+    """
+    fleet = SensorFleet(sensor_count, seed=seed)
+    reports = []
+    print(f"[Water Level] Fleet: {sensor_count} sensors, tick {tick_seconds}s, chunk {chunk_size}")
+
+    tick = 0
+    try:
+        while ticks is None or tick < ticks:
+            tick += 1
+            started = time.perf_counter()
+            tick_mode = mode or get_current_mode()
+
+            fleet.step(tick_mode)
+            stepped = time.perf_counter()
+            rows = fleet.rows()
+
+            error = None
+            try:
+                upload_batch(rows, chunk_size)
+            except Exception as e:
+                error = str(e)
+            elapsed = time.perf_counter() - started
+
+            report = {
+                'tick': tick,
+                'mode': tick_mode,
+                'sensors': sensor_count,
+                'step_ms': round((stepped - started) * 1000, 2),
+                'tick_ms': round(elapsed * 1000, 2),
+                'overrun': elapsed > tick_seconds,
+                'error': error
+            }
+            reports.append(report)
+            status = f"ERROR {error}" if error else ('OVERRUN' if report['overrun'] else 'OK')
+            print(f" [Tick {tick}] [Mode: {tick_mode}] {sensor_count} sensors, step {report['step_ms']} ms, "
+                  f"tick {report['tick_ms']} ms, mean {float(fleet.levels.mean()):.2f} cm {status}")
+
+            time.sleep(max(0.0, tick_seconds - elapsed))
+    except KeyboardInterrupt:
+        print("Stop.")
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Water level simulator')
+    parser.add_argument('--sensors', type=int, default=None, help='run the vectorized fleet simulator with N sensors')
+    parser.add_argument('--tick-seconds', type=float, default=1.0)
+    parser.add_argument('--ticks', type=int, default=None, help='stop after N ticks (default: run until Ctrl+C)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='rows per write request')
+    parser.add_argument('--mode', choices=sorted(MODE_BANDS), default=None, help='fixed mode instead of sensor_config')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--standin', action='store_true', help='upload to an in-process PostgREST stand-in')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='stand-in round trip latency')
+    args = parser.parse_args()
+
+    standin = None
+    if args.standin:
+        from postgrest_standin import PostgrestStandin, STANDIN_KEY
+        standin = PostgrestStandin(latency_ms=args.latency_ms).start()
+        os.environ['SUPABASE_URL'] = standin.url
+        os.environ['SERVICE_ROLE_PRIVATE'] = STANDIN_KEY
+        os.environ.setdefault('OPENWEATHER_API_KEY', 'simulator')
+        with redirect_stdout(io.StringIO()):
+            connect_supabase()
+        print(f"[Water Level] Using PostgREST stand-in at {standin.url}")
+
+    if args.mode is None:
+        start_mode_subscriber()
+
+    try:
+        if args.sensors is None:
+            simulate_and_upload()
+        else:
+            simulate_fleet(args.sensors, args.tick_seconds, args.ticks, args.chunk_size, args.mode, args.seed)
+    finally:
+        if standin:
+            print(f"[Water Level] Stand-in system_logs rows: {len(standin.db.rows('system_logs'))}, "
+                  f"water_level_readings rows: {len(standin.db.rows('water_level_readings'))}, "
+                  f"requests: {standin.db.total_requests()}")
+            standin.stop()
+
 if __name__ == "__main__":
-    simulate_and_upload()
\ No newline at end of file
+    main()
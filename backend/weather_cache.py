@@ -0,0 +1,130 @@
+"""
+In-Process Caching Primitives for FlowGuard Backend
+TTL + LRU cache used under fetch_from_openweather, keyed by quantized coordinates,
+and single-flight deduplication of concurrent upstream calls for the same key
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+def quantize_coords(lat: float, lng: float, decimals: int = 2) -> tuple:
+    """
+    Round coordinates to a cache key
+    2 decimals ~ 1.1 km, well inside One Call's spatial resolution
+    """
+    return (round(float(lat), decimals), round(float(lng), decimals))
+
+
+class TTLCache:
+    """
+    Thread-safe cache with a per-entry time-to-live and LRU eviction
+    once max_entries is reached
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'sets': 0}
+
+    def get(self, key):
+        """Return (value, age_seconds) for a fresh entry, or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            value, stored_at = entry
+            age = now - stored_at
+            if age > self.ttl_seconds:
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value, age
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            self._stats['sets'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+        stats['max_entries'] = self.max_entries
+        stats['ttl_seconds'] = self.ttl_seconds
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    In-flight request deduplication
+    Concurrent do() calls with the same key run fn once; the other callers
+    wait for it and share its result (or its exception)
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'coalesced': 0}
+
+    def do(self, key, fn):
+        """Return (result, shared) where shared is True for coalesced callers"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['calls'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
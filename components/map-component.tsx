@@ -11,6 +11,7 @@ interface MapComponentProps {
   selectedSensor: Sensor | null;
   onSelectSensor: (sensor: Sensor) => void;
   getStatusColor: (status: string) => string;
+  riskOverlayUrl?: string | null;
 }
 
 export default function MapComponent({
@@ -18,10 +19,13 @@ export default function MapComponent({
   selectedSensor,
   onSelectSensor,
   getStatusColor,
+  riskOverlayUrl = null,
 }: MapComponentProps) {
   const mapRef = useRef<HTMLDivElement>(null);
   const mapInstanceRef = useRef<any>(null);
   const markersRef = useRef<Map<number, any>>(new Map());
+  const riskLayerRef = useRef<any>(null);
+  const [showRisk, setShowRisk] = useState(true);
   const [isLoading, setIsLoading] = useState(true);
   const [mapError, setMapError] = useState<string | null>(null);
 
@@ -169,6 +173,31 @@ export default function MapComponent({
     }
   }, [sensors, onSelectSensor, getStatusColor, isLoading, selectedSensor]);
 
+  // Flood risk raster: tiles are versioned by URL, so a new grid just swaps the URL
+  useEffect(() => {
+    const map = mapInstanceRef.current;
+    if (!map || isLoading) return;
+
+    if (!riskOverlayUrl || !showRisk) {
+      if (riskLayerRef.current) {
+        map.removeLayer(riskLayerRef.current);
+        riskLayerRef.current = null;
+      }
+      return;
+    }
+
+    if (riskLayerRef.current) {
+      riskLayerRef.current.setUrl(riskOverlayUrl);
+    } else {
+      riskLayerRef.current = L.tileLayer(riskOverlayUrl, {
+        opacity: 0.6,
+        minZoom: 8,
+        maxZoom: 18,
+        crossOrigin: "anonymous",
+      }).addTo(map);
+    }
+  }, [riskOverlayUrl, showRisk, isLoading]);
+
   // Highlight selected marker with pulsing animation
   useEffect(() => {
     console.log("[v0] Selected sensor changed:", selectedSensor?.id);
@@ -249,6 +278,35 @@ export default function MapComponent({
             <Target className="w-5 h-5 text-gray-700" />
           </button>
 
+          {/* Flood Risk Overlay Toggle */}
+          {riskOverlayUrl && (
+            <div className="absolute bottom-4 right-4 z-[1000] bg-white px-3 py-2 rounded-lg shadow-md border border-gray-200 text-xs">
+              <label className="flex items-center gap-2 font-medium text-gray-700 cursor-pointer">
+                <input
+                  type="checkbox"
+                  checked={showRisk}
+                  onChange={(e) => setShowRisk(e.target.checked)}
+                />
+                Flood risk overlay
+              </label>
+              {showRisk && (
+                <div className="mt-2">
+                  <div
+                    className="h-2 w-32 rounded"
+                    style={{
+                      background:
+                        "linear-gradient(to right, #facc15, #f97316, #dc2626, #991b1b)",
+                    }}
+                  />
+                  <div className="flex justify-between text-[10px] text-gray-500 mt-0.5">
+                    <span>20%</span>
+                    <span>100%</span>
+                  </div>
+                </div>
+              )}
+            </div>
+          )}
+
           {/* Connection Status Indicator */}
           <div className="absolute bottom-4 left-4 z-[1000] bg-white px-3 py-1.5 rounded-full shadow-md border border-gray-200 flex items-center gap-2">
             <div className="w-2 h-2 rounded-full bg-green-500 animate-pulse" />
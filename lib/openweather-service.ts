@@ -157,14 +157,20 @@ export async function fetchOpenWeatherData(
         : { data: null };
       console.log("[FG:OpenWeather] Condition row", condRes?.data);
 
-      // 4) Hourly weather
+      // Forecast rows are upserted per (location_id, dt) and unchanged rows
+      // keep an older request_id, so read them by location and dt window
+      const currentDt = Number(curRes.data.dt);
+
+      // 4) Hourly weather (from the current hour on)
       const hourlyRes = await supabase
         .from("hourly_weather")
         .select(
           "dt, temp, humidity, pressure, clouds, wind_speed, pop, rain_1h, condition_id",
         )
-        .eq("request_id", requestId)
-        .order("dt", { ascending: true });
+        .eq("location_id", locationId)
+        .gte("dt", currentDt - (currentDt % 3600))
+        .order("dt", { ascending: true })
+        .limit(48);
       console.log("[FG:OpenWeather] Hourly count", hourlyRes.data?.length);
 
       const hourly: HourlyWeather[] = (hourlyRes.data || []).map((h: any) => ({
@@ -185,8 +191,11 @@ export async function fetchOpenWeatherData(
         .select(
           "dt, temp_day:temp_day, temp_night:temp_night, temp_min, temp_max, humidity, pressure, wind_speed, pop, rain, summary",
         )
-        .eq("request_id", requestId)
-        .order("dt", { ascending: true });
+        .eq("location_id", locationId)
+        // Daily dt is local noon: today's is within 12h of now, yesterday's is not
+        .gt("dt", currentDt - 43200)
+        .order("dt", { ascending: true })
+        .limit(8);
       console.log("[FG:OpenWeather] Daily count", dailyRes.data?.length);
 
       const daily: DailyWeather[] = (dailyRes.data || []).map((d: any) => ({
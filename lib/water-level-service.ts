@@ -30,33 +30,31 @@ export async function getWaterLevelMode(): Promise<WaterLevelMode> {
   }
 }
 
+/**
+ * Switch the simulation mode through the backend (POST /api/water-level/mode),
+ * which writes sensor_config and pushes the change to running simulators.
+ */
 export async function setWaterLevelMode(
   mode: WaterLevelMode,
 ): Promise<boolean> {
   try {
-    if (!(SUPABASE_URL && SUPABASE_KEY))
-      throw new Error("Missing Supabase env");
-    const { createClient } = await import("@supabase/supabase-js");
-    const supabase = createClient(SUPABASE_URL, SUPABASE_KEY);
-    console.log("[FG:Water] Supabase UPDATE mode", { mode });
-    const { data, error } = await supabase
-      .from("sensor_config")
-      .update({ mode })
-      .eq("id", 1)
-      .select("mode");
-    if (error) {
-      console.warn("[FG:Water] Supabase update failed, trying insert", error);
-      const { error: insertErr } = await supabase
-        .from("sensor_config")
-        .insert({ id: 1, mode });
-      if (insertErr) {
-        console.error("[FG:Water] Supabase insert failed", insertErr);
-        return false;
-      }
-      console.log("[FG:Water] Supabase insert OK");
-      return true;
+    const baseUrl =
+      process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:5000";
+    console.log("[FG:Water] Backend POST mode", { mode });
+    const response = await fetch(`${baseUrl}/api/water-level/mode`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ mode }),
+    });
+    const result = await response.json().catch(() => null);
+    if (!response.ok || !result?.success) {
+      console.warn("[FG:Water] Backend mode update failed", {
+        status: response.status,
+        error: result?.error,
+      });
+      return false;
     }
-    console.log("[FG:Water] Supabase update OK", data);
+    console.log("[FG:Water] Backend mode update OK", result.mode);
     return true;
   } catch {
     console.warn("[FG:Water] POST mode failed");
@@ -123,3 +121,47 @@ export async function getLatestWaterLevels(): Promise<WaterLevelReading[]> {
     return [];
   }
 }
+
+/**
+ * Subscribe to live water level readings pushed by the backend
+ * (Server-Sent Events on /api/stream). `onError` fires when the stream
+ * drops so callers can fall back to polling; `onOpen` when it (re)connects.
+ * Returns an unsubscribe function.
+ */
+export function subscribeWaterLevels(
+  onReadings: (readings: WaterLevelReading[]) => void,
+  handlers: { onOpen?: () => void; onError?: () => void } = {},
+): () => void {
+  if (typeof window === "undefined" || !("EventSource" in window)) {
+    handlers.onError?.();
+    return () => {};
+  }
+  const baseUrl =
+    process.env.NEXT_PUBLIC_BACKEND_URL || "http://localhost:5000";
+  const source = new EventSource(`${baseUrl}/api/stream?topics=water_level`);
+  source.onopen = () => {
+    console.log("[FG:Water] Live stream connected");
+    handlers.onOpen?.();
+  };
+  source.onerror = () => {
+    console.warn("[FG:Water] Live stream unavailable");
+    handlers.onError?.();
+  };
+  source.addEventListener("water_level", (event) => {
+    try {
+      const payload = JSON.parse((event as MessageEvent).data);
+      const readings: WaterLevelReading[] = (payload.readings || []).map(
+        (r: { location: string; water_level_cm: number }) => ({
+          id: r.location,
+          location: r.location,
+          water_level_cm: r.water_level_cm,
+          created_at: payload.timestamp,
+        }),
+      );
+      onReadings(readings);
+    } catch (err) {
+      console.warn("[FG:Water] Bad live stream event", err);
+    }
+  });
+  return () => source.close();
+}